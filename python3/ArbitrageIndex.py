@@ -0,0 +1,186 @@
+import threading
+
+
+ARBITRAGE_FIELDS = ('BestBid', 'BestAsk', 'IsActive', 'IsRestricted')
+
+
+class ArbitrageIndex:
+    """
+        Keeps current cross-exchange and 3-leg cycle arbitrage opportunities
+        up to date from market change notifications of the exchanges.
+
+        A change of a market re-evaluates only the exchange combinations of
+        its pair and the cycles of its exchange running through it, instead of
+        rescanning all markets on a timer. Opportunities returning more than
+        required_rate_of_return are kept, views filter them further.
+
+        :param trader: Dictionary of exchange name to Exchange, e.g. CryptoTrader.trader
+        :param exchanges: Names of exchanges to index
+        :param required_rate_of_return: Lowest return kept in the index
+    """
+    def __init__(self, trader, exchanges, required_rate_of_return=1.0):
+        self._trader = trader
+        self._exchanges = list(exchanges)
+        self._exchange_names = {}
+        self._required_rate_of_return = required_rate_of_return
+        self._lock = threading.RLock()
+        self._exchange_arbitrage = {}
+        self._triangle_arbitrage = {exchange: {} for exchange in self._exchanges}
+        self._listeners = []
+        self._version = 0
+
+    def start(self):
+        """
+            Builds the index from current quotes and subscribes to market changes
+        """
+        for exchange in self._exchanges:
+            self._exchange_names[self._trader[exchange]] = exchange
+            self._trader[exchange].add_market_listener(self.on_market_change)
+        self.rebuild()
+
+    def stop(self):
+        for exchange in self._exchanges:
+            self._trader[exchange].remove_market_listener(self.on_market_change)
+
+    def rebuild(self):
+        with self._lock:
+            self._exchange_arbitrage = {}
+            pairs = set()
+            for exchange in self._exchanges:
+                for code_base, markets in self._trader[exchange].get_active_markets_snapshot().items():
+                    for code_curr in markets:
+                        pairs.add((code_base, code_curr))
+            for code_base, code_curr in pairs:
+                self.update_pair(code_base, code_curr)
+            for exchange in self._exchanges:
+                graph = self._trader[exchange]._currency_graph
+                self._triangle_arbitrage[exchange] = {}
+                self.update_triangles(exchange, graph.get_triangles())
+            self._version += 1
+        self.notify_listeners()
+
+    def add_listener(self, listener):
+        """
+            Registers listener() called after opportunities changed, from the
+            thread that updated the market
+        """
+        self._listeners = self._listeners + [listener]
+
+    def remove_listener(self, listener):
+        self._listeners = [item for item in self._listeners if item != listener]
+
+    def notify_listeners(self):
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                print('Exception in arbitrage index listener: {}'.format(e))
+
+    def on_market_change(self, exchange, code_base, code_curr, changes):
+        """
+            Market listener registered with every indexed exchange
+        """
+        if not any(field in changes for field in ARBITRAGE_FIELDS):
+            return
+        name = self._exchange_names.get(exchange, None)
+        if name is None:
+            return
+        with self._lock:
+            changed = self.update_pair(code_base, code_curr)
+            triangles = exchange._currency_graph.get_triangles_with_market(code_base, code_curr)
+            changed = self.remove_triangles(name, code_base, code_curr, triangles) or changed
+            changed = self.update_triangles(name, triangles) or changed
+            if changed:
+                self._version += 1
+        if changed:
+            self.notify_listeners()
+
+    def update_pair(self, code_base, code_curr):
+        """
+            Re-evaluates all exchange combinations of a pair, returns True when its opportunities changed
+        """
+        quotes = []
+        for exchange in self._exchanges:
+            market = self._trader[exchange]._active_markets.get(code_base, {}).get(code_curr, None)
+            if market:
+                quotes.append((exchange, market, market.get('BestBid', None), market.get('BestAsk', None)))
+
+        rows = []
+        for exchange_ask, market_ask, ask_bid, ask in quotes:
+            if not ask or ask <= 0:
+                continue
+            for exchange_bid, market_bid, bid, bid_ask in quotes:
+                if not bid or bid <= 0 or bid <= ask * self._required_rate_of_return:
+                    continue
+                rows.append({
+                    'code_base': code_base,
+                    'code_curr': code_curr,
+                    'exchangeAsk': exchange_ask,
+                    'marketAsk': market_ask['MarketSymbol'],
+                    'exchangeAskBid': ask_bid,
+                    'exchangeAskAsk': ask,
+                    'exchangeBid': exchange_bid,
+                    'marketBid': market_bid['MarketSymbol'],
+                    'exchangeBidBid': bid,
+                    'exchangeBidAsk': bid_ask,
+                    'return': 100.0 * (bid / ask - 1)
+                })
+
+        key = (code_base, code_curr)
+        previous = self._exchange_arbitrage.get(key, [])
+        if rows:
+            self._exchange_arbitrage[key] = rows
+        else:
+            self._exchange_arbitrage.pop(key, None)
+        return rows != previous
+
+    def remove_triangles(self, exchange, code_base, code_curr, triangles):
+        """
+            Drops kept cycles of the exchange trading the market which are no
+            longer among its triangles, e.g. after the market became inactive.
+            Returns True when any was dropped.
+        """
+        cycles = self._triangle_arbitrage[exchange]
+        current = set(triangles)
+        stale = [legs for legs in cycles
+                 if legs not in current and any(key == (code_base, code_curr) for key, action in legs)]
+        for legs in stale:
+            del cycles[legs]
+        return len(stale) > 0
+
+    def update_triangles(self, exchange, triangles):
+        """
+            Re-evaluates cycles of the exchange, returns True when kept cycles changed
+        """
+        graph = self._trader[exchange]._currency_graph
+        cycles = self._triangle_arbitrage[exchange]
+        changed = False
+        for legs in triangles:
+            rate = graph.get_cycle_rate(legs)
+            if rate > self._required_rate_of_return:
+                previous = cycles.get(legs, None)
+                if previous is None or previous['return'] != 100.0 * (rate - 1):
+                    cycle = graph.describe_cycle(legs, rate)
+                    cycle['exchange'] = exchange
+                    cycles[legs] = cycle
+                    changed = True
+            elif cycles.pop(legs, None) is not None:
+                changed = True
+        return changed
+
+    def get_exchange_arbitrage(self, required_rate_of_return):
+        """
+            Same rows as QuoteMatrix.get_exchange_arbitrage without scanning
+        """
+        minimum_return = 100.0 * (required_rate_of_return - 1)
+        with self._lock:
+            return [row for rows in self._exchange_arbitrage.values() for row in rows if row['return'] > minimum_return]
+
+    def get_triangle_arbitrage(self, required_rate_of_return):
+        """
+            Same cycles as CryptoTrader.get_arbitrage_possibilities_circle without scanning
+        """
+        minimum_return = 100.0 * (required_rate_of_return - 1)
+        with self._lock:
+            return [cycle for exchange in self._exchanges
+                    for cycle in self._triangle_arbitrage[exchange].values() if cycle['return'] > minimum_return]
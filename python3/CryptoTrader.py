@@ -1,7 +1,17 @@
+import atexit
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from pydoc import locate
 
+from ArbitrageIndex import ArbitrageIndex
+from DepthArbitrage import DepthArbitrage
+from MarketDataLoop import CTMarketDataLoop
+from MarketDataRecorder import MarketDataRecorder
+from MarketDataReplay import MarketDataReplay
+from QuoteMatrix import QuoteMatrix
+
 
 class CryptoTrader:
     def __init__(self, API_KEYS={}, SETTINGS={}):
@@ -9,18 +19,78 @@ class CryptoTrader:
         self._map_currency_code_to_exchange_code = {}
         self._map_exchange_code_to_currency_code = {}
         self._active_markets = {}
+        self._active_markets_versions = None
+        self._market_data_loop = None
+        self._quote_matrix = None
+        self._arbitrage_index = None
+        self._recorder = None
+        self._replay = None
+        self._bootstrapped_exchanges = None
+        self._bootstrap_lock = threading.RLock()
         self._API_KEYS = API_KEYS
         self._SETTINGS = SETTINGS
+        self._depth_arbitrage = DepthArbitrage(
+            self.trader,
+            SETTINGS.get('Arbitrage Order Book Depth', 20),
+            SETTINGS.get('Arbitrage REST Order Book Seconds', 5)
+        )
         self.init_exchanges()
         self.update_api_keys()
 
     def init_exchanges(self):
+        loop_settings = self._SETTINGS.get('Market Data Event Loop', {})
+        if loop_settings.get('Enabled', False):
+            self._market_data_loop = CTMarketDataLoop(executor_threads=loop_settings.get('Executor Threads', 8))
+            self._market_data_loop.start()
         for exchange in self._SETTINGS.get('Exchange Classes to Initialize', []):
             exchange_file = locate('Exchanges.' + exchange)
             exchange_class = getattr(exchange_file, exchange)
             self.trader[exchange] = exchange_class()
-        self.init_currencies()
-        self.init_markets()
+            self.trader[exchange].init_http_session(
+                self._SETTINGS.get('HTTP Connection Pool', {}).get('Pool Size', None),
+                self._SETTINGS.get('HTTP Connection Pool', {}).get('Timeout Seconds', None)
+            )
+            url_overrides = self._SETTINGS.get('URL Overrides', {}).get(exchange, {})
+            self.trader[exchange].set_urls(url_overrides.get('REST', None), url_overrides.get('Websocket', None))
+            self.trader[exchange].init_rate_limiter(
+                self._SETTINGS.get('Rate Limits', {}).get('Enabled', True),
+                self._SETTINGS.get('Rate Limits', {}).get('Utilization', None)
+            )
+            retry_settings = self._SETTINGS.get('Retry Policy', {})
+            self.trader[exchange].init_retry_policy(
+                retry_settings.get('Max Attempts', None),
+                retry_settings.get('Base Delay Seconds', 0.5),
+                retry_settings.get('Max Delay Seconds', 10),
+                retry_settings.get('Circuit Breaker Failures', 5),
+                retry_settings.get('Circuit Breaker Reset Seconds', 30)
+            )
+            self.trader[exchange].init_json_decoder(self._SETTINGS.get('JSON Decoder', {}).get('Backend', 'auto'))
+            response_cache_settings = self._SETTINGS.get('Response Cache', {})
+            self.trader[exchange].init_response_cache(
+                response_cache_settings.get('Enabled', True),
+                response_cache_settings.get('Default TTL Seconds', None),
+                response_cache_settings.get('TTL Seconds', {}).get(exchange, None)
+            )
+            cache_settings = self._SETTINGS.get('Metadata Cache', {})
+            if cache_settings.get('Enabled', False):
+                ttl_hours = cache_settings.get('TTL Hours', {})
+                self.trader[exchange].init_metadata_cache(
+                    cache_settings.get('Directory', 'metadata_cache'),
+                    ttl_hours.get(exchange, ttl_hours.get('Default', 24)) * 60 * 60
+                )
+        replaying = self._SETTINGS.get('Market Data Replay', {}).get('Enabled', False)
+        if not replaying:
+            self.init_recorder()
+        self.init_quote_matrix()
+        if replaying:
+            self.load_cached_definitions()
+        else:
+            self.bootstrap_exchanges()
+        self.init_arbitrage_index()
+        if replaying:
+            self.init_replay()
+        else:
+            self.init_market_data_feeds()
 
     def update_api_keys(self):
         self._SETTINGS['Exchanges with API Keys'] = []
@@ -33,76 +103,299 @@ class CryptoTrader:
             if self._API_KEYS[exchange].get('APIKey', '') != '':
                 self._SETTINGS['Exchanges with API Keys'].append(exchange)
 
-    def init_currencies(self):
-        self._map_currency_code_to_exchange_code = {}
-        self._map_exchange_code_to_currency_code = {}
+    def init_recorder(self):
+        """
+            Records websocket frames and market updates of loaded exchanges when
+            "Market Data Recorder" is enabled, starting with the bootstrap so
+            that recordings can rebuild market state on their own
+        """
+        recorder_settings = self._SETTINGS.get('Market Data Recorder', {})
+        if not recorder_settings.get('Enabled', False):
+            return
+        self._recorder = MarketDataRecorder(
+            recorder_settings.get('Directory', 'recordings'),
+            recorder_settings.get('Flush Seconds', 1),
+            recorder_settings.get('Fsync', True)
+        )
+        self._recorder.start()
+        atexit.register(self._recorder.stop)
         for exchange in self._SETTINGS.get('Exchanges to Load', []):
-            print('Loading currencies for ' + exchange)
-            t = threading.Thread(target=self.trader[exchange].update_currency_definitions)
-            t.start()
-            t.join(2)
+            self.trader[exchange].set_recorder(self._recorder)
+
+    def init_replay(self):
+        """
+            Feeds loaded exchanges from a recording of the market data recorder
+            instead of websockets when "Market Data Replay" is enabled, views
+            and arbitrage scans then run against the recorded market data
+        """
+        replay_settings = self._SETTINGS.get('Market Data Replay', {})
+        exchanges = self._SETTINGS.get('Exchanges to Load', [])
+        for exchange in exchanges:
+            for market in replay_settings.get('Order Books', {}).get(exchange, []):
+                self.trader[exchange].ws_subscribe(market)
+        self._replay = MarketDataReplay(
+            {exchange: self.trader[exchange] for exchange in exchanges},
+            replay_settings.get('Directory', 'recordings'),
+            replay_settings.get('Speed', 1),
+            replay_settings.get('Start Timestamp', None),
+            replay_settings.get('End Timestamp', None)
+        )
+        self._replay.start()
+
+    def init_quote_matrix(self):
+        exchanges = self._SETTINGS.get('Exchanges to Load', [])
+        self._quote_matrix = QuoteMatrix(exchanges)
+        for exchange in exchanges:
+            self.trader[exchange].set_quote_matrix(self._quote_matrix, self._quote_matrix.get_column(exchange))
+
+    def init_arbitrage_index(self):
+        """
+            Starts incremental arbitrage index updated from market changes of loaded exchanges
+        """
+        if self._SETTINGS.get('Arbitrage Index', {}).get('Enabled', False):
+            self._arbitrage_index = ArbitrageIndex(self.trader, self._SETTINGS.get('Exchanges to Load', []))
+            self._arbitrage_index.start()
+
+    def bootstrap_exchanges(self):
+        """
+            Loads currencies, market definitions and market quotes of all
+            exchanges in parallel. Stages of one exchange run in order, because
+            market definitions need the exchange currency maps, but exchanges
+            do not wait for each other. Stage timings are kept in
+            self._bootstrap_timings.
+            Exchanges still loading after 'Bootstrap Timeout Seconds' are left
+            out of get_loaded_exchanges, so of the currency maps, aggregated
+            markets and arbitrage scans, until on_late_bootstrap adds them.
+        """
+        exchanges = self._SETTINGS.get('Exchanges to Load', [])
+        self._bootstrap_timings = {}
+        started = time.time()
+        late = {}
+        if exchanges:
+            executor = ThreadPoolExecutor(max_workers=len(exchanges))
+            futures = {exchange: executor.submit(self.bootstrap_exchange, exchange) for exchange in exchanges}
+            wait(list(futures.values()), timeout=self._SETTINGS.get('Bootstrap Timeout Seconds', 30))
+            executor.shutdown(wait=False)
+            late = {exchange: future for exchange, future in futures.items() if not future.done()}
+        with self._bootstrap_lock:
+            self._bootstrapped_exchanges = [exchange for exchange in exchanges if exchange not in late]
+            self.init_currencies(self._bootstrapped_exchanges)
+            self.refresh_agg_active_markets()
+        self._bootstrap_timings['Total'] = time.time() - started
+        print('Loaded exchanges in {:.2f}s'.format(self._bootstrap_timings['Total']))
+        for exchange, future in late.items():
+            print('Bootstrap of {} did not finish in time, it is added once loaded'.format(exchange))
+            future.add_done_callback(lambda _, exchange=exchange: self.on_late_bootstrap(exchange))
+
+    def get_loaded_exchanges(self):
+        """
+            Exchanges of 'Exchanges to Load' whose bootstrap finished, all of them
+            when definitions were not loaded by bootstrap_exchanges
+        """
+        with self._bootstrap_lock:
+            if self._bootstrapped_exchanges is None:
+                return list(self._SETTINGS.get('Exchanges to Load', []))
+            return list(self._bootstrapped_exchanges)
+
+    def on_late_bootstrap(self, exchange):
+        """
+            Adds an exchange whose bootstrap finished after the timeout to the
+            currency maps and aggregated markets, runs in the bootstrap thread
+        """
+        with self._bootstrap_lock:
+            self._bootstrapped_exchanges.append(exchange)
+            self.init_currencies(self._bootstrapped_exchanges)
+            self.refresh_agg_active_markets()
+        print('Loaded {} after the bootstrap timeout'.format(exchange))
+
+    def bootstrap_exchange(self, exchange):
+        """
+            With the metadata cache enabled, currency and market definitions
+            come from the cache and are refreshed in the background once they
+            expire, only market quotes are loaded from the exchange.
+        """
+        if self.trader[exchange].read_metadata_cache() is not None:
+            stages = [
+                ('cached currencies', self.trader[exchange].load_cached_currency_definitions),
+                ('currency maps', lambda: self.init_exchange_currency_maps(exchange)),
+                ('cached market definitions', self.trader[exchange].load_cached_market_definitions),
+                ('market quotes', self.trader[exchange].update_market_quotes),
+            ]
+        else:
+            stages = [
+                ('currencies', self.trader[exchange].update_currency_definitions),
+                ('currency maps', lambda: self.init_exchange_currency_maps(exchange)),
+                ('market definitions', self.trader[exchange].update_market_definitions),
+                ('metadata cache', self.trader[exchange].save_metadata_cache),
+                ('market quotes', self.trader[exchange].update_market_quotes),
+            ]
+        self._bootstrap_timings[exchange] = {}
+        for stage, function in stages:
+            stage_started = time.time()
+            try:
+                function()
+            except Exception as e:
+                print('Error loading {} for {}: {}'.format(stage, exchange, str(e)))
+            self._bootstrap_timings[exchange][stage] = time.time() - stage_started
+            print('Bootstrap stage {} for {} took {:.2f}s'.format(
+                stage,
+                exchange,
+                self._bootstrap_timings[exchange][stage]
+            ))
+        if self.trader[exchange]._metadata_cache_directory is not None:
+            threading.Thread(target=self.refresh_exchange_definitions_thread, args=(exchange,), daemon=True).start()
 
+    def load_cached_definitions(self):
+        """
+            Loads currency and market definitions of all exchanges from the
+            metadata cache only, without requests, for replays of recordings
+        """
         for exchange in self._SETTINGS.get('Exchanges to Load', []):
+            if not self.trader[exchange].load_cached_currency_definitions():
+                print('No metadata cache for {}, its markets need definitions from the recording'.format(exchange))
+                continue
+            self.init_exchange_currency_maps(exchange)
+            self.trader[exchange].load_cached_market_definitions()
+        self.init_currencies()
+        self.refresh_agg_active_markets()
+
+    def refresh_exchange_definitions_thread(self, exchange):
+        """
+            Reloads currency and market definitions from the exchange whenever
+            its metadata cache expires
+        """
+        while True:
+            if self.trader[exchange].metadata_cache_expires_in() <= 0:
+                try:
+                    self.trader[exchange].update_currency_definitions()
+                    self.init_exchange_currency_maps(exchange)
+                    self.trader[exchange].update_market_definitions()
+                    self.trader[exchange].save_metadata_cache()
+                    print('Refreshed metadata cache for ' + exchange)
+                except Exception as e:
+                    print('Error refreshing metadata cache for {}: {}'.format(exchange, str(e)))
+            time.sleep(max(self.trader[exchange].metadata_cache_expires_in(), 60))
+
+    def init_exchange_currency_maps(self, exchange):
+        """
+            Populates currency code maps on the exchange object, these are
+            needed before market definitions can be loaded
+        """
+        currencies = self.trader[exchange]._currencies
+        rename_map = self._SETTINGS.get('Exchange Currency Rename Map', {}).get(exchange, {})
+        self.trader[exchange]._map_currency_code_to_exchange_code = {}
+        for currency in list(currencies):
+            code = rename_map.get(currency, currency)
+            self.trader[exchange]._map_exchange_code_to_currency_code[currency] = code
+            self.trader[exchange]._map_currency_code_to_exchange_code[code] = currency
+
+    def init_currencies(self, exchanges=None):
+        """
+            Populates currency code maps on the CryptoTrader object from the
+            maps of loaded exchanges, get_loaded_exchanges by default.
+            The maps are built aside and then replaced, so readers never see
+            them half built.
+        """
+        map_currency_code_to_exchange_code = {}
+        map_exchange_code_to_currency_code = {}
+        if exchanges is None:
+            exchanges = self.get_loaded_exchanges()
+        for exchange in exchanges:
             currencies = self.trader[exchange]._currencies
-            self.trader[exchange]._map_currency_code_to_exchange_code = {}
-            self._map_exchange_code_to_currency_code[exchange] = {}
-            for currency in currencies:
+            map_exchange_code_to_currency_code[exchange] = {}
+            for currency in list(currencies):
                 try:
-                    code = currency
-                    if exchange in self._SETTINGS.get('Exchange Currency Rename Map', {}):
-                        if currency in self._SETTINGS['Exchange Currency Rename Map'][exchange]:
-                            code = self._SETTINGS['Exchange Currency Rename Map'][exchange][currency]
+                    code = self.trader[exchange]._map_exchange_code_to_currency_code.get(currency, currency)
 
                     currency_name = currencies[currency]['Name']
                     exchange_name_column = exchange + 'Name'
 
-                    if code not in self._map_currency_code_to_exchange_code:
-                        self._map_currency_code_to_exchange_code[code] = {
+                    if code not in map_currency_code_to_exchange_code:
+                        map_currency_code_to_exchange_code[code] = {
                             'Name': code
                         }
 
-                    # Populate maps on the exchange object
-                    self.trader[exchange]._map_exchange_code_to_currency_code[currency] = code
-                    self.trader[exchange]._map_currency_code_to_exchange_code[code] = currency
-
-                    # Populate maps on the CryptoTrader object
-                    self._map_exchange_code_to_currency_code[exchange][currency] = code
-                    self._map_currency_code_to_exchange_code[code][exchange] = currency
-                    self._map_currency_code_to_exchange_code[code][exchange_name_column] = currency_name
+                    map_exchange_code_to_currency_code[exchange][currency] = code
+                    map_currency_code_to_exchange_code[code][exchange] = currency
+                    map_currency_code_to_exchange_code[code][exchange_name_column] = currency_name
 
-                    if code == self._map_currency_code_to_exchange_code[code]['Name']:
-                        self._map_currency_code_to_exchange_code[code]['Name'] = currency_name
+                    if code == map_currency_code_to_exchange_code[code]['Name']:
+                        map_currency_code_to_exchange_code[code]['Name'] = currency_name
 
                 except Exception as e:
                     print(str(e))
+        self._map_currency_code_to_exchange_code = map_currency_code_to_exchange_code
+        self._map_exchange_code_to_currency_code = map_exchange_code_to_currency_code
 
-    def init_markets(self):
-        for exchange in self._SETTINGS.get('Exchanges to Load', []):
-            print('Loading market definitions for ' + exchange)
-            t = threading.Thread(target=self.trader[exchange].update_market_definitions)
-            t.start()
-            t.join(5)
+    def init_market_data_feeds(self):
+        """
+            Starts websocket feeds of loaded exchanges. With the market data
+            event loop enabled, the loop owns websocket connections and also
+            polls quotes of exchanges without websocket quote feeds, so views
+            do not need to poll them on every refresh.
+        """
+        polling_seconds = self._SETTINGS.get('Market Data Event Loop', {}).get('Quotes Polling Seconds', 5)
         for exchange in self._SETTINGS.get('Exchanges to Load', []):
-            print('Loading market quotes for ' + exchange)
-            t = threading.Thread(target=self.trader[exchange].update_market_quotes)
-            t.start()
-            t.join(5)
-        self.refresh_agg_active_markets()
+            if self._market_data_loop is None:
+                self.trader[exchange].ws_start()
+                if self._arbitrage_index is not None and \
+                        not self.trader[exchange].has_implementation('ws_all_markets_best_bid_ask'):
+                    threading.Thread(
+                        target=self.poll_market_quotes,
+                        args=(exchange, self._SETTINGS.get('Arbitrage Index', {}).get('Quotes Polling Seconds', 5)),
+                        daemon=True
+                    ).start()
+            else:
+                self._market_data_loop.add_websocket(self.trader[exchange])
+                if not self.trader[exchange].has_implementation('ws_24hour_market_moves'):
+                    self._market_data_loop.add_poller(self.trader[exchange].update_market_24hrs, polling_seconds)
+                elif not self.trader[exchange].has_implementation('ws_all_markets_best_bid_ask'):
+                    self._market_data_loop.add_poller(self.trader[exchange].update_market_quotes, polling_seconds)
+
+    def get_websocket_status(self):
+        """
+            Websocket connection state of every loaded exchange
+            Debug: self._CTMain._Crypto_Trader.get_websocket_status()
+        """
+        return {exchange: self.trader[exchange].get_ws_status() for exchange in self.get_loaded_exchanges()}
+
+    def poll_market_quotes(self, exchange, polling_seconds):
+        """
+            Keeps quotes of an exchange without websocket quotes current for the arbitrage index
+        """
+        while True:
+            started = time.time()
+            try:
+                self.trader[exchange].update_market_quotes()
+            except Exception as e:
+                print('Exception polling market quotes of {}: {}'.format(exchange, e))
+            time.sleep(max(0.0, polling_seconds - (time.time() - started)))
 
     def refresh_agg_active_markets(self):
-        for exchange in self._SETTINGS.get('Exchanges to Load', []):
-            for code_base in self.trader[exchange]._active_markets:
-                if code_base not in self._active_markets:
-                    self._active_markets[code_base] = {}
-                for code_curr in self.trader[exchange]._active_markets[code_base]:
-                    if code_curr not in self._active_markets[code_base]:
-                        self._active_markets[code_base][code_curr] = {}
-                    self._active_markets[code_base][code_curr][exchange] = \
-                        self.trader[exchange]._active_markets[code_base][code_curr]
+        """
+            Rebuilds _active_markets (code_base -> code_curr -> exchange -> market)
+            from snapshots of the exchanges, only when any of them changed since
+            the last refresh or an exchange finished loading. The result is
+            replaced, never mutated, so views may keep iterating the previous one.
+        """
+        exchanges = self.get_loaded_exchanges()
+        snapshots = [self.trader[exchange].get_versioned_active_markets() for exchange in exchanges]
+        versions = (tuple(exchanges),) + tuple(version for version, _ in snapshots)
+        if versions == self._active_markets_versions:
+            return
+        active_markets = {}
+        for exchange, (_, markets) in zip(exchanges, snapshots):
+            for code_base, curr_markets in markets.items():
+                base_markets = active_markets.setdefault(code_base, {})
+                for code_curr, market in curr_markets.items():
+                    base_markets.setdefault(code_curr, {})[exchange] = market
+        self._active_markets = active_markets
+        self._active_markets_versions = versions
 
     def load_active_markets(self):
-        for exchange in self._SETTINGS.get('Exchanges to Load', []):
-            if not self.trader[exchange].has_implementation('ws_all_markets_best_bid_ask'):
+        for exchange in self.get_loaded_exchanges():
+            if self._market_data_loop is None and self._arbitrage_index is None and \
+                    not self.trader[exchange].has_implementation('ws_all_markets_best_bid_ask'):
                 print('Loading active markets for ' + exchange)
                 t = threading.Thread(target=self.trader[exchange].update_market_quotes)
                 t.start()
@@ -113,8 +406,9 @@ class CryptoTrader:
         return self._active_markets
 
     def load_24hour_moves(self):
-        for exchange in self._SETTINGS.get('Exchanges to Load', []):
-            if not self.trader[exchange].has_implementation('ws_24hour_market_moves'):
+        for exchange in self.get_loaded_exchanges():
+            if self._market_data_loop is None and \
+                    not self.trader[exchange].has_implementation('ws_24hour_market_moves'):
                 print('Loading active markets for ' + exchange)
                 t = threading.Thread(target=self.trader[exchange].update_market_24hrs)
                 t.start()
@@ -135,71 +429,76 @@ class CryptoTrader:
         return self.trader[exchange].get_market_symbol(code_base, code_curr)
 
     def get_arbitrage_possibilities(self, required_rate_of_return):
+        """
+            Returns markets of pairs whose best bid on one exchange exceeds best
+            ask on another, found with a vectorized scan of the quote matrix
+        """
         self.load_active_markets()
         self._arbitrage_possibilities = {}
-        for code_base in self._active_markets:
-            for code_curr in self._active_markets[code_base]:
-                markets = self._active_markets[code_base][code_curr]
-                best_bid = None
-                best_ask = None
-                if len(markets) > 1:
-                    for exchange in markets:
-                        if not markets[exchange]['BestBid'] is None:
-                            if best_bid is None or best_bid < markets[exchange]['BestBid']:
-                                best_bid = markets[exchange]['BestBid']
-                        if not markets[exchange]['BestAsk'] is None:
-                            if best_ask is None or best_ask > markets[exchange]['BestAsk']:
-                                best_ask = markets[exchange]['BestAsk']
-                    if best_bid is not None and best_ask is not None and best_bid > best_ask * required_rate_of_return:
-                        if code_base not in self._arbitrage_possibilities:
-                            self._arbitrage_possibilities[code_base] = {}
-                        self._arbitrage_possibilities[code_base][code_curr] = markets
+        pairs = self._quote_matrix.get_arbitrage_pairs(required_rate_of_return, self.get_loaded_exchanges())
+        for code_base, code_curr in pairs:
+            markets = self._active_markets.get(code_base, {}).get(code_curr, None)
+            if markets is not None:
+                if code_base not in self._arbitrage_possibilities:
+                    self._arbitrage_possibilities[code_base] = {}
+                self._arbitrage_possibilities[code_base][code_curr] = markets
         return self._arbitrage_possibilities
 
+    def get_exchange_arbitrage(self, required_rate_of_return):
+        """
+            Returns one row per pair and exchange combination where buying at
+            ask on one exchange and selling at bid on another returns more than
+            required_rate_of_return
+        """
+        exchanges = self.get_loaded_exchanges()
+        if self._arbitrage_index is not None:
+            rows = self._arbitrage_index.get_exchange_arbitrage(required_rate_of_return)
+            if len(exchanges) < len(self._SETTINGS.get('Exchanges to Load', [])):
+                rows = [row for row in rows if row['exchangeAsk'] in exchanges and row['exchangeBid'] in exchanges]
+            return rows
+        self.load_active_markets()
+        return self._quote_matrix.get_exchange_arbitrage(required_rate_of_return, exchanges)
+
+    def get_executable_arbitrage(self, row, required_rate_of_return=1.0):
+        """
+            Walks order books of both exchanges of a row from get_exchange_arbitrage and
+            returns executable volume and VWAP return net of taker and withdrawal fees
+            Debug: self._CTMain._Crypto_Trader.get_executable_arbitrage(row)
+        """
+        return self._depth_arbitrage.get_executable_arbitrage(row, required_rate_of_return)
+
     def get_arbitrage_possibilities_circle(self, required_rate_of_return):
+        """
+            Finds 3-leg cycles on each exchange using its currency graph,
+            legs of each cycle are listed in the order of execution
+        """
+        exchanges = self.get_loaded_exchanges()
+        if self._arbitrage_index is not None:
+            cycles = self._arbitrage_index.get_triangle_arbitrage(required_rate_of_return)
+            if len(exchanges) < len(self._SETTINGS.get('Exchanges to Load', [])):
+                cycles = [cycle for cycle in cycles if cycle['exchange'] in exchanges]
+            return cycles
         self.load_active_markets()
         self._arbitrage_possibilities = []
-        for code_base1 in self._active_markets:
-            for code_curr in self._active_markets[code_base1]:
-                for code_base2 in self._active_markets:
-                    if code_base1 != code_base2:
-                        for exchange in self._active_markets[code_base1][code_curr]:
-                            if code_curr in self._active_markets[code_base2]:
-                                if exchange in self._active_markets[code_base2][code_curr]:
-                                    if code_base2 in self._active_markets[code_base1]:
-                                        if exchange in self._active_markets[code_base1][code_base2]:
-                                            market1 = self._active_markets[code_base1][code_curr][exchange]
-                                            market2 = self._active_markets[code_base2][code_curr][exchange]
-                                            market3 = self._active_markets[code_base1][code_base2][exchange]
-                                            if market3['BestAsk'] is not None and market2['BestAsk'] is not None and market1['BestBid'] is not None and market3['BestAsk'] * market2['BestAsk'] > 0 and market3['BestAsk'] * market2['BestAsk'] * required_rate_of_return < market1['BestBid']:
-                                                self._arbitrage_possibilities.append(
-                                                    {
-                                                        'exchange': exchange,
-                                                        'market1': market1,
-                                                        'action1': 'sell',
-                                                        'market2': market2,
-                                                        'action2': 'buy',
-                                                        'market3': market3,
-                                                        'action3': 'buy',
-                                                        'return': 100.0 * (market1['BestBid'] / (market3['BestAsk'] * market2['BestAsk']) - 1)
-                                                    }
-                                                )
-                                            if market1['BestAsk'] is not None and market3['BestBid'] is not None and market2['BestBid'] is not None and market1['BestAsk'] > 0 and market3['BestBid'] * market2['BestBid'] > market1['BestAsk'] * required_rate_of_return:
-                                                self._arbitrage_possibilities.append(
-                                                    {
-                                                        'exchange': exchange,
-                                                        'market1': market1,
-                                                        'action1': 'buy',
-                                                        'market2': market2,
-                                                        'action2': 'sell',
-                                                        'market3': market3,
-                                                        'action3': 'sell',
-                                                        'return': 100.0 * (market3['BestBid'] * market2['BestBid'] / market1['BestAsk'] - 1)
-                                                    }
-                                                )
-
+        for exchange in exchanges:
+            for cycle in self.trader[exchange]._currency_graph.get_triangle_arbitrage(required_rate_of_return):
+                cycle['exchange'] = exchange
+                self._arbitrage_possibilities.append(cycle)
         return self._arbitrage_possibilities
 
+    def get_arbitrage_cycles(self, required_rate_of_return, max_legs=6):
+        """
+            Bellman-Ford search for profitable cycles of any length up to max_legs on each exchange
+            Debug: self._CTMain._Crypto_Trader.get_arbitrage_cycles(1.0)
+        """
+        self.load_active_markets()
+        results = []
+        for exchange in self.get_loaded_exchanges():
+            for cycle in self.trader[exchange]._currency_graph.get_negative_cycles(required_rate_of_return, max_legs):
+                cycle['exchange'] = exchange
+                results.append(cycle)
+        return results
+
     def calculate_balances_btc(self):
         """
             Load balances from exchanges in BTC terms
@@ -207,7 +506,10 @@ class CryptoTrader:
         """
         self._balances_btc = {}
         self.load_active_markets()
+        loaded_exchanges = self.get_loaded_exchanges()
         for exchange in self._SETTINGS.get('Exchanges with API Keys', []):
+            if exchange not in loaded_exchanges:
+                continue
             self.trader[exchange].load_balances_btc()
             for currency in self.trader[exchange]._complete_balances_btc:
                 try:
@@ -0,0 +1,221 @@
+import math
+
+
+class CurrencyGraph:
+    """
+        Graph of currencies of a single exchange connected by its active markets.
+
+        Every market code_base/code_curr gives two directed edges: code_curr can
+        be sold for code_base at BestBid and code_base can buy code_curr at
+        BestAsk. Edges keep a reference to the market dictionary maintained by
+        Exchange.update_market, so quote updates need no work here and only
+        markets being added or removed change the precomputed cycle index.
+    """
+    def __init__(self):
+        self._markets = {}
+        self._adjacency = {}
+        self._triangles = None
+        self._triangle_quotes = None
+        self._triangles_by_market = None
+
+    def __len__(self):
+        return len(self._markets)
+
+    def add_market(self, code_base, code_curr, market):
+        if code_base is None or code_curr is None or code_base == code_curr:
+            return
+        key = (code_base, code_curr)
+        previous = self._markets.get(key, None)
+        if previous is market:
+            return
+        self._markets[key] = market
+        if previous is None:
+            self._adjacency.setdefault(code_base, set()).add(code_curr)
+            self._adjacency.setdefault(code_curr, set()).add(code_base)
+        self._triangles = None
+
+    def remove_market(self, code_base, code_curr):
+        if self._markets.pop((code_base, code_curr), None) is not None:
+            if (code_curr, code_base) not in self._markets:
+                self._adjacency.get(code_base, set()).discard(code_curr)
+                self._adjacency.get(code_curr, set()).discard(code_base)
+            self._triangles = None
+
+    def get_leg(self, code_from, code_to):
+        """
+            Returns (market key, action) converting code_from into code_to or None
+        """
+        if (code_from, code_to) in self._markets:
+            return (code_from, code_to), 'buy'
+        if (code_to, code_from) in self._markets:
+            return (code_to, code_from), 'sell'
+        return None
+
+    def get_triangles(self):
+        """
+            Returns all directed 3-leg cycles, each as a tuple of (market key, action) legs.
+            The list is rebuilt only after markets were added or removed.
+        """
+        if self._triangles is None:
+            triangles = []
+            triangles_by_market = {}
+            adjacency = {code: set(neighbours) for code, neighbours in list(self._adjacency.items())}
+            for code1 in adjacency:
+                for code2 in adjacency[code1]:
+                    if code2 <= code1:
+                        continue
+                    for code3 in adjacency[code1] & adjacency.get(code2, set()):
+                        if code3 <= code2:
+                            continue
+                        for cycle in ((code1, code2, code3), (code1, code3, code2)):
+                            legs = (
+                                self.get_leg(cycle[0], cycle[1]),
+                                self.get_leg(cycle[1], cycle[2]),
+                                self.get_leg(cycle[2], cycle[0]),
+                            )
+                            if None in legs:
+                                continue
+                            triangles.append(legs)
+                            for key, action in legs:
+                                triangles_by_market.setdefault(key, []).append(legs)
+            self._triangle_quotes = [self.get_cycle_quotes(legs) for legs in triangles]
+            self._triangles_by_market = triangles_by_market
+            self._triangles = triangles
+        return self._triangles
+
+    def get_cycle_quotes(self, legs):
+        """
+            Resolves legs to a flat tuple of (market, is_buy) pairs read by the scan
+        """
+        quotes = ()
+        for key, action in legs:
+            quotes += (self._markets[key], action == 'buy')
+        return quotes
+
+    def get_triangles_with_market(self, code_base, code_curr):
+        self.get_triangles()
+        return self._triangles_by_market.get((code_base, code_curr), [])
+
+    def get_cycle_rate(self, legs):
+        """
+            Amount of the starting currency received per unit after trading
+            through all legs at best quotes, 0 if any quote is missing
+        """
+        rate = 1.0
+        for key, action in legs:
+            market = self._markets.get(key, None)
+            if market is None:
+                return 0
+            if action == 'buy':
+                price = market.get('BestAsk', None)
+                if not price or price <= 0:
+                    return 0
+                rate /= price
+            else:
+                price = market.get('BestBid', None)
+                if not price or price <= 0:
+                    return 0
+                rate *= price
+        return rate
+
+    def describe_cycle(self, legs, rate):
+        """
+            Returns cycle in the format used by CryptoTrader.get_arbitrage_possibilities_circle
+        """
+        result = {
+            'return': 100.0 * (rate - 1)
+        }
+        for index, (key, action) in enumerate(legs):
+            result['market' + str(index + 1)] = self._markets[key]
+            result['action' + str(index + 1)] = action
+        return result
+
+    def get_triangle_arbitrage(self, required_rate_of_return, triangles=None):
+        """
+            Returns 3-leg cycles returning more than required_rate_of_return,
+            legs are listed in the order they need to be executed
+        """
+        results = []
+        if triangles is None:
+            triangles = self.get_triangles()
+            triangle_quotes = self._triangle_quotes
+        else:
+            triangle_quotes = [self.get_cycle_quotes(legs) for legs in triangles]
+        for legs, (market1, buy1, market2, buy2, market3, buy3) in zip(triangles, triangle_quotes):
+            try:
+                rate = (1.0 / market1['BestAsk'] if buy1 else market1['BestBid']) * \
+                       (1.0 / market2['BestAsk'] if buy2 else market2['BestBid']) * \
+                       (1.0 / market3['BestAsk'] if buy3 else market3['BestBid'])
+            except (KeyError, TypeError, ZeroDivisionError):
+                continue
+            if rate > required_rate_of_return:
+                results.append(self.describe_cycle(legs, rate))
+        return results
+
+    def get_negative_cycles(self, required_rate_of_return=1.0, max_legs=6):
+        """
+            Bellman-Ford search for cycles of any length with -log(rate) edge
+            weights, a cycle with negative total weight returns more than it
+            costs. Finds at least one cycle through each profitable component,
+            not every possible cycle.
+        """
+        edges = []
+        for key, market in list(self._markets.items()):
+            code_base, code_curr = key
+            bid = market.get('BestBid', None)
+            ask = market.get('BestAsk', None)
+            if bid and bid > 0:
+                edges.append((code_curr, code_base, -math.log(bid), key, 'sell'))
+            if ask and ask > 0:
+                edges.append((code_base, code_curr, math.log(ask), key, 'buy'))
+
+        distance = {}
+        for edge in edges:
+            distance[edge[0]] = 0.0
+            distance[edge[1]] = 0.0
+        predecessor = {}
+        for _ in range(len(distance)):
+            changed = False
+            for edge in edges:
+                if distance[edge[0]] + edge[2] < distance[edge[1]] - 1e-12:
+                    distance[edge[1]] = distance[edge[0]] + edge[2]
+                    predecessor[edge[1]] = edge
+                    changed = True
+            if not changed:
+                return []
+
+        results = []
+        seen = set()
+        for edge in edges:
+            if distance[edge[0]] + edge[2] >= distance[edge[1]] - 1e-12:
+                continue
+            distance[edge[1]] = distance[edge[0]] + edge[2]
+            predecessor[edge[1]] = edge
+            node = edge[1]
+            for _ in range(len(distance)):
+                if node not in predecessor:
+                    break
+                node = predecessor[node][0]
+            if node not in predecessor:
+                continue
+            cycle_edges = []
+            current = node
+            while True:
+                cycle_edges.append(predecessor[current])
+                current = predecessor[current][0]
+                if current == node or len(cycle_edges) > len(distance):
+                    break
+            if current != node:
+                continue
+            cycle_edges.reverse()
+            signature = frozenset((cycle_edge[3], cycle_edge[4]) for cycle_edge in cycle_edges)
+            if signature in seen or len(cycle_edges) > max_legs:
+                continue
+            seen.add(signature)
+            legs = tuple((cycle_edge[3], cycle_edge[4]) for cycle_edge in cycle_edges)
+            rate = self.get_cycle_rate(legs)
+            if rate > required_rate_of_return:
+                result = self.describe_cycle(legs, rate)
+                result['legs'] = len(legs)
+                results.append(result)
+        return results
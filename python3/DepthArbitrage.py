@@ -0,0 +1,123 @@
+import time
+
+
+class DepthArbitrage:
+    """
+        Sizes cross-exchange arbitrage by walking the order books of both legs.
+
+        Buying code_curr at the asks of one exchange and selling it at the bids
+        of another only pays while the marginal bid, after taker fees on both
+        legs, still exceeds the marginal ask times required_rate_of_return.
+        Results are cached per (pair, exchangeAsk, exchangeBid) and reused until
+        one of the two books changes. Books of exchanges without websocket
+        order books are requested over REST at most every rest_book_seconds.
+        Sizing may block on those requests, so it should not run on the GUI thread.
+
+        :param trader: Dictionary of exchange name to Exchange, e.g. CryptoTrader.trader
+        :param depth: Number of levels requested from exchanges without websocket order books
+        :param rest_book_seconds: Seconds a REST order book is reused before it is requested again
+    """
+    def __init__(self, trader, depth=20, rest_book_seconds=5):
+        self._trader = trader
+        self._depth = depth
+        self._rest_book_seconds = rest_book_seconds
+        self._cache = {}
+        self._rest_books = {}
+
+    def get_book_levels(self, exchange, market):
+        """
+            Returns (version, bids, asks) where bids and asks are lists of
+            (price, quantity) starting at the best level. Version compares
+            equal as long as the book did not change.
+        """
+        with self._trader[exchange]._order_book_lock:
+            book = self._trader[exchange]._order_book.get(market, None)
+            if book is not None and hasattr(book, '_version'):
+                return (id(book), book._version), book._bids.top(self._depth), book._asks.top(self._depth)
+
+        timestamp, bids, asks = self._rest_books.get((exchange, market), (None, [], []))
+        if timestamp is None or time.time() - timestamp >= self._rest_book_seconds:
+            consolidated = self._trader[exchange].get_consolidated_order_book(market, self._depth) or {}
+            bids = [(level['Price'], level['Quantity']) for _, level in sorted(consolidated.get('Bid', {}).items())]
+            asks = [(level['Price'], level['Quantity']) for _, level in sorted(consolidated.get('Ask', {}).items())]
+            timestamp = time.time()
+            self._rest_books[(exchange, market)] = (timestamp, bids, asks)
+        return ('REST', timestamp), bids, asks
+
+    @staticmethod
+    def walk_books(asks, bids, fee_ask, fee_bid, withdrawal_fee, required_rate_of_return=1.0):
+        """
+            Matches ask levels of the buying exchange against bid levels of the
+            selling exchange while the marginal trade is profitable.
+            Withdrawal fee is in units of the traded currency and is paid once
+            when moving the bought amount to the selling exchange.
+        """
+        volume = cost = proceeds = 0.0
+        ask_index = bid_index = 0
+        ask_left = asks[0][1] if asks else 0
+        bid_left = bids[0][1] if bids else 0
+        fee_rate = (1 - fee_ask) * (1 - fee_bid)
+        while ask_index < len(asks) and bid_index < len(bids):
+            ask_price = asks[ask_index][0]
+            bid_price = bids[bid_index][0]
+            if ask_price <= 0 or bid_price * fee_rate <= ask_price * required_rate_of_return:
+                break
+            quantity = min(ask_left, bid_left)
+            volume += quantity
+            cost += quantity * ask_price
+            proceeds += quantity * bid_price
+            ask_left -= quantity
+            bid_left -= quantity
+            if ask_left <= 0:
+                ask_index += 1
+                ask_left = asks[ask_index][1] if ask_index < len(asks) else 0
+            if bid_left <= 0:
+                bid_index += 1
+                bid_left = bids[bid_index][1] if bid_index < len(bids) else 0
+
+        result = {
+            'Volume': volume,
+            'BuyVwap': 0,
+            'SellVwap': 0,
+            'Cost': cost,
+            'NetProceeds': 0,
+            'Profit': 0,
+            'NetReturn': 0
+        }
+        if volume > 0:
+            result['BuyVwap'] = cost / volume
+            result['SellVwap'] = proceeds / volume
+            delivered = max(0.0, volume * (1 - fee_ask) - withdrawal_fee)
+            result['NetProceeds'] = result['SellVwap'] * delivered * (1 - fee_bid)
+            result['Profit'] = result['NetProceeds'] - cost
+            result['NetReturn'] = 100.0 * (result['NetProceeds'] / cost - 1)
+        return result
+
+    def get_executable_arbitrage(self, row, required_rate_of_return=1.0):
+        """
+            Sizes a row returned by CryptoTrader.get_exchange_arbitrage
+        """
+        key = (row['code_base'], row['code_curr'], row['exchangeAsk'], row['exchangeBid'])
+        version_ask, _, asks = self.get_book_levels(row['exchangeAsk'], row['marketAsk'])
+        version_bid, bids, _ = self.get_book_levels(row['exchangeBid'], row['marketBid'])
+        cached = self._cache.get(key, None)
+        if cached is not None and cached[:3] == (version_ask, version_bid, required_rate_of_return):
+            return cached[3]
+
+        exchange_ask = self._trader[row['exchangeAsk']]
+        exchange_bid = self._trader[row['exchangeBid']]
+        local_curr = exchange_ask.get_local_code(row['code_curr'])
+        result = self.walk_books(
+            asks,
+            bids,
+            exchange_ask.get_taker_fee(),
+            exchange_bid.get_taker_fee(),
+            exchange_ask.get_withdrawal_fee(local_curr),
+            required_rate_of_return
+        )
+        self._cache[key] = (version_ask, version_bid, required_rate_of_return, result)
+        return result
+
+    def clear(self):
+        self._cache = {}
+        self._rest_books = {}
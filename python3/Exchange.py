@@ -1,12 +1,377 @@
 # Abstract Exchange class. Each exchange implementation should inherit from it.
+import bisect
+import hashlib
+import json
+import os
+import random
+import threading
 import time
 import traceback
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+import websocket
+from requests.adapters import HTTPAdapter
+
+from CurrencyGraph import CurrencyGraph
+from JsonDecoder import get_json_loads
+from MarketDataRecorder import (RECORD_MARKET_QUOTE, RECORD_MARKET_UPDATE, RECORD_ORDER_BOOK_SNAPSHOT,
+                                RECORD_WEBSOCKET_FRAME)
+from MarketRecord import QUOTE_FIELDS, MarketRecord
+from MarketStore import MarketStore
+from RateLimiter import RateLimiter
+from RequestCache import RequestCache
+from RetryPolicy import CircuitOpenError, RequestError, RetryPolicy
+
+METADATA_CACHE_VERSION = 1
+MARKET_DEFINITION_KEYS = (
+    'BaseMinAmount',
+    'BaseIncrement',
+    'CurrMinAmount',
+    'CurrIncrement',
+    'PriceMin',
+    'PriceIncrement',
+    'IsActive',
+    'IsRestricted',
+    'Notice',
+)
+MARKET_DEFAULTS = {
+    'BaseMinAmount':    0,
+    'BaseIncrement':    0.00000001,
+    'CurrMinAmount':    0,
+    'CurrIncrement':    0.00000001,
+    'PriceMin':         0,
+    'PriceIncrement':   0.00000001,
+    'IsActive':         True,
+    'IsRestricted':     False,
+    'Notice':           '',
+}
+
+
+class OrderBookSide:
+    """
+        One side of an order book kept as a sorted list of price levels.
+        Bid prices are stored negated, so on both sides the best price is at
+        index 0: updates and removals cost O(log n) to locate the level and
+        reading the top k levels costs O(k).
+        A side loaded from a snapshot cut at a depth only reads levels up to
+        the worst price of the snapshot, deeper levels are unknown.
+    """
+    def __init__(self, descending=False):
+        self._sign = -1 if descending else 1
+        self._keys = []
+        self._levels = {}
+        self._limit = None
+
+    def __len__(self):
+        return len(self._levels)
+
+    def __contains__(self, price):
+        return price in self._levels
+
+    def get(self, price, default=None):
+        return self._levels.get(price, default)
+
+    def load(self, levels, truncated=False):
+        """
+            Replaces the whole side with (price, quantity) pairs, e.g. from a snapshot
+            truncated - the snapshot was cut at a depth, levels beyond its worst price are unknown
+        """
+        self._levels = {price: quantity for price, quantity in levels if quantity != 0}
+        self._keys = sorted(self._sign * price for price in self._levels)
+        self._limit = self._keys[-1] if truncated and self._keys else None
+
+    def get_known_count(self):
+        """
+            Number of levels from the best price which are known to be complete
+        """
+        if self._limit is None:
+            return len(self._keys)
+        return bisect.bisect_right(self._keys, self._limit)
+
+    def update(self, price, quantity):
+        """
+            Sets quantity at a price level, zero quantity removes the level
+        """
+        if quantity == 0:
+            self.remove(price)
+            return
+        if price not in self._levels:
+            bisect.insort(self._keys, self._sign * price)
+        self._levels[price] = quantity
+
+    def remove(self, price):
+        if self._levels.pop(price, None) is not None:
+            index = bisect.bisect_left(self._keys, self._sign * price)
+            if index < len(self._keys) and self._keys[index] == self._sign * price:
+                del self._keys[index]
+
+    def clear(self):
+        self._keys = []
+        self._levels = {}
+        self._limit = None
+
+    def best(self):
+        """
+            Returns (price, quantity) of the best level or None for an empty side
+        """
+        top = self.top(1)
+        return top[0] if top else None
+
+    def top(self, depth):
+        """
+            Returns up to depth (price, quantity) pairs starting from the best price
+        """
+        results = []
+        for key in self._keys[:min(depth, self.get_known_count())]:
+            price = self._sign * key
+            quantity = self._levels.get(price)
+            if quantity is not None:
+                results.append((price, quantity))
+        return results
+
+    def items(self):
+        """
+            Iterates over all known (price, quantity) pairs starting from the best price
+        """
+        for key in self._keys[:self.get_known_count()]:
+            price = self._sign * key
+            quantity = self._levels.get(price)
+            if quantity is not None:
+                yield price, quantity
+
+
+class OrderBook:
+    """
+        Full depth order book of a single market maintained from websocket updates.
+        Exchanges keep these in self._order_book keyed by market symbol.
+        _version changes with every modification of the book.
+    """
+    def __init__(self, sequence_id=0):
+        self._bids = OrderBookSide(descending=True)
+        self._asks = OrderBookSide()
+        self._sequence_id = sequence_id
+        self._timestamp = time.time()
+        self._version = 0
+
+    def side(self, side):
+        """
+            side is either 'Bid' or 'Ask'
+        """
+        if side == 'Bid':
+            return self._bids
+        return self._asks
+
+    def load(self, bids, asks, sequence_id=None, depth=None):
+        """
+            depth - levels per side requested for the snapshot, a side with
+                    that many levels may have been cut, None for full depth
+        """
+        self._bids.load(bids, depth is not None and len(bids) >= depth)
+        self._asks.load(asks, depth is not None and len(asks) >= depth)
+        if sequence_id is not None:
+            self._sequence_id = sequence_id
+        self._timestamp = time.time()
+        self._version += 1
+
+    def update(self, side, price, quantity):
+        self.side(side).update(price, quantity)
+        self._timestamp = time.time()
+        self._version += 1
+
+    def clear(self):
+        self._bids.clear()
+        self._asks.clear()
+        self._version += 1
+
+    def get_consolidated_order_book(self, depth=5, tradeable=1):
+        """
+            Returns top of the book in the format of Exchange.get_consolidated_order_book
+        """
+        results = {
+            'Tradeable': tradeable,
+            'Bid': {},
+            'Ask': {}
+        }
+        for i, (price, quantity) in enumerate(self._bids.top(depth)):
+            results['Bid'][i] = {
+                'Price': price,
+                'Quantity': quantity,
+            }
+        for i, (price, quantity) in enumerate(self._asks.top(depth)):
+            results['Ask'][i] = {
+                'Price': price,
+                'Quantity': quantity,
+            }
+        return results
+
+
+class WebsocketSupervisor:
+    """
+        Keeps a websocket connection alive.
+
+        run() connects to get_url(), hands the connection to on_open(ws) so
+        subscriptions can be (re)sent, passes every message to on_message and
+        sends ping(ws) or a ping frame every ping_interval seconds and
+        reconnects with jittered exponential backoff after the connection was
+        closed, failed or went stale (no message for stale_seconds). The
+        backoff is reset once a connection stayed up for max_delay seconds.
+        CTMarketDataLoop reads websockets itself and only uses the status
+        bookkeeping and backoff policy of the supervisor.
+    """
+    def __init__(self, name, get_url, on_open, on_message, on_error=None, on_close=None, ping=None,
+                 ping_interval=None, stale_seconds=60, min_delay=1, max_delay=60, read_timeout=1):
+        self._name = name
+        self._get_url = get_url
+        self._on_open = on_open
+        self._on_message = on_message
+        self._on_error = on_error
+        self._on_close = on_close
+        self._ping = ping
+        self._ping_interval = ping_interval
+        self._stale_seconds = stale_seconds
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._read_timeout = read_timeout
+        self._delay = min_delay
+        self._ws = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._status = {
+            'State': 'Stopped',
+            'Reconnects': 0,
+            'ConnectedSince': None,
+            'LastMessage': None,
+            'LastError': '',
+        }
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._ws is not None:
+            self._ws.close()
+
+    def is_connected(self):
+        return self._status['State'] == 'Connected'
+
+    def get_status(self):
+        status = dict(self._status)
+        if status['LastMessage'] is not None:
+            status['SecondsSinceLastMessage'] = time.time() - status['LastMessage']
+        return status
+
+    # ##### Bookkeeping shared with CTMarketDataLoop #####
+    def on_connecting(self):
+        self._status['State'] = 'Connecting'
+
+    def on_connected(self):
+        self._status['State'] = 'Connected'
+        self._status['ConnectedSince'] = time.time()
+        self._status['LastMessage'] = time.time()
+
+    def on_message_received(self):
+        self._status['LastMessage'] = time.time()
+
+    def on_disconnected(self, reason):
+        connected_since = self._status['ConnectedSince']
+        if connected_since is not None and time.time() - connected_since > self._max_delay:
+            self._delay = self._min_delay
+        self._status['State'] = 'Disconnected'
+        self._status['ConnectedSince'] = None
+        self._status['LastError'] = reason
+        print('### {} websocket disconnected: {} ###'.format(self._name, reason))
+
+    def on_stopped(self):
+        self._status['State'] = 'Stopped'
+
+    def is_stale(self):
+        last_message = self._status['LastMessage']
+        return self._stale_seconds is not None and last_message is not None and \
+            time.time() - last_message > self._stale_seconds
+
+    def get_reconnect_delay(self):
+        """
+            Returns jittered delay before the next reconnect and doubles the following one
+        """
+        delay = self._delay * random.uniform(0.5, 1.0)
+        self._delay = min(2 * self._delay, self._max_delay)
+        self._status['Reconnects'] += 1
+        return delay
+
+    # ##### Thread based connection #####
+    def run(self):
+        while not self._stop_event.is_set():
+            self.on_connecting()
+            try:
+                url = self._get_url()
+                if url is None:
+                    self.on_stopped()
+                    return
+                ws = websocket.create_connection(url, timeout=self._read_timeout)
+            except Exception as e:
+                self.on_disconnected(str(e))
+                self._stop_event.wait(self.get_reconnect_delay())
+                continue
+            self._ws = ws
+            self.on_connected()
+            try:
+                self._on_open(ws)
+                reason = self.read(ws)
+            except Exception as e:
+                reason = str(e)
+            finally:
+                ws.close()
+            self.on_disconnected(reason)
+            if self._on_close is not None:
+                self._on_close()
+            if not self._stop_event.is_set():
+                self._stop_event.wait(self.get_reconnect_delay())
+        self.on_stopped()
+
+    def read(self, ws):
+        """
+            Reads messages until the connection is closed, goes stale or the supervisor is stopped.
+            Returns the reason. Pings from the server are answered by websocket-client.
+        """
+        last_ping = time.time()
+        while not self._stop_event.is_set():
+            try:
+                opcode, data = ws.recv_data()
+            except websocket.WebSocketTimeoutException:
+                opcode, data = None, None
+            if opcode == websocket.ABNF.OPCODE_CLOSE:
+                return 'closed by server'
+            if opcode in (websocket.ABNF.OPCODE_TEXT, websocket.ABNF.OPCODE_BINARY):
+                self.on_message_received()
+                if opcode == websocket.ABNF.OPCODE_TEXT:
+                    data = data.decode('utf-8')
+                try:
+                    self._on_message(data)
+                except Exception as e:
+                    if self._on_error is not None:
+                        self._on_error(e)
+            if self.is_stale():
+                return 'no message for {} seconds'.format(self._stale_seconds)
+            if self._ping_interval and time.time() - last_ping > self._ping_interval:
+                if self._ping is not None:
+                    self._ping(ws)
+                else:
+                    ws.ping()
+                last_ping = time.time()
+        return 'stopped'
 
 
 class Exchange:
     def __init__(self, APIKey='', Secret='', PassPhrase=''):
         self.update_api_keys(APIKey, Secret, PassPhrase)
         self._BASE_URL = ''
+        self._WS_URL = ''
+        self._url_override = None
         self._API_KEY = ''
         self._API_SECRET = ''
         self._API_PASSPHRASE = ''
@@ -22,12 +387,34 @@ class Exchange:
         self._map_currency_code_to_exchange_code = {}
         self._map_exchange_code_to_currency_code = {}
         self._map_market_to_global_codes = {}
+        self._market_definitions = {}
+        self._currency_graph = CurrencyGraph()
+        self._quote_matrix = None
+        self._quote_matrix_column = None
+        self._market_store = MarketStore()
+        self._market_records = {}
+        self._market_listeners = []
 
         self._open_orders = {}
         self._recent_market_trades = {}
         self._recent_user_trades = {}
 
         self._order_book = {}
+        self._order_book_lock = threading.RLock()
+        self._order_book_sync = {}
+        self._order_book_max_buffered = 1000
+        self._order_book_max_gap_seconds = 2
+        self._ws_snapshot_depth = None
+        self._clock = time.time
+        self._replaying = False
+
+        self._ws = None
+        self._ws_ping_interval = None
+        self._ws_stale_seconds = 60
+        self._ws_supervisor = None
+
+        self._recorder = None
+        self._recording = threading.local()
 
         self._market_prices = {}
         self._available_balances = {}
@@ -35,12 +422,34 @@ class Exchange:
         self._tick_intervals = {}
         self._tick_lookbacks = {}
         self._map_tick_intervals = {}
+        self._taker_fee = 0.002
         self._max_error_count = 3
+        self._error_lock = threading.Lock()
         self._error = {
             'count': 0,
             'message': '',
             'result_timestamp': time.time()
         }
+        self._retry_policy = None
+        self._response_cache = RequestCache()
+        self._response_cache_enabled = True
+        self._response_cache_default_ttl = 0
+        self._response_cache_ttls = {}
+
+        self._metadata_cache_directory = None
+        self._metadata_cache_ttl = 24 * 60 * 60
+        self._metadata_cache = None
+
+        self._http_pool_size = 10
+        self._http_timeout = 10
+        self._http_session = None
+        self.init_http_session()
+
+        self._json_backend, self._json_loads = get_json_loads()
+
+        self._rate_limits = {}
+        self._rate_limit_utilization = 0.9
+        self._rate_limiter = None
 
     def update_api_keys(self, APIKey='', Secret='', PassPhrase=''):
         self._API_KEY = APIKey
@@ -53,6 +462,478 @@ class Exchange:
     def has_implementation(self, name):
         return name in self._implements
 
+    def set_urls(self, base_url=None, ws_url=None):
+        """
+            Points REST requests and websockets of the exchange at another
+            server than the production one, e.g. a local MockExchangeServer.
+            None keeps the current url. Overridden REST urls get their own
+            metadata cache file, so definitions of another server never
+            replace the production ones.
+            Debug: ct['Binance'].set_urls('http://127.0.0.1:8765/binance', 'ws://127.0.0.1:8765/binance')
+        """
+        if base_url is not None:
+            if self._BASE_URL.endswith('/') and not base_url.endswith('/'):
+                base_url += '/'
+            if base_url != self._BASE_URL:
+                self._url_override = base_url
+                self._metadata_cache = None
+            self._BASE_URL = base_url
+        if ws_url is not None:
+            self._WS_URL = ws_url
+
+    # ##### Metadata cache #####
+    def init_metadata_cache(self, directory, ttl=None):
+        """
+            Enables on-disk cache of currency and market definitions.
+            directory - folder holding one json file per exchange
+            ttl - seconds after which cached definitions should be refreshed
+        """
+        self._metadata_cache_directory = directory
+        if ttl is not None:
+            self._metadata_cache_ttl = ttl
+        self._metadata_cache = None
+
+    def get_metadata_cache_file_name(self):
+        name = self.__class__.__name__
+        if self._url_override is not None:
+            name += '-' + hashlib.sha1(self._url_override.encode()).hexdigest()[:12]
+        return os.path.join(self._metadata_cache_directory, name + '.json')
+
+    def read_metadata_cache(self):
+        """
+            Returns cached definitions or None if there is no usable cache
+        """
+        if self._metadata_cache_directory is None:
+            return None
+        if self._metadata_cache is None:
+            try:
+                with open(self.get_metadata_cache_file_name(), 'r') as cache_file:
+                    cache = json.load(cache_file)
+                if cache.get('Version', None) == METADATA_CACHE_VERSION:
+                    self._metadata_cache = cache
+            except (OSError, ValueError):
+                return None
+        return self._metadata_cache
+
+    def save_metadata_cache(self):
+        """
+            Writes current currency and market definitions to the cache
+        """
+        if self._metadata_cache_directory is None or not self._currencies or not self._market_definitions:
+            return
+        cache = {
+            'Version': METADATA_CACHE_VERSION,
+            'Timestamp': time.time(),
+            'Currencies': dict(self._currencies),
+            'Markets': dict(self._market_definitions),
+            'Extras': self.get_metadata_cache_extras(),
+        }
+        os.makedirs(self._metadata_cache_directory, exist_ok=True)
+        file_name = self.get_metadata_cache_file_name()
+        with open(file_name + '.tmp', 'w') as cache_file:
+            json.dump(cache, cache_file, separators=(',', ':'))
+        os.replace(file_name + '.tmp', file_name)
+        self._metadata_cache = cache
+
+    def metadata_cache_expires_in(self):
+        """
+            Seconds until cached definitions expire, 0 if missing or expired
+        """
+        cache = self.read_metadata_cache()
+        if cache is None:
+            return 0
+        return max(0, cache['Timestamp'] + self._metadata_cache_ttl - time.time())
+
+    def load_cached_currency_definitions(self):
+        """
+            Loads currency definitions from the cache, returns False if the cache is not available
+        """
+        cache = self.read_metadata_cache()
+        if cache is None:
+            return False
+        self.apply_currency_definitions(cache['Currencies'])
+        self.set_metadata_cache_extras(cache.get('Extras', {}))
+        return True
+
+    def load_cached_market_definitions(self):
+        """
+            Loads market definitions from the cache, returns False if the cache is not available
+            * Assumes that currency mappings are already available
+        """
+        cache = self.read_metadata_cache()
+        if cache is None:
+            return False
+        for market_symbol, definition in cache['Markets'].items():
+            try:
+                self.update_market(market_symbol, dict(definition))
+            except Exception as e:
+                self.log_request_error(str(e))
+        return True
+
+    def get_metadata_cache_extras(self):
+        """
+            Exchange specific state filled in while loading definitions that
+            has to be cached together with them
+        """
+        return {}
+
+    def set_metadata_cache_extras(self, extras):
+        pass
+
+    # ##### HTTP connection pool #####
+    def init_http_session(self, pool_size=None, timeout=None):
+        """
+            Creates a keep-alive session shared by all REST calls of the exchange
+            so that consecutive requests reuse pooled TCP/TLS connections.
+            pool_size - maximum number of connections kept open per host
+            timeout - seconds to wait for connect/read before giving up
+        """
+        if pool_size is not None:
+            self._http_pool_size = pool_size
+        if timeout is not None:
+            self._http_timeout = timeout
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self._http_pool_size, pool_maxsize=self._http_pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        old_session = self._http_session
+        self._http_session = session
+        if old_session is not None:
+            old_session.close()
+
+    def http_request(self, method, url, **kwargs):
+        """
+            Sends a request through the exchange connection pool, method is e.g. 'get' or 'post'.
+            Waits for the rate limiter first and feeds it with limits reported by the server.
+        """
+        kwargs.setdefault('timeout', self._http_timeout)
+        split_url = urlsplit(url)
+        weights = self.get_request_weights(method.lower(), split_url.path, parse_qs(split_url.query))
+        self.get_rate_limiter().acquire(weights)
+        response = self._http_session.request(method.upper(), url, **kwargs)
+        self.update_rate_limits(response)
+        return response
+
+    def http_get(self, url, **kwargs):
+        return self.http_request('get', url, **kwargs)
+
+    def http_post(self, url, **kwargs):
+        return self.http_request('post', url, **kwargs)
+
+    # ##### Market data recording #####
+    def set_recorder(self, recorder):
+        """
+            Records websocket frames and market updates of the exchange with a
+            MarketDataRecorder, None stops recording
+        """
+        self._recorder = recorder
+
+    def is_recording_outside_frame(self):
+        """
+            True when recording and not inside ws_receive, i.e. the update came
+            from REST and is not reproduced by replaying recorded frames
+        """
+        return self._recorder is not None and not getattr(self._recording, 'in_frame', False)
+
+    def set_replay_clock(self, clock):
+        """
+            Switches the exchange to replay of recorded market data, see
+            MarketDataReplay: order book gaps are timed by clock.time() instead
+            of the wall clock and resyncs wait for the recorded REST snapshot
+            instead of requesting one. None switches back to live data.
+        """
+        self._clock = time.time if clock is None else clock.time
+        self._replaying = clock is not None
+
+    # ##### Rate limits #####
+    def init_rate_limiter(self, enabled=True, utilization=None):
+        """
+            Rebuilds the rate limiter from the published limits of the exchange in _rate_limits.
+            utilization - fraction of the published limits to use
+        """
+        if utilization is not None:
+            self._rate_limit_utilization = utilization
+        self._rate_limiter = RateLimiter(self._rate_limits if enabled else {}, self._rate_limit_utilization)
+
+    def get_rate_limiter(self):
+        if self._rate_limiter is None:
+            self.init_rate_limiter()
+        return self._rate_limiter
+
+    def get_rate_limit_status(self):
+        """
+            Debug: ct['Binance'].get_rate_limit_status()
+        """
+        return self.get_rate_limiter().get_status()
+
+    def get_request_weights(self, method, path, query):
+        """
+            Returns dictionary of rate limit bucket name to weight of a request.
+            Default counts every request once against every bucket,
+            exchanges with endpoint weights override it.
+            query - dictionary of parameter name to list of values
+        """
+        return {name: 1 for name in self._rate_limits}
+
+    def update_rate_limits(self, response):
+        """
+            Pauses the rate limiter when the server asks to back off,
+            exchanges reporting used weight in headers extend it
+        """
+        if response.status_code in (418, 429):
+            try:
+                retry_after = float(response.headers.get('Retry-After', 1))
+            except ValueError:
+                retry_after = 1
+            print('### {} rate limited for {} seconds'.format(self.__class__.__name__, retry_after))
+            self.get_rate_limiter().pause(retry_after)
+
+    # ##### Websockets #####
+    def ws_start(self):
+        """
+            Starts the supervised websocket connection of the exchange in its
+            own thread, it reconnects until the exchange is stopped.
+            Exchanges without websockets ignore it.
+        """
+        self.ws_get_supervisor().start()
+
+    def ws_stop(self):
+        if self._ws_supervisor is not None:
+            self._ws_supervisor.stop()
+
+    def ws_get_supervisor(self):
+        if self._ws_supervisor is None:
+            self._ws_supervisor = WebsocketSupervisor(
+                self.__class__.__name__,
+                self.ws_get_url,
+                self.ws_on_connect,
+                self.ws_receive,
+                on_error=self.ws_on_error,
+                on_close=self.ws_on_close,
+                ping=self.ws_ping,
+                ping_interval=self._ws_ping_interval,
+                stale_seconds=self._ws_stale_seconds
+            )
+        return self._ws_supervisor
+
+    def ws_is_connected(self):
+        return self._ws_supervisor is not None and self._ws_supervisor.is_connected()
+
+    def get_ws_status(self):
+        """
+            Connection state, reconnect count and time since the last message
+            Debug: ct['Poloniex'].get_ws_status()
+        """
+        return self.ws_get_supervisor().get_status()
+
+    def ws_get_url(self):
+        """
+            Returns websocket url used for every (re)connect or None if the
+            exchange does not have websocket feeds
+        """
+        return None
+
+    def ws_on_connect(self, ws):
+        self._ws = ws
+        self.ws_on_open()
+
+    def ws_on_open(self):
+        """
+            Called after every (re)connect, sends all active subscriptions
+        """
+        pass
+
+    def ws_on_message(self, message):
+        pass
+
+    def ws_receive(self, message):
+        """
+            Entry point of every received websocket frame, records it when a
+            recorder is set and passes it to ws_on_message
+        """
+        if self._recorder is None:
+            return self.ws_on_message(message)
+        self._recorder.record(self.__class__.__name__, RECORD_WEBSOCKET_FRAME, message)
+        self._recording.in_frame = True
+        try:
+            return self.ws_on_message(message)
+        finally:
+            self._recording.in_frame = False
+
+    def ws_ping(self, ws):
+        """
+            Keep-alive sent every _ws_ping_interval seconds, a ping frame unless the exchange expects its own message
+        """
+        ws.ping()
+
+    def ws_on_error(self, error):
+        print('*** {} websocket ERROR: {}'.format(self.__class__.__name__, error))
+
+    def ws_on_close(self):
+        """
+            Called after the connection was lost, before reconnecting
+        """
+        pass
+
+    # ##### Sequenced websocket order books #####
+    def ws_get_order_book_snapshot(self, market):
+        """
+            Returns (sequence_id, bids, asks) of a REST order book snapshot,
+            bids and asks are lists of (price, quantity). Implemented by
+            exchanges feeding sequenced deltas to ws_on_order_book_delta.
+        """
+        self.raise_not_implemented_error()
+
+    def get_order_book_sync(self, market):
+        """
+            Synchronization state of a websocket order book, call with self._order_book_lock held
+        """
+        state = self._order_book_sync.get(market, None)
+        if state is None:
+            state = {
+                'Buffer': {},
+                'GapSince': None,
+                'Resyncing': False,
+                'Gaps': 0,
+                'Resyncs': 0,
+                'ResyncErrors': 0,
+                'OutOfOrder': 0,
+                'Stale': 0,
+            }
+            self._order_book_sync[market] = state
+        return state
+
+    def get_order_book_sync_stats(self):
+        """
+            Gap and resync counters of websocket order books per market
+            Debug: ct['Poloniex'].get_order_book_sync_stats()
+        """
+        with self._order_book_lock:
+            return {
+                market: {
+                    key: value for key, value in state.items() if key not in ('Buffer', 'GapSince', 'Resyncing')
+                } for market, state in self._order_book_sync.items()
+            }
+
+    def ws_load_order_book(self, market, sequence_id, bids, asks, depth=None):
+        """
+            Replaces the book with a snapshot and applies buffered deltas newer than the snapshot.
+            depth - levels per side requested for a REST snapshot, None for full depth snapshots
+        """
+        if self.is_recording_outside_frame():
+            bids = [tuple(level) for level in bids]
+            asks = [tuple(level) for level in asks]
+            self._recorder.record(self.__class__.__name__, RECORD_ORDER_BOOK_SNAPSHOT, market, sequence_id, bids, asks)
+        with self._order_book_lock:
+            book = self._order_book.get(market, None)
+            if book is None:
+                book = OrderBook(sequence_id)
+                self._order_book[market] = book
+            book.load(bids, asks, sequence_id, depth)
+            self.ws_apply_buffered_order_book_deltas(market, book, self.get_order_book_sync(market))
+
+    def ws_on_order_book_delta(self, market, first_sequence_id, last_sequence_id, updates):
+        """
+            Applies a sequenced delta covering first_sequence_id..last_sequence_id
+            to the book of the market. updates is a list of (side, price, quantity)
+            with side 'Bid' or 'Ask'. Deltas arriving ahead of the book are buffered,
+            a gap not filled within _order_book_max_gap_seconds (or by
+            _order_book_max_buffered deltas) triggers a REST snapshot resync.
+        """
+        with self._order_book_lock:
+            state = self.get_order_book_sync(market)
+            book = self._order_book.get(market, None)
+            if book is None or state['Resyncing'] or first_sequence_id > book._sequence_id + 1:
+                if book is not None and not state['Resyncing']:
+                    state['OutOfOrder'] += 1
+                state['Buffer'][first_sequence_id] = (first_sequence_id, last_sequence_id, updates)
+                if state['GapSince'] is None:
+                    state['GapSince'] = self._clock()
+                if not state['Resyncing'] and (
+                        len(state['Buffer']) > self._order_book_max_buffered or
+                        self._clock() - state['GapSince'] > self._order_book_max_gap_seconds):
+                    state['Gaps'] += 1
+                    self.ws_resync_order_book(market)
+                return
+            if last_sequence_id <= book._sequence_id:
+                state['Stale'] += 1
+                return
+            self.ws_apply_order_book_updates(book, last_sequence_id, updates)
+            if state['Buffer']:
+                self.ws_apply_buffered_order_book_deltas(market, book, state)
+
+    def ws_check_order_book_gaps(self):
+        """
+            Resyncs books whose gap stayed open, for feeds calling it periodically
+            (e.g. on heartbeats) so a gap before a quiet period is not missed
+        """
+        with self._order_book_lock:
+            for market, state in self._order_book_sync.items():
+                if not state['Resyncing'] and state['GapSince'] is not None and \
+                        self._clock() - state['GapSince'] > self._order_book_max_gap_seconds:
+                    state['Gaps'] += 1
+                    self.ws_resync_order_book(market)
+
+    @staticmethod
+    def ws_apply_order_book_updates(book, sequence_id, updates):
+        for side, price, quantity in updates:
+            book.update(side, price, quantity)
+        book._sequence_id = sequence_id
+
+    def ws_apply_buffered_order_book_deltas(self, market, book, state):
+        """
+            Applies buffered deltas continuing the book sequence, drops those already contained in the book
+        """
+        buffer = state['Buffer']
+        for first_sequence_id in sorted(buffer):
+            first_sequence_id, last_sequence_id, updates = buffer[first_sequence_id]
+            if last_sequence_id <= book._sequence_id:
+                del buffer[first_sequence_id]
+            elif first_sequence_id <= book._sequence_id + 1:
+                self.ws_apply_order_book_updates(book, last_sequence_id, updates)
+                del buffer[first_sequence_id]
+            else:
+                break
+        state['GapSince'] = self._clock() if buffer else None
+
+    def ws_resync_order_book(self, market):
+        """
+            Reloads the book from a REST snapshot in a background thread,
+            deltas arriving meanwhile are buffered
+        """
+        with self._order_book_lock:
+            state = self.get_order_book_sync(market)
+            if state['Resyncing']:
+                return
+            state['Resyncing'] = True
+        if self._replaying:
+            return
+        threading.Thread(target=self._ws_resync_order_book, args=(market, ), daemon=True).start()
+
+    def _ws_resync_order_book(self, market):
+        try:
+            sequence_id, bids, asks = self.ws_get_order_book_snapshot(market)
+        except Exception as e:
+            print('{} order book resync of {} failed: {}'.format(self.__class__.__name__, market, e))
+            with self._order_book_lock:
+                state = self.get_order_book_sync(market)
+                state['Resyncing'] = False
+                state['ResyncErrors'] += 1
+                state['GapSince'] = self._clock()
+            return
+        self.ws_on_order_book_snapshot(market, sequence_id, bids, asks)
+
+    def ws_on_order_book_snapshot(self, market, sequence_id, bids, asks):
+        """
+            Loads the REST snapshot of a resync, also called with recorded snapshots on replay.
+            Snapshots cut at _ws_snapshot_depth only expose levels up to their worst price.
+        """
+        with self._order_book_lock:
+            state = self.get_order_book_sync(market)
+            state['Resyncing'] = False
+            state['Resyncs'] += 1
+            self.ws_load_order_book(market, sequence_id, bids, asks, self._ws_snapshot_depth)
+
     # ##### Error handling #####
     def raise_not_implemented_error(self):
         raise NotImplementedError("Class {} needs to implement method {}!!!".format(
@@ -62,26 +943,139 @@ class Exchange:
         )
 
     def log_request_success(self):
-        self._error = {
-            'count': 0,
-            'message': '',
-            'result_timestamp': time.time()
-        }
+        with self._error_lock:
+            self._error = {
+                'count': 0,
+                'message': '',
+                'result_timestamp': time.time()
+            }
 
-    def log_request_error(self, message):
+    def log_request_error(self, message, method=None):
         error_message = 'Exception in class {} method {}: {}'.format(
             self.__class__.__name__,
-            traceback.extract_stack(None, 2)[0][2],
+            method or traceback.extract_stack(None, 2)[0][2],
             message
         )
         print(error_message)
-        self._error = {
-            'count': self._error['count'] + 1,
-            'message': error_message
-        }
+        with self._error_lock:
+            self._error = {
+                'count': self._error['count'] + 1,
+                'message': error_message,
+                'result_timestamp': self._error.get('result_timestamp', None)
+            }
+
+    def get_error_status(self):
+        with self._error_lock:
+            return dict(self._error)
+
+    # ##### Retries #####
+    def init_retry_policy(self, max_attempts=None, base_delay=0.5, max_delay=10, failure_threshold=5,
+                          reset_seconds=30):
+        if max_attempts is not None:
+            self._max_error_count = max_attempts
+        self._retry_policy = RetryPolicy(self._max_error_count, base_delay, max_delay, failure_threshold,
+                                         reset_seconds)
 
-    def retry_count_not_exceeded(self):
-        return self._error['count'] < self._max_error_count
+    def get_retry_policy(self):
+        if self._retry_policy is None:
+            self.init_retry_policy()
+        return self._retry_policy
+
+    def get_circuit_breaker_status(self):
+        """
+            Debug: ct['Bittrex'].get_circuit_breaker_status()
+        """
+        return self.get_retry_policy().get_status()
+
+    def request_with_retry(self, endpoint, send, idempotent=True, default=None, key=None):
+        """
+            Calls send() under the retry policy of the exchange. send() returns
+            the result or raises, e.g. RequestError for errors returned by the
+            exchange. Errors are logged against the calling method and default
+            is returned once the policy gives up.
+            endpoint - key of the circuit breaker, e.g. the path without query
+            key - identifies idempotent requests with equal results, concurrent
+                  calls with the same key share one request and its result is
+                  cached for the TTL of the endpoint (treat it as read-only)
+        """
+        method = traceback.extract_stack(None, 2)[0][2]
+
+        def call():
+            return self.get_retry_policy().call(
+                endpoint,
+                send,
+                idempotent,
+                lambda error, attempt: self.log_request_error('{}: {}'.format(endpoint, error), method)
+            )
+
+        try:
+            if idempotent and key is not None and self._response_cache_enabled:
+                result = self._response_cache.get(key, call, self.get_response_cache_ttl(endpoint))
+            else:
+                result = call()
+        except CircuitOpenError as e:
+            self.log_request_error(str(e), method)
+            return default
+        except Exception:
+            return default
+        finally:
+            if not idempotent:
+                self._response_cache.clear()
+        self.log_request_success()
+        return result
+
+    # ##### Response cache #####
+    def init_response_cache(self, enabled=True, default_ttl=None, ttls=None):
+        """
+            default_ttl - seconds results of endpoints without own TTL are cached,
+                          0 only merges concurrent identical requests
+            ttls - dictionary of endpoint to seconds overriding TTLs of the exchange
+        """
+        self._response_cache_enabled = enabled
+        if default_ttl is not None:
+            self._response_cache_default_ttl = default_ttl
+        if ttls:
+            self._response_cache_ttls = dict(self._response_cache_ttls, **ttls)
+        self._response_cache.clear()
+
+    def get_response_cache_ttl(self, endpoint):
+        return self._response_cache_ttls.get(endpoint, self._response_cache_default_ttl)
+
+    def get_response_cache_status(self):
+        """
+            Debug: ct['Binance'].get_response_cache_status()
+        """
+        return self._response_cache.get_status()
+
+    def get_response_json(self, response):
+        """
+            Returns decoded body of a response, raises retryable RequestError
+            for throttled (429, 418) and server error (5xx) responses. Only
+            throttled requests were certainly not executed, 5xx requests may
+            have been.
+        """
+        if response.status_code in (418, 429) or response.status_code >= 500:
+            retry_after = response.headers.get('Retry-After', None)
+            raise RequestError(
+                'HTTP {} {}'.format(response.status_code, response.reason),
+                retryable=True,
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+                safe_to_resend=response.status_code in (418, 429)
+            )
+        return self.decode_json(response.content)
+
+    # ##### JSON decoding #####
+    def init_json_decoder(self, backend='auto'):
+        """
+            backend - 'auto' (fastest installed), 'orjson', 'ujson', 'simdjson' or 'json'
+        """
+        self._json_backend, self._json_loads = get_json_loads(backend)
+
+    def decode_json(self, data):
+        """
+            Decodes REST bodies and websocket frames (str or bytes) with the configured backend
+        """
+        return self._json_loads(data)
 
     # ##### Generic methods #####
     def get_consolidated_currency_definitions(self):
@@ -110,7 +1104,9 @@ class Exchange:
                     ...
                 }
         """
-        currencies = self.get_consolidated_currency_definitions()
+        self.apply_currency_definitions(self.get_consolidated_currency_definitions())
+
+    def apply_currency_definitions(self, currencies):
         for currency in currencies.keys():
             if currency in self._currencies:
                 self._currencies[currency].update(currencies[currency])
@@ -148,7 +1144,12 @@ class Exchange:
                 'Created':       datetime,
                 'LogoUrl':       'url',
             }
+            Fields missing in update_dict keep their current values, defaults
+            only fill fields the market does not have yet. Changed fields are
+            reported to market listeners, see add_market_listener.
         """
+        if self.is_recording_outside_frame():
+            self._recorder.record(self.__class__.__name__, RECORD_MARKET_UPDATE, market_symbol, dict(input_dict))
         local_base = input_dict.pop('LocalBase', None)
         local_curr = input_dict.pop('LocalCurr', None)
         if local_base is not None and local_curr is not None:
@@ -168,34 +1169,127 @@ class Exchange:
                 code_base = self.get_global_code(local_base)
                 code_curr = self.get_global_code(local_curr)
 
-        if code_base not in self._markets:
-            self._markets[code_base] = {}
-        if code_curr not in self._markets[code_base]:
-            self._markets[code_base][code_curr] = {}
-        if code_base not in self._active_markets:
-            self._active_markets[code_base] = {}
-        if code_curr not in self._active_markets[code_base]:
-            self._active_markets[code_base][code_curr] = {}
+        market = self._markets.setdefault(code_base, {}).get(code_curr, None)
+        if market is None:
+            market = MarketRecord()
+            self._markets[code_base][code_curr] = market
+        self._market_records[market_symbol] = (market, code_base, code_curr)
+        base_active_markets = self._active_markets.setdefault(code_base, {})
 
         update_dict = {
             'MarketSymbol':     market_symbol,
-            'BaseMinAmount':    0,
-            'BaseIncrement':    0.00000001,
-            'CurrMinAmount':    0,
-            'CurrIncrement':    0.00000001,
-            'PriceMin':         0,
-            'PriceIncrement':   0.00000001,
-            'IsActive':         True,
-            'IsRestricted':     False,
-            'Notice':           '',
         }
+        for key, value in MARKET_DEFAULTS.items():
+            if key not in market:
+                update_dict[key] = value
         update_dict.update(input_dict)
-        self._markets[code_base][code_curr].update(update_dict)
 
-        if update_dict['IsActive'] and not update_dict['IsRestricted']:
-            self._active_markets[code_base][code_curr].update(update_dict)
+        changes = None
+        if self._market_listeners:
+            changes = {}
+            for key, value in update_dict.items():
+                previous = market.get(key, None)
+                if previous != value or key not in market:
+                    changes[key] = (previous, value)
+        market.update(update_dict)
+
+        if local_base is not None and local_curr is not None:
+            definition = {key: market[key] for key in MARKET_DEFINITION_KEYS}
+            definition['LocalBase'] = local_base
+            definition['LocalCurr'] = local_curr
+            self._market_definitions[market_symbol] = definition
+
+        if market['IsActive'] and not market['IsRestricted']:
+            base_active_markets[code_curr] = market
+            self._currency_graph.add_market(code_base, code_curr, market)
+            self._market_store.update(code_base, code_curr, market)
+            if self._quote_matrix is not None:
+                self._quote_matrix.update(self._quote_matrix_column, code_base, code_curr, market)
         else:
-            self._active_markets[code_base].pop(code_curr)
+            base_active_markets.pop(code_curr, None)
+            self._currency_graph.remove_market(code_base, code_curr)
+            self._market_store.remove(code_base, code_curr)
+            if self._quote_matrix is not None:
+                self._quote_matrix.remove(self._quote_matrix_column, code_base, code_curr)
+
+        if changes:
+            self.notify_market_listeners(code_base, code_curr, changes)
+
+    def update_market_quote(self, market_symbol, *quote):
+        """
+            In place update of quotes of a known market for feeds sending many
+            ticks per second, e.g. Binance !ticker@arr. quote holds values in
+            the order of QUOTE_FIELDS (BestBid, BestAsk, BestBidSize, ...),
+            None keeps the current value, trailing values may be left out.
+            Writes straight into the MarketRecord without building a dictionary
+            per tick. Markets not defined yet go through update_market.
+        """
+        if self.is_recording_outside_frame():
+            self._recorder.record(self.__class__.__name__, RECORD_MARKET_QUOTE, market_symbol, quote)
+        entry = self._market_records.get(market_symbol, None)
+        if entry is None:
+            self.update_market(
+                market_symbol,
+                {field: value for field, value in zip(QUOTE_FIELDS, quote) if value is not None}
+            )
+            return
+        market, code_base, code_curr = entry
+        changes = {} if self._market_listeners else None
+        market.update_quote(quote, changes)
+
+        if market.get('IsActive', False) and not market.get('IsRestricted', False):
+            self._market_store.update(code_base, code_curr, market)
+            if self._quote_matrix is not None:
+                self._quote_matrix.update(self._quote_matrix_column, code_base, code_curr, market)
+            if changes:
+                self.notify_market_listeners(code_base, code_curr, changes)
+
+    def add_market_listener(self, listener):
+        """
+            Registers listener(exchange, code_base, code_curr, changes) called by
+            update_market after a market changed, changes maps each changed field
+            to (old value, new value). Listeners run in the thread that updated
+            the market, e.g. a websocket thread.
+        """
+        if listener not in self._market_listeners:
+            self._market_listeners = self._market_listeners + [listener]
+
+    def remove_market_listener(self, listener):
+        self._market_listeners = [item for item in self._market_listeners if item != listener]
+
+    def notify_market_listeners(self, code_base, code_curr, changes):
+        for listener in self._market_listeners:
+            try:
+                listener(self, code_base, code_curr, changes)
+            except Exception as e:
+                print('Exception in market listener of {}: {}'.format(self.__class__.__name__, e))
+                traceback.print_exc()
+
+    def get_active_markets_snapshot(self):
+        """
+            Returns active markets as code_base -> code_curr -> market copied at
+            one point in time, safe to iterate while websockets update markets.
+            Treat it as read-only.
+            Debug: ct['Binance'].get_active_markets_snapshot()['BTC']['ETH']
+        """
+        return self._market_store.snapshot()[1]
+
+    def get_versioned_active_markets(self):
+        """
+            Returns (version, markets) of get_active_markets_snapshot, version
+            stays the same as long as no active market changed
+        """
+        return self._market_store.snapshot()
+
+    def set_quote_matrix(self, quote_matrix, column):
+        """
+            Makes update_market keep best quotes of active markets in a shared QuoteMatrix column
+        """
+        self._quote_matrix = quote_matrix
+        self._quote_matrix_column = column
+        for code_base in list(self._active_markets):
+            for code_curr, market in list(self._active_markets[code_base].items()):
+                quote_matrix.update(column, code_base, code_curr, market)
 
     def get_market_symbol(self, code_base, code_curr):
         return self._markets[code_base][code_curr]['MarketSymbol']
@@ -280,6 +1374,29 @@ class Exchange:
         """
         self.raise_not_implemented_error()
 
+    def get_taker_fee(self):
+        """
+            Fee rate charged on orders taking liquidity, e.g. 0.002 for 0.2%
+        """
+        return self._taker_fee
+
+    def get_withdrawal_fee(self, local_code):
+        """
+            Withdrawal fee in units of the currency
+        """
+        return self._currencies.get(local_code, {}).get('WithdrawalFee', 0)
+
+    def get_ws_order_book(self, market, depth=5):
+        """
+            Returns top of the websocket maintained order book in the format of
+            get_consolidated_order_book or None if the market book is not loaded yet
+        """
+        with self._order_book_lock:
+            book = self._order_book.get(market, None)
+            if book is None:
+                return None
+            return book.get_consolidated_order_book(depth)
+
     def get_consolidated_klines(self, market_symbol, interval, lookback):
         """
             interval is an exchange specific name, e.g. 'fiveMin'
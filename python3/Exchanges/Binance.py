@@ -1,15 +1,145 @@
 import hashlib
 import hmac
 import json
+import threading
 import time
 from datetime import datetime
 
-import requests
-import websocket
-from PyQt5.QtCore import QThreadPool
+from Exchange import Exchange, WebsocketSupervisor
+from JsonDecoder import get_field_extractor
+from RetryPolicy import RequestError
+
+
+class BinanceStreamConnection:
+    """
+        One websocket on Binance combined stream endpoint.
+
+        Streams known when connecting are part of the url, later ones are
+        added with SUBSCRIBE / UNSUBSCRIBE requests. Requests are queued and
+        sent by a sender thread at the limit of 5 incoming messages per
+        second per connection, so callers on the GUI thread never wait.
+        The primary connection of the exchange is supervised by the exchange
+        itself (see Exchange.ws_start or CTMarketDataLoop), additional ones
+        have their own WebsocketSupervisor and replay their streams after
+        every reconnect.
+    """
+    _MAX_REQUESTS_PER_SECOND = 5
+
+    def __init__(self, exchange, streams=()):
+        self._exchange = exchange
+        self._streams = set(streams)
+        self._url_streams = set()
+        self._ws = None
+        self._supervisor = None
+        self._connected = False
+        self._lock = threading.Lock()
+        self._request_id = 0
+        self._request_times = []
+        self._pending_requests = []
+        self._sender = None
+
+    def get_url(self):
+        self._url_streams = set(self._streams)
+        return self._exchange._WS_URL + '/stream?streams=' + '/'.join(sorted(self._url_streams))
+
+    def start(self):
+        """
+            Streams of a single market can stay quiet for long, so there is no staleness limit
+        """
+        if self._supervisor is None:
+            self._supervisor = WebsocketSupervisor(
+                'Binance streams',
+                self.get_url,
+                self.on_open,
+                self._exchange.ws_receive,
+                on_error=self._exchange.ws_on_error,
+                on_close=self.on_close,
+                stale_seconds=None
+            )
+        self._supervisor.start()
+
+    def get_status(self):
+        if self._supervisor is None:
+            return self._exchange.get_ws_status()
+        return self._supervisor.get_status()
+
+    def on_open(self, ws):
+        self._ws = ws
+        self._connected = True
+        missing = sorted(self._streams - self._url_streams)
+        if missing:
+            self.send_request('SUBSCRIBE', missing)
+        self._exchange.ws_on_stream_connection_open(self)
+
+    def on_close(self):
+        """
+            Queued requests are dropped, on_open subscribes the streams missing from the url again
+        """
+        with self._lock:
+            self._connected = False
+            self._pending_requests = []
 
-from Exchange import Exchange
-from Worker import CTWorker
+    def close(self):
+        if self._supervisor is not None:
+            self._supervisor.stop()
+
+    def subscribe(self, stream):
+        self._streams.add(stream)
+        if self._connected:
+            self.send_request('SUBSCRIBE', [stream])
+
+    def unsubscribe(self, stream):
+        self._streams.discard(stream)
+        if self._connected:
+            self.send_request('UNSUBSCRIBE', [stream])
+
+    def send_request(self, method, streams):
+        """
+            Queues the request and starts the sender thread if it is not
+            running. A request following a queued one of the same method is
+            merged into it.
+        """
+        with self._lock:
+            if self._pending_requests and self._pending_requests[-1][0] == method:
+                self._pending_requests[-1][1].extend(streams)
+            else:
+                self._pending_requests.append((method, list(streams)))
+            if self._sender is None:
+                self._sender = threading.Thread(
+                    target=self.send_pending_requests,
+                    name='Binance stream requests',
+                    daemon=True
+                )
+                self._sender.start()
+
+    def send_pending_requests(self):
+        """
+            Sender thread, sends queued requests in order and sleeps outside the lock while throttled
+        """
+        while True:
+            with self._lock:
+                if not self._pending_requests or not self._connected:
+                    self._pending_requests = []
+                    self._sender = None
+                    return
+                now = time.time()
+                self._request_times = [sent for sent in self._request_times if now - sent < 1]
+                delay = 0
+                if len(self._request_times) >= self._MAX_REQUESTS_PER_SECOND:
+                    delay = 1 - (now - self._request_times[0])
+                else:
+                    method, streams = self._pending_requests.pop(0)
+                    self._request_times.append(now)
+                    self._request_id += 1
+                    message = json.dumps({"method": method, "params": streams, "id": self._request_id})
+                    ws = self._ws
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            try:
+                ws.send(message)
+            except Exception as e:
+                self._exchange.ws_on_error(e)
 
 
 class Binance(Exchange):
@@ -21,6 +151,8 @@ class Binance(Exchange):
             https://github.com/binance-exchange/binance-official-api-docs/blob/master/web-socket-streams.md
         """
         self._BASE_URL = 'https://api.binance.com'
+        self._WS_URL = 'wss://stream.binance.com:9443'
+        self._taker_fee = 0.001
         self._exchangeInfo = None
         self._tick_intervals = {
             '1m':   1,
@@ -39,62 +171,130 @@ class Binance(Exchange):
             '1w':   7*24*60,
             '1M':   30*24*60
         }
-        self._timestamp_correction = int(self.public_get_server_time()) - int(time.time()*1000)
-        self.public_update_exchange_info()
-        self._thread_pool = QThreadPool()
-        self._thread_pool.start(CTWorker(self.ws_init))
+        self._timestamp_correction = None
+        self._rate_limits = {
+            'Weight':   (1200, 60),
+            'Orders':   (100, 10),
+        }
+        self._request_weights = {
+            '/api/v1/exchangeInfo':     1,
+            '/api/v1/historicalTrades': 5,
+            '/api/v3/allOrders':        5,
+            '/api/v3/account':          5,
+            '/api/v3/myTrades':         5,
+        }
+        self._response_cache_ttls = {
+            '/api/v1/exchangeInfo':         60,
+            '/api/v1/depth':                1,
+            '/api/v1/ticker/24hr':          1,
+            '/api/v3/ticker/price':         1,
+            '/api/v3/ticker/bookTicker':    1,
+            '/api/v3/account':              2,
+            '/api/v3/openOrders':           1,
+        }
+        self._request_weights_without_symbol = {
+            '/api/v1/ticker/24hr':          40,
+            '/api/v3/ticker/price':         2,
+            '/api/v3/ticker/bookTicker':    2,
+            '/api/v3/openOrders':           40,
+        }
 
         self._ws = None
+        self._ws_started = False
+        self._ws_stale_seconds = 30
+        self._ws_max_streams_per_connection = 1024
+        self._ws_stream_parsers = {'!ticker@arr': self.ws_on_24hour_ticker_message}
+        self._ws_connections = [BinanceStreamConnection(self, ['!ticker@arr'])]
+        self._ws_order_book_markets = {}
+        self._ws_snapshot_depth = 1000
+        self._ws_ticker_fields = get_field_extractor('s', 'b', 'a', 'B', 'A', 'q', 'v', 'h', 'l', 'P', 'c', 'C')
+        self._book_ticker_fields = get_field_extractor('symbol', 'bidPrice', 'askPrice', 'bidQty', 'askQty')
         self._implements = {
             'ws_24hour_market_moves',
             'ws_all_markets_best_bid_ask',
+            'ws_order_book',
         }
 
-    def public_get_request(self, url):
-        try:
-            results = requests.get(self._BASE_URL + url).json()
-            if 'code' in results:
-                self.log_request_error(results['msg'])
-                if self.retry_count_not_exceeded():
-                    return self.public_get_request(url)
-                else:
-                    return {}
-            else:
-                self.log_request_success()
-                return results
-        except Exception as e:
-            self.log_request_error(self._BASE_URL + url)
-            if self.retry_count_not_exceeded():
-                return self.public_get_request(url)
-            else:
-                return {}
+    def public_get_request(self, url, use_cache=True):
+        """
+            use_cache - False always requests, for results that must not be older than the call
+        """
+        return self.request_with_retry(
+            url.split('?')[0],
+            lambda: self.get_result(self.http_get(self._BASE_URL + url)),
+            default={},
+            key=url if use_cache else None
+        )
 
     def private_request(self, method, url, req={}):
-        try:
-            req['timestamp'] = int(time.time()*1000) + self._timestamp_correction
-            query_string = '&'.join(["{}={}".format(k, v) for k, v in req.items()])
+        def send():
+            if self._timestamp_correction is None:
+                self.update_timestamp_correction()
+            request = dict(req)
+            request['timestamp'] = int(time.time()*1000) + self._timestamp_correction
+            query_string = '&'.join(["{}={}".format(k, v) for k, v in request.items()])
             signature = hmac.new(self._API_SECRET.encode(), query_string.encode(), hashlib.sha256).hexdigest()
             query_string = query_string + '&signature=' + signature
 
             headers = {'X-MBX-APIKEY': self._API_KEY}
 
             req_url = self._BASE_URL + url + '?' + query_string
-            results = getattr(requests, method)(req_url, headers=headers).json()
-            if 'code' in results:
-                self.log_request_error(results['msg'])
-                if self.retry_count_not_exceeded():
-                    return self.private_request(method, url, req)
-                else:
-                    return {}
-            else:
-                self.log_request_success()
-                return results
-        except Exception as e:
-            self.log_request_error(str(e))
-            if self.retry_count_not_exceeded():
-                return self.private_request(method, url, req)
-            else:
-                return {}
+            return self.get_result(self.http_request(method, req_url, headers=headers))
+
+        return self.request_with_retry(
+            url,
+            send,
+            idempotent=method == 'get',
+            default={},
+            key=(method, url, tuple(sorted(req.items())))
+        )
+
+    def get_result(self, response):
+        """
+            Raises RequestError for error codes, retrying only those which do not depend on the request:
+            -1000 UNKNOWN, -1001 DISCONNECTED, -1003 TOO_MANY_REQUESTS, -1007 TIMEOUT,
+            -1021 INVALID_TIMESTAMP (after correcting the clock offset).
+            Only -1003 and -1021 are certain rejections, after the others the
+            request may have been executed, e.g. -1007 means execution status unknown.
+        """
+        results = self.get_response_json(response)
+        if isinstance(results, dict) and 'code' in results:
+            if results['code'] == -1021:
+                self._timestamp_correction = None
+            raise RequestError(
+                results['msg'],
+                retryable=results['code'] in (-1000, -1001, -1003, -1007, -1021),
+                safe_to_resend=results['code'] in (-1003, -1021)
+            )
+        return results
+
+    def get_request_weights(self, method, path, query):
+        """
+            https://github.com/binance-exchange/binance-official-api-docs/blob/master/rest-api.md#limits
+        """
+        if path == '/api/v1/depth':
+            limit = int(query.get('limit', [100])[0])
+            weight = 1 if limit <= 100 else 5 if limit <= 500 else 10 if limit <= 1000 else 50
+        elif 'symbol' not in query and path in self._request_weights_without_symbol:
+            weight = self._request_weights_without_symbol[path]
+        else:
+            weight = self._request_weights.get(path, 1)
+        weights = {'Weight': weight}
+        if path == '/api/v3/order' and method == 'post':
+            weights['Orders'] = 1
+        return weights
+
+    def update_rate_limits(self, response):
+        """
+            Binance reports weight used in the current minute by this IP
+        """
+        super().update_rate_limits(response)
+        used = response.headers.get('X-MBX-USED-WEIGHT-1M', response.headers.get('X-MBX-USED-WEIGHT', None))
+        if used is not None:
+            self.get_rate_limiter().set_used('Weight', int(used))
+        orders = response.headers.get('X-MBX-ORDER-COUNT-10S', None)
+        if orders is not None:
+            self.get_rate_limiter().set_used('Orders', int(orders))
 
     # ############################################
     # ##### Exchange specific public methods #####
@@ -116,6 +316,13 @@ class Binance(Exchange):
         """
         return self.public_get_request('/api/v1/time').get('serverTime', None)
 
+    def update_timestamp_correction(self):
+        """
+            Difference between Binance server time and local time in milliseconds
+            used to timestamp signed requests
+        """
+        self._timestamp_correction = int(self.public_get_server_time()) - int(time.time()*1000)
+
     def public_update_exchange_info(self):
         """
             Current exchange trading rules and symbol information
@@ -202,7 +409,7 @@ class Binance(Exchange):
         self._exchangeInfo = self.public_get_request('/api/v1/exchangeInfo')
         return self._exchangeInfo
 
-    def public_get_order_book(self, market, depth='5'):
+    def public_get_order_book(self, market, depth='5', use_cache=True):
         """
             Get order book for a given currency pair (market).
             Valid depth values: 5, 10, 20, 50, 100, 500, 1000
@@ -218,7 +425,7 @@ class Binance(Exchange):
              'lastUpdateId': 400000000}
         """
         url = "/api/v1/depth?symbol={}&limit={}".format(market, depth)
-        return self.public_get_request(url)
+        return self.public_get_request(url, use_cache)
 
     def public_get_market_history(self, market, limit='500'):
         """
@@ -715,14 +922,55 @@ class Binance(Exchange):
     # ##### Exchange specific websockets API #####
     # ############################################
 
-    def ws_init(self):
-        self.ws_subscribe('!ticker@arr', self.ws_on_24hour_ticker_message)
-        self._ws.run_forever()
+    def ws_start_stream_connections(self):
+        """
+            Starts connections carrying streams beyond the limit of the primary one
+        """
+        self._ws_started = True
+        for connection in self._ws_connections[1:]:
+            connection.start()
+
+    def ws_stop(self):
+        super().ws_stop()
+        for connection in self._ws_connections[1:]:
+            connection.close()
+
+    def get_ws_status(self):
+        status = super().get_ws_status()
+        status['Connections'] = [connection.get_status() for connection in self._ws_connections[1:]]
+        return status
 
-    def ws_subscribe(self, channel, message_parser):
+    def ws_get_url(self):
         """
-            Subscibe to a channel
-            The following <channel> values are supported:
+            Url of the primary combined stream connection, used on every (re)connect
+        """
+        return self._ws_connections[0].get_url()
+
+    def ws_on_open(self):
+        self._ws_connections[0].on_open(self._ws)
+        self.ws_start_stream_connections()
+
+    def ws_on_message(self, message):
+        """
+            Combined stream messages are {'stream': <stream name>, 'data': <raw stream payload>}
+            and are dispatched to the parser registered for the stream
+        """
+        parsed_message = self.decode_json(message)
+        if 'stream' in parsed_message:
+            parser = self._ws_stream_parsers.get(parsed_message['stream'], None)
+            if parser is not None:
+                parser(parsed_message['data'])
+        elif 'result' in parsed_message:
+            if parsed_message['result'] is not None:
+                print('Binance websocket request {}: {}'.format(parsed_message.get('id'), parsed_message['result']))
+        else:
+            print(message)
+
+    def ws_subscribe_stream(self, stream, message_parser):
+        """
+            Subscribes a stream on the first combined stream connection with
+            room left, opening another connection once all carry
+            _ws_max_streams_per_connection streams.
             <symbol>@aggTrade - Aggregate Trade Streams
             <symbol>@trade - Trade Streams
             <symbol>@kline_<interval> - Kline/Candlestick Streams
@@ -731,40 +979,109 @@ class Binance(Exchange):
             <symbol>@ticker - Individual Symbol Ticker Streams
             !ticker@arr - All Market Tickers Stream
             <symbol>@depth<levels> - Partial Book Depth Streams
-            <symbol>@depth - Diff. Depth Stream
-            Debug: ct['Poloniex'].ws_subscribe(1000)
+            <symbol>@depth@100ms - Diff. Depth Stream
+            Debug: ct['Binance'].ws_subscribe_stream('ethbtc@trade', print)
+        """
+        self._ws_stream_parsers[stream] = message_parser
+        if self.ws_get_stream_connection(stream) is not None:
+            return
+        for connection in self._ws_connections:
+            if len(connection._streams) < self._ws_max_streams_per_connection:
+                connection.subscribe(stream)
+                return
+        connection = BinanceStreamConnection(self, [stream])
+        self._ws_connections.append(connection)
+        if self._ws_started:
+            connection.start()
+
+    def ws_unsubscribe_stream(self, stream):
+        self._ws_stream_parsers.pop(stream, None)
+        connection = self.ws_get_stream_connection(stream)
+        if connection is None:
+            return
+        connection.unsubscribe(stream)
+        if not connection._streams and connection is not self._ws_connections[0]:
+            self._ws_connections.remove(connection)
+            connection.close()
+
+    def ws_get_stream_connection(self, stream):
+        for connection in self._ws_connections:
+            if stream in connection._streams:
+                return connection
+        return None
+
+    def ws_subscribe(self, market):
         """
-        self._ws = websocket.WebSocketApp("wss://stream.binance.com:9443/ws/" + channel,
-                                          on_message=message_parser,
-                                          on_error=self.ws_on_error,
-                                          on_close=self.ws_on_close,
-                                          on_ping=self.ws_pong
-                                          )
+            Maintains the full order book of a market in self._order_book from
+            100ms diff depth updates, reconciled with a REST snapshot
+            Debug: ct['Binance'].ws_subscribe('ETHBTC')
+        """
+        stream = market.lower() + '@depth@100ms'
+        if market in self._ws_order_book_markets:
+            return
+        self._ws_order_book_markets[market] = stream
+        self.ws_subscribe_stream(stream, self.ws_on_depth_message)
+        if self.ws_get_stream_connection(stream)._connected:
+            self.ws_resync_order_book(market)
+
+    def ws_unsubscribe(self, market):
+        stream = self._ws_order_book_markets.pop(market, None)
+        if stream is not None:
+            self.ws_unsubscribe_stream(stream)
+        with self._order_book_lock:
+            self._order_book.pop(market, None)
+            self._order_book_sync.pop(market, None)
+
+    def ws_on_stream_connection_open(self, connection):
+        """
+            Order book snapshots need the diff stream running, so books of the connection are re-synced
+        """
+        for market, stream in list(self._ws_order_book_markets.items()):
+            if stream in connection._streams:
+                self.ws_resync_order_book(market)
+
+    def ws_get_order_book_snapshot(self, market):
+        """
+            Snapshot for diff depth reconciliation, lastUpdateId continues with U/u of depth updates
+            Debug: ct['Binance'].ws_get_order_book_snapshot('ETHBTC')
+        """
+        order_book = self.public_get_order_book(market, self._ws_snapshot_depth, use_cache=False)
+        return (
+            order_book['lastUpdateId'],
+            [(float(level[0]), float(level[1])) for level in order_book['bids']],
+            [(float(level[0]), float(level[1])) for level in order_book['asks']]
+        )
 
-    def ws_pong(self, message):
-        self._ws.send(message)
+    def ws_on_depth_message(self, message):
+        """
+            Diff depth update, U and u are the first and last update ids it contains
+            {'e': 'depthUpdate', 'E': 123456789, 's': 'BNBBTC', 'U': 157, 'u': 160,
+             'b': [['0.0024', '10']], 'a': [['0.0026', '100']]}
+        """
+        updates = [('Bid', float(price), float(quantity)) for price, quantity in message['b']]
+        updates += [('Ask', float(price), float(quantity)) for price, quantity in message['a']]
+        self.ws_on_order_book_delta(message['s'], message['U'], message['u'], updates)
 
-    def ws_on_24hour_ticker_message(self, message):
-        parsed_message = json.loads(message)
+    def ws_on_24hour_ticker_message(self, parsed_message):
         if isinstance(parsed_message, list):
+            extract = self._ws_ticker_fields
             for market in parsed_message:
                 try:
-                    market_symbol = market['s']
-                    self.update_market(
-                        market_symbol,
-                        {
-                            'BaseVolume': float(market.get('q', 0)),
-                            'CurrVolume': float(market.get('v', 0)),
-                            'BestBid': float(market.get('b', 0)),
-                            'BestAsk': float(market['a']),
-                            'BestBidSize': float(market['B']),
-                            'BestAskSize': float(market['A']),
-                            '24HrHigh': float(market['h']),
-                            '24HrLow': float(market['l']),
-                            '24HrPercentMove': float(market['P']),
-                            'LastTradedPrice': float(market['c']),
-                            'TimeStamp': datetime.fromtimestamp(market['C'] / 1000),
-                        }
+                    symbol, bid, ask, bid_size, ask_size, base_volume, curr_volume, high, low, move, last, closed = \
+                        extract(market)
+                    self.update_market_quote(
+                        symbol,
+                        float(bid),
+                        float(ask),
+                        float(bid_size),
+                        float(ask_size),
+                        float(base_volume),
+                        float(curr_volume),
+                        float(high),
+                        float(low),
+                        float(move),
+                        float(last),
+                        datetime.fromtimestamp(closed / 1000),
                     )
                 except Exception as e:
                     self.log_request_error(str(e))
@@ -775,7 +1092,7 @@ class Binance(Exchange):
 
     def ws_on_close(self):
         print("### Binance websocket is closed ###")
-        self.ws_init()
+        self._ws_connections[0].on_close()
 
     # ###########################
     # ##### Generic methods #####
@@ -802,6 +1119,8 @@ class Binance(Exchange):
                 }
         """
         results = {}
+        if self._exchangeInfo is None:
+            self.public_update_exchange_info()
         if isinstance(self._exchangeInfo['symbols'], list):
             for symbol in self._exchangeInfo['symbols']:
                 try:
@@ -841,6 +1160,8 @@ class Binance(Exchange):
             in recently enough
             Debug: ct['Binance'].update_market_definitions()
         """
+        if force_update or self._exchangeInfo is None:
+            self.public_update_exchange_info()
         if isinstance(self._exchangeInfo['symbols'], list):
             for market in self._exchangeInfo['symbols']:
                 try:
@@ -885,19 +1206,11 @@ class Binance(Exchange):
         """
         book_ticker = self.public_get_ticker()
         if isinstance(book_ticker, list):
+            extract = self._book_ticker_fields
             for ticker in book_ticker:
                 try:
-                    market_symbol = ticker['symbol']
-                    update_dict = {
-                        'BestBid': float(ticker['bidPrice']),
-                        'BestAsk': float(ticker['askPrice']),
-                        'BestBidSize': float(ticker['bidQty']),
-                        'BestAskSize': float(ticker['askQty']),
-                    }
-                    self.update_market(
-                        market_symbol,
-                        update_dict
-                    )
+                    symbol, bid, ask, bid_size, ask_size = extract(ticker)
+                    self.update_market_quote(symbol, float(bid), float(ask), float(bid_size), float(ask_size))
                 except Exception as e:
                     self.log_request_error(str(e))
 
@@ -910,22 +1223,19 @@ class Binance(Exchange):
         if isinstance(statistics, list):
             for market in statistics:
                 try:
-                    market_symbol = market['symbol']
-                    self.update_market(
-                        market_symbol,
-                        {
-                            'BaseVolume':       float(market.get('quoteVolume', 0)),
-                            'CurrVolume':       float(market.get('volume', 0)),
-                            'BestBid':          float(market['bidPrice']),
-                            'BestAsk':          float(market['askPrice']),
-                            'BestBidSize':      float(market['bidQty']),
-                            'BestAskSize':      float(market['askQty']),
-                            '24HrHigh':         float(market['highPrice']),
-                            '24HrLow':          float(market['lowPrice']),
-                            '24HrPercentMove':  float(market['priceChangePercent']),
-                            'LastTradedPrice':  float(market['lastPrice']),
-                            'TimeStamp':        datetime.fromtimestamp(market['closeTime'] / 1000),
-                        }
+                    self.update_market_quote(
+                        market['symbol'],
+                        float(market['bidPrice']),
+                        float(market['askPrice']),
+                        float(market['bidQty']),
+                        float(market['askQty']),
+                        float(market.get('quoteVolume', 0)),
+                        float(market.get('volume', 0)),
+                        float(market['highPrice']),
+                        float(market['lowPrice']),
+                        float(market['priceChangePercent']),
+                        float(market['lastPrice']),
+                        datetime.fromtimestamp(market['closeTime'] / 1000),
                     )
                 except Exception as e:
                     self.log_request_error(str(e))
@@ -3,9 +3,8 @@ import hmac
 import time
 from datetime import datetime
 
-import requests
-
 from Exchange import Exchange
+from RetryPolicy import RequestError
 
 
 class Bittrex(Exchange):
@@ -15,6 +14,15 @@ class Bittrex(Exchange):
         """
         super().__init__(APIKey, Secret)
         self._BASE_URL = 'https://bittrex.com/api/v1.1'
+        self._taker_fee = 0.0025
+        self._rate_limits = {'Requests': (60, 60)}
+        self._response_cache_ttls = {
+            '/public/getmarkets':           60,
+            '/public/getmarketsummaries':   1,
+            '/public/getorderbook':         1,
+            '/account/getbalances':         2,
+            '/market/getopenorders':        1,
+        }
         self._tick_intervals = {
             'oneMin':       1,
             'fiveMin':      5,
@@ -26,52 +34,40 @@ class Bittrex(Exchange):
     def public_get_request(self, url, base_url_override=None):
         if base_url_override is None:
             base_url_override = self._BASE_URL
-        try:
-            result = requests.get(base_url_override + url).json()
-            if result.get('success', False):
-                self.log_request_success()
-                return result['result']
-            else:
-                self.log_request_error(result['message'])
-                if self.retry_count_not_exceeded():
-                    return self.public_get_request(url, base_url_override)
-                else:
-                    return {}
-        except Exception as e:
-            self.log_request_error(base_url_override + url + ". " + str(e))
-            if self.retry_count_not_exceeded():
-                return self.public_get_request(url, base_url_override)
-            else:
-                return {}
+        return self.request_with_retry(
+            url.split('?')[0],
+            lambda: self.get_result(self.http_get(base_url_override + url)),
+            default={},
+            key=base_url_override + url
+        )
 
     def private_request(self, command, extra=''):
-        try:
+        def send():
             nonce = str(int(time.time()*1000))
             request_url = self._BASE_URL + command + '?' + 'apikey=' + self._API_KEY + "&nonce=" + nonce + extra
-            result = requests.get(
+            return self.get_result(self.http_get(
                 request_url,
                 headers={"apisign": hmac.new(self._API_SECRET.encode(),
                                              request_url.encode(),
                                              hashlib.sha512
                                              ).hexdigest()
                          }
-            ).json()
-            if result.get('success', None):
-                self.log_request_success()
-                return result['result']
-            else:
-                self.log_request_error(result['message'])
-                if self.retry_count_not_exceeded():
-                    return self.private_request(command, extra)
-                else:
-                    return {}
-
-        except Exception as e:
-            self.log_request_error(str(e))
-            if self.retry_count_not_exceeded():
-                return self.private_request(command, extra)
-            else:
-                return {}
+            ))
+
+        return self.request_with_retry(
+            command,
+            send,
+            idempotent=command not in ('/market/buylimit', '/market/selllimit', '/market/cancel', '/account/withdraw'),
+            default={},
+            key=command + extra
+        )
+
+    def get_result(self, response):
+        result = self.get_response_json(response)
+        if result.get('success', False):
+            return result['result']
+        nonce_rejected = result['message'] in ('APIKEY_INVALID_NONCE', 'NONCE_USED')
+        raise RequestError(result['message'], retryable=nonce_rejected, safe_to_resend=nonce_rejected)
 
     # ############################################
     # ##### Exchange specific public methods #####
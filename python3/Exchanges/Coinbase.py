@@ -1,13 +1,14 @@
-import requests
+from Exchange import Exchange
 
 
-class Coinbase:
+class Coinbase(Exchange):
     def __init__(self):
-        pass
+        super().__init__()
+        self._BASE_URL = 'https://api.gdax.com'
+        self._rate_limits = {'Requests': (3, 1)}
 
-    @staticmethod
-    def get_request(url):
-        return requests.get('https://api.gdax.com' + url).json()
+    def get_request(self, url):
+        return self.http_get(self._BASE_URL + url).json()
 
     def get_btc_usd_price(self):
         book = self.get_request('/products/BTC-USD/book')
@@ -1,8 +1,7 @@
 import hashlib
 
-import requests
-
 from Exchange import Exchange
+from RetryPolicy import RequestError
 
 
 class Hotbit(Exchange):
@@ -11,52 +10,38 @@ class Hotbit(Exchange):
         self._BASE_URL = 'https://api.hotbit.io/api/v1'
 
     def get_request(self, url):
-        try:
-            result = requests.get(self._BASE_URL + url).json()
-            if result.get('error', None) is None:
-                self.log_request_success()
-                return result
-            else:
-                self.log_request_error(result['error']['message'])
-                if self.retry_count_not_exceeded():
-                    return self.get_request(url)
-                else:
-                    return {}
-        except Exception as e:
-            self.log_request_error(self._BASE_URL + url + ". " + str(e))
-            if self.retry_count_not_exceeded():
-                return self.get_request(url)
-            else:
-                return {}
+        return self.request_with_retry(
+            url.split('?')[0],
+            lambda: self.get_result(self.http_get(self._BASE_URL + url)),
+            default={},
+            key=url
+        )
 
     def trading_api_request(self, method, endpoint='', extra=''):
         """
 
         """
-        try:
+        def send():
             url = self._BASE_URL + endpoint + '?Api_key=' + self._API_KEY + '&sign='
             # string_to_sign = 'api_key=' + self._API_KEY + extra + '&secret_key=' + self._API_SECRET
             signature = hashlib.md5("whatever your string is".encode('utf-8')).hexdigest()
             signature = signature.upper()
             url += signature
-            result = getattr(requests, method)(url).json()
-
-            if result.get('error', None) is None:
-                self.log_request_success()
-                return result
-            else:
-                self.log_request_error(result['error']['message'])
-                if self.retry_count_not_exceeded():
-                    return self.trading_api_request(method, endpoint, extra)
-                else:
-                    return {}
-
-        except Exception as e:
-            self.log_request_error(str(e))
-            if self.retry_count_not_exceeded():
-                return self.trading_api_request(method, endpoint, extra)
-            else:
-                return {}
+            return self.get_result(self.http_request(method, url))
+
+        return self.request_with_retry(
+            endpoint,
+            send,
+            idempotent=method == 'get',
+            default={},
+            key=(method, endpoint, extra)
+        )
+
+    def get_result(self, response):
+        result = self.get_response_json(response)
+        if result.get('error', None) is None:
+            return result
+        raise RequestError(result['error']['message'])
 
     # ############################################
     # ##### Exchange specific public methods #####
@@ -374,7 +359,7 @@ class Hotbit(Exchange):
         """
             ct['Hotbit'].get_markets()
         """
-        return requests.get('https://www.hotbit.io/public/markets').json()['Content']
+        return self.http_get('https://www.hotbit.io/public/markets').json()['Content']
 
     # #############################################
     # ##### Exchange specific private methods #####
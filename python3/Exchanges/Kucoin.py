@@ -2,16 +2,14 @@ import base64
 import hashlib
 import hmac
 import json
+import threading
 import time
 import uuid
 from datetime import datetime
 
-import requests
-import websocket
-from PyQt5.QtCore import QThreadPool
-
 from Exchange import Exchange
-from Worker import CTWorker
+from JsonDecoder import get_field_extractor
+from RetryPolicy import RequestError
 
 
 class Kucoin(Exchange):
@@ -21,6 +19,15 @@ class Kucoin(Exchange):
             For API details see https://docs.kucoin.com/
         """
         self._BASE_URL = 'https://openapi-v2.kucoin.com'
+        self._taker_fee = 0.001
+        self._rate_limits = {'Requests': (30, 3)}
+        self._response_cache_ttls = {
+            '/api/v1/symbols':                      60,
+            '/api/v1/market/allTickers':            1,
+            '/api/v1/market/orderbook/level2_100':  1,
+            '/api/v1/accounts':                     2,
+            '/api/v1/orders':                       1,
+        }
         self._exchangeInfo = None
         self._tick_intervals = {
             '1min':      1,
@@ -40,26 +47,37 @@ class Kucoin(Exchange):
         self._ws = None
         self._ws_token = None
         self._ws_heartbeat = None
-
-        self._thread_pool = QThreadPool()
-        self._thread_pool.start(CTWorker(self.ws_init))
+        self._ws_ping_interval = 15
+        self._ws_stale_seconds = 30
+        self._ws_ticker_fields = get_field_extractor('bestBid', 'bestAsk', 'bestBidSize', 'bestAskSize')
+        self._ws_connected = False
+        self._ws_order_book_markets = set()
 
         self._implements = {
             'ws_24hour_market_moves',
             'ws_all_markets_best_bid_ask',
+            'ws_order_book',
         }
 
-    def public_get_request(self, url):
-        try:
-            result = requests.get(self._BASE_URL + url).json()
-            if result.get('code', None) == '200000':
-                return result['data']
-            else:
-                print(self._BASE_URL + url + ". " + str(result.get('msg')))
-                # return self.public_get_request(url)
-        except Exception as e:
-            print(self._BASE_URL + url + ". " + str(e))
-            # return self.public_get_request(url)
+    def public_get_request(self, url, use_cache=True):
+        """
+            use_cache - False always requests, for results that must not be older than the call
+        """
+        return self.request_with_retry(
+            url.split('?')[0],
+            lambda: self.get_result(self.http_get(self._BASE_URL + url)),
+            key=url if use_cache else None
+        )
+
+    def get_result(self, response):
+        """
+            Raises RequestError for error codes, 429000 (too many requests) is retried
+        """
+        result = self.get_response_json(response)
+        if result.get('code', None) == '200000':
+            return result['data']
+        throttled = result.get('code', None) == '429000'
+        raise RequestError(str(result.get('msg', result)), retryable=throttled, safe_to_resend=throttled)
 
     def private_sign_request(self, method, endpoint, body, nonce):
         """
@@ -95,7 +113,7 @@ class Kucoin(Exchange):
             "KC-API-TIMESTAMP":     1547015186532   //A timestamp for your request.
             "KC-API-PASSPHRASE":    "Abc123456"   //The passphrase you specified when creating the API key.
         """
-        try:
+        def send():
             nonce = str(int(time.time()*1000))
             request_url = self._BASE_URL + endpoint
 
@@ -117,17 +135,15 @@ class Kucoin(Exchange):
                                     "KC-API-PASSPHRASE": self._API_PASSPHRASE,
                                     "KC-API-SIGN": signature
                                  }
-            result = getattr(requests, method)(request_url, **request).json()
-
-            if result.get('code', None) == '200000':
-                return result['data']
-            else:
-                print(request_url + ". " + str(result))
-                # return self.private_request(method,endpoint,body)
-
-        except Exception as e:
-            print(str(e))
-            return {}
+            return self.get_result(self.http_request(method, request_url, **request))
+
+        return self.request_with_retry(
+            endpoint,
+            send,
+            idempotent=method == 'get',
+            default={},
+            key=(method, endpoint, json.dumps(body, sort_keys=True))
+        )
 
     # ############################################
     # ##### Exchange specific public methods #####
@@ -217,7 +233,7 @@ class Kucoin(Exchange):
         """
         return self.public_get_request('/api/v1/market/orderbook/level2_100?symbol=' + symbol)
 
-    def public_get_full_order_book_agg(self, symbol):
+    def public_get_full_order_book_agg(self, symbol, use_cache=True):
         """
             Get a list of open orders for a symbol.
             Level-2 order book includes all bids and asks (aggregated by price),
@@ -238,7 +254,7 @@ class Kucoin(Exchange):
               ['0.00012', '0.47062']],
              'bids': [['0.00011', '16.60746'], ['0.000107', '0.00999']]}
         """
-        return self.public_get_request('/api/v1/market/orderbook/level2?symbol=' + symbol)
+        return self.public_get_request('/api/v1/market/orderbook/level2?symbol=' + symbol, use_cache)
 
     def public_get_full_order_book_atomic(self, symbol):
         """
@@ -649,21 +665,25 @@ class Kucoin(Exchange):
         if token_type == 'private':
             return self.private_request('post', '/api/v1/bullet-private')
         else:
-            return requests.post(self._BASE_URL + '/api/v1/bullet-public').json()['data']
+            return self.http_post(self._BASE_URL + '/api/v1/bullet-public').json()['data']
 
-    def ws_init(self):
+    def ws_get_url(self):
+        """
+            Every connection needs a new token
+        """
         token = self.ws_get_token('public')
         self._ws_token = token
         if token['instanceServers'][0]['protocol'] == 'websocket':
-            self._ws = websocket.WebSocketApp(
-                '{}?token={}'.format(token['instanceServers'][0]['endpoint'], token['token']),
-                on_message=self.ws_on_message,
-                on_error=self.ws_on_error,
-                on_close=self.ws_on_close
-            )
-            self._ws.run_forever(ping_interval=30)
+            return '{}?token={}'.format(token['instanceServers'][0]['endpoint'], token['token'])
+        return None
 
-    def ws_subscribe(self, channel, is_private_channel=False):
+    def ws_ping(self, ws):
+        """
+            Kucoin expects ping messages instead of ping frames
+        """
+        ws.send(json.dumps({"id": int(time.time() * 1000000), "type": "ping"}))
+
+    def ws_subscribe_topic(self, topic, is_private_channel=False):
         """
             To subscribe to a particular channel, the client side should send subscription message to the server.
         """
@@ -671,35 +691,105 @@ class Kucoin(Exchange):
         self._ws.send(json.dumps({
             "id": nonce,
             "type": "subscribe",
-            "topic": channel,
+            "topic": topic,
+            "privateChannel": is_private_channel
+        }))
+
+    def ws_unsubscribe_topic(self, topic, is_private_channel=False):
+        nonce = int(time.time() * 1000000)
+        self._ws.send(json.dumps({
+            "id": nonce,
+            "type": "unsubscribe",
+            "topic": topic,
             "privateChannel": is_private_channel
         }))
 
-    def ws_unsubscribe(self, channel):
+    def ws_subscribe(self, market):
+        """
+            Maintains the full order book of a market in self._order_book from
+            level-2 updates, reconciled with a REST snapshot
+            Debug: ct['Kucoin'].ws_subscribe('ETH-BTC')
+        """
+        if market in self._ws_order_book_markets:
+            return
+        self._ws_order_book_markets.add(market)
+        if self._ws_connected:
+            self.ws_subscribe_topic('/market/level2:' + market)
+            self.ws_resync_order_book(market)
+
+    def ws_unsubscribe(self, market):
+        if market not in self._ws_order_book_markets:
+            return
+        self._ws_order_book_markets.discard(market)
+        if self._ws_connected:
+            self.ws_unsubscribe_topic('/market/level2:' + market)
+        with self._order_book_lock:
+            self._order_book.pop(market, None)
+            self._order_book_sync.pop(market, None)
+
+    def ws_get_order_book_snapshot(self, market):
+        """
+            Full level-2 snapshot, its sequence continues with sequences of level-2 changes
+            Debug: ct['Kucoin'].ws_get_order_book_snapshot('ETH-BTC')
+        """
+        order_book = self.public_get_full_order_book_agg(market, use_cache=False)
+        return (
+            int(order_book['sequence']),
+            [(float(price), float(quantity)) for price, quantity in order_book['bids']],
+            [(float(price), float(quantity)) for price, quantity in order_book['asks']]
+        )
+
+    def ws_on_level2_message(self, data):
         """
+            Every change carries its own sequence, so changes are applied one
+            by one and those already contained in the snapshot are skipped
+            {'sequenceStart': 1545896669105, 'sequenceEnd': 1545896669106, 'symbol': 'BTC-USDT',
+             'changes': {'asks': [['6', '1', '1545896669105']], 'bids': [['4', '1', '1545896669106']]}}
         """
-        self._ws.send(json.dumps({"command": "unsubscribe", "channel": channel}))
+        changes = [(int(sequence), 'Ask', float(price), float(size))
+                   for price, size, sequence in data['changes'].get('asks', [])]
+        changes += [(int(sequence), 'Bid', float(price), float(size))
+                    for price, size, sequence in data['changes'].get('bids', [])]
+        for sequence, side, price, size in sorted(changes):
+            updates = [] if price == 0 else [(side, price, size)]
+            self.ws_on_order_book_delta(data['symbol'], sequence, sequence, updates)
+
+    def ws_subscribe_base_snapshots(self):
+        for base in self.public_get_base_currencies() or []:
+            self.ws_subscribe_topic('/market/snapshot:' + base)
 
     def ws_on_message(self, message):
-        parsed_message = json.loads(message)
+        parsed_message = self.decode_json(message)
+        if parsed_message['type'] == 'pong':
+            self._ws_heartbeat = time.time()
+            return
+        if parsed_message['type'] == 'ack':
+            return
         if parsed_message['type'] == 'welcome':
-            self.ws_subscribe('/market/ticker:all')
-            for base in self.public_get_base_currencies():
-                self.ws_subscribe('/market/snapshot:' + base)
+            self._ws_connected = True
+            if not self._replaying:
+                # a replayed recording already holds the frames of these subscriptions
+                self.ws_subscribe_topic('/market/ticker:all')
+                # base currencies need a REST request, which must not hold up the websocket reader
+                threading.Thread(target=self.ws_subscribe_base_snapshots, daemon=True).start()
+            for market in list(self._ws_order_book_markets):
+                if not self._replaying:
+                    self.ws_subscribe_topic('/market/level2:' + market)
+                self.ws_resync_order_book(market)
             return
         if parsed_message['type'] == 'message':
+            if parsed_message['topic'][:15] == '/market/level2:':
+                self.ws_on_level2_message(parsed_message['data'])
+                return
             if parsed_message['topic'] == '/market/ticker:all':
                 try:
-                    market_symbol = parsed_message['subject']
-                    update_dict = {
-                        'BestBid': float(parsed_message['data'].get('bestBid', 0)),
-                        'BestAsk': float(parsed_message['data'].get('bestAsk', 0)),
-                        'BestBidSize': float(parsed_message['data'].get('bestBidSize', 0)),
-                        'BestAskSize': float(parsed_message['data'].get('bestAskSize', 0)),
-                    }
-                    self.update_market(
-                        market_symbol,
-                        update_dict
+                    bid, ask, bid_size, ask_size = self._ws_ticker_fields(parsed_message['data'])
+                    self.update_market_quote(
+                        parsed_message['subject'],
+                        float(bid or 0),
+                        float(ask or 0),
+                        float(bid_size or 0),
+                        float(ask_size or 0),
                     )
                 except Exception as e:
                     self.log_request_error(str(e))
@@ -735,9 +825,9 @@ class Kucoin(Exchange):
     def ws_on_error(error):
         print("*** Kucoin websocket ERROR: ", error)
 
-    @staticmethod
-    def ws_on_close():
+    def ws_on_close(self):
         print("### Kucoin websocket is closed ###")
+        self._ws_connected = False
 
     # ###########################
     # ##### Generic methods #####
@@ -5,12 +5,8 @@ import time
 import urllib
 from datetime import datetime
 
-import requests
-import websocket
-from PyQt5.QtCore import QThreadPool
-
 from Exchange import Exchange
-from Worker import CTWorker
+from RetryPolicy import RequestError
 
 
 class Poloniex(Exchange):
@@ -20,7 +16,17 @@ class Poloniex(Exchange):
             For API details see https://docs.poloniex.com
         """
         self._BASE_URL = 'https://poloniex.com/'
+        self._WS_URL = 'wss://api2.poloniex.com'
         self._precision = 8
+        self._rate_limits = {'Requests': (6, 1)}
+        self._response_cache_ttls = {
+            'public?command=returnTicker':          1,
+            'public?command=returnOrderBook':       1,
+            'public?command=returnCurrencies':      60,
+            'returnBalances':                       2,
+            'returnCompleteBalances':               2,
+            'returnOpenOrders':                     1,
+        }
         self._tick_intervals = {
             '300':     300 / 60,
             '900':     900 / 60,
@@ -29,11 +35,10 @@ class Poloniex(Exchange):
             '14400':   14400 / 60,
             '86400':   86400 / 60,
         }
-        self._thread_pool = QThreadPool()
-        self._thread_pool.start(CTWorker(self.ws_init))
-
         self._ws = None
         self._ws_heartbeat = None
+        self._ws_stale_seconds = 10
+        self._ws_channels = set()
         self._implements = {
             'ws_24hour_market_moves',
             'ws_account_balances',
@@ -43,34 +48,30 @@ class Poloniex(Exchange):
 
         self._currency_id_map = {}
         self._currency_pair_map = {}
+        self._fee_info = None
+        # resyncs replace full depth websocket books, so they request the whole book too
+        self._ws_snapshot_depth = 10000
 
-    def public_get_request(self, url):
-        try:
-            result = requests.get(self._BASE_URL + url).json()
-            if 'error' in result:
-                self.log_request_error(result['error'])
-                if self.retry_count_not_exceeded():
-                    return self.public_get_request(url)
-                else:
-                    return {}
-            else:
-                self.log_request_success()
-                return result
-        except Exception as e:
-            self.log_request_error(str(e))
-            if self.retry_count_not_exceeded():
-                return self.public_get_request(url)
-            else:
-                return {}
+    def public_get_request(self, url, use_cache=True):
+        """
+            use_cache - False always requests, for results that must not be older than the call
+        """
+        return self.request_with_retry(
+            url.split('&')[0],
+            lambda: self.get_result(self.http_get(self._BASE_URL + url)),
+            default={},
+            key=url if use_cache else None
+        )
 
     def private_sign_request(self, string_to_sign):
         return hmac.new(self._API_SECRET.encode(), string_to_sign.encode(), hashlib.sha512).hexdigest()
 
     def private_request(self, command, req={}):
-        try:
-            req['command'] = command
-            req['nonce'] = int(time.time()*1000000)
-            post_data = urllib.parse.urlencode(req)
+        def send():
+            request = dict(req)
+            request['command'] = command
+            request['nonce'] = int(time.time()*1000000)
+            post_data = urllib.parse.urlencode(request)
             sign = self.private_sign_request(post_data)
 
             headers = {
@@ -78,22 +79,22 @@ class Poloniex(Exchange):
                 'Key': self._API_KEY
             }
 
-            result = requests.post(self._BASE_URL + 'tradingApi', data=req, headers=headers).json()
-            if 'error' in result:
-                self.log_request_error(result['error'])
-                if self.retry_count_not_exceeded():
-                    return self.private_request(command, req)
-                else:
-                    return {}
-            else:
-                self.log_request_success()
-                return result
-        except Exception as e:
-            self.log_request_error(str(e))
-            if self.retry_count_not_exceeded():
-                return self.private_request(command, req)
-            else:
-                return {}
+            return self.get_result(self.http_post(self._BASE_URL + 'tradingApi', data=request, headers=headers))
+
+        return self.request_with_retry(
+            command,
+            send,
+            idempotent=command.startswith('return'),
+            default={},
+            key=(command, tuple(sorted(req.items())))
+        )
+
+    def get_result(self, response):
+        result = self.get_response_json(response)
+        if isinstance(result, dict) and 'error' in result:
+            nonce_rejected = 'Nonce must be greater' in str(result['error'])
+            raise RequestError(result['error'], retryable=nonce_rejected, safe_to_resend=nonce_rejected)
+        return result
 
     # ############################################
     # ##### Exchange specific public methods #####
@@ -144,7 +145,7 @@ class Poloniex(Exchange):
         """
         return self.public_get_request('public?command=return24hVolume')
 
-    def public_get_order_book(self, market, depth='5'):
+    def public_get_order_book(self, market, depth='5', use_cache=True):
         """
             Call: https://poloniex.com/public?command=returnOrderBook&currencyPair=BTC_NXT&depth=3
             Debug: ct['Poloniex'].public_get_order_book('BTC_ETH','2')
@@ -154,7 +155,7 @@ class Poloniex(Exchange):
              'seq': 123456789}
         """
         url = "public?command=returnOrderBook&currencyPair={}&depth={}".format(market, depth)
-        return self.public_get_request(url)
+        return self.public_get_request(url, use_cache)
 
     def public_get_all_order_books(self, depth='5'):
         """
@@ -674,15 +675,29 @@ class Poloniex(Exchange):
     # ##### Exchange specific websockets API #####
     # ############################################
 
-    def ws_init(self):
-        self._ws = websocket.WebSocketApp("wss://api2.poloniex.com",
-                                          on_message=self.ws_on_message,
-                                          on_error=self.ws_on_error,
-                                          on_close=self.ws_on_close
-                                          )
-        self._ws.run_forever()
-        self.ws_subscribe(1002)
-        self.ws_subscribe(1000)
+    def ws_get_url(self):
+        return self._WS_URL
+
+    def ws_on_open(self):
+        """
+            Subscribes ticker and account notifications and replays order book
+            subscriptions after a reconnect, each of them starts with a new snapshot
+        """
+        self._ws_channels.update((1002, 1000))
+        for channel in list(self._ws_channels):
+            self.ws_send_subscribe(channel)
+
+    def ws_get_order_book_snapshot(self, market):
+        """
+            REST snapshot shares the sequence numbers of websocket book updates
+            Debug: ct['Poloniex'].ws_get_order_book_snapshot('BTC_ETH')
+        """
+        order_book = self.public_get_order_book(market, self._ws_snapshot_depth, use_cache=False)
+        return (
+            int(order_book['seq']),
+            [(float(price), float(amount)) for price, amount in order_book['bids']],
+            [(float(price), float(amount)) for price, amount in order_book['asks']]
+        )
 
     def ws_subscribe(self, channel):
         """
@@ -697,6 +712,13 @@ class Poloniex(Exchange):
             <currency pair>	Public	Price Aggregated Book
             Debug: ct['Poloniex'].ws_subscribe(1000)
         """
+        if channel in self._ws_channels:
+            return
+        self._ws_channels.add(channel)
+        if self.ws_is_connected():
+            self.ws_send_subscribe(channel)
+
+    def ws_send_subscribe(self, channel):
         if channel == 1000:
             nonce = int(time.time()*1000000)
             self._ws.send(json.dumps({
@@ -721,10 +743,16 @@ class Poloniex(Exchange):
             1010	Public	Heartbeat
             <currency pair>	Public	Price Aggregated Book
         """
-        self._ws.send(json.dumps({"command": "unsubscribe", "channel": channel}))
+        self._ws_channels.discard(channel)
+        if self.ws_is_connected():
+            self._ws.send(json.dumps({"command": "unsubscribe", "channel": channel}))
+        if channel in self._order_book:
+            with self._order_book_lock:
+                self._order_book.pop(channel, None)
+                self._order_book_sync.pop(channel, None)
 
     def ws_on_message(self, message):
-        parsed_message = json.loads(message)
+        parsed_message = self.decode_json(message)
         if len(parsed_message) > 0:
             msg_code = parsed_message[0]
             if msg_code == 1010:
@@ -732,6 +760,7 @@ class Poloniex(Exchange):
                     Heartbeats
                 """
                 self._ws_heartbeat = datetime.now().timestamp()
+                self.ws_check_order_book_gaps()
                 return
             if msg_code == 1002:
                 """
@@ -781,13 +810,11 @@ class Poloniex(Exchange):
                                                                  float(account_update[3])
                     if account_update[0] == 'n':
                         market_symbol = self._currency_pair_map[account_update[1]]
-                        if market_symbol not in self._open_orders:
-                            self._open_orders[market_symbol] = []
                         if account_update[3] == 1:
                             order_type = 'Buy'
                         else:
                             order_type = 'Sell'
-                        self._open_orders[market_symbol].append(
+                        self._open_orders[market_symbol] = self._open_orders.get(market_symbol, []) + [
                             {
                                 'OrderId': account_update[2],
                                 'OrderType': order_type,
@@ -797,17 +824,18 @@ class Poloniex(Exchange):
                                 'Total': float(account_update[4]) * float(account_update[5]),
                                 'AmountRemaining': float(account_update[5]),
                             }
-                        )
+                        ]
                     if account_update[0] == 'o':
+                        # Lists are replaced instead of modified so that views iterating them are not disturbed
                         order_id = account_update[1]
-                        for market_symbol in self._open_orders:
-                            for order_ix in range(self._open_orders[market_symbol]):
-                                if order_id == self._open_orders[market_symbol][order_ix]['OrderId']:
-                                    if float(account_update[2]) == 0:
-                                        self._open_orders[market_symbol].pop(order_ix)
-                                    else:
-                                        self._open_orders[market_symbol][order_ix]['AmountRemaining'] = \
-                                            float(account_update[2])
+                        for market_symbol, orders in list(self._open_orders.items()):
+                            if any(order['OrderId'] == order_id for order in orders):
+                                if float(account_update[2]) == 0:
+                                    orders = [order for order in orders if order['OrderId'] != order_id]
+                                else:
+                                    orders = [dict(order, AmountRemaining=float(account_update[2]))
+                                              if order['OrderId'] == order_id else order for order in orders]
+                                self._open_orders[market_symbol] = orders
                     if account_update[0] == 't':
                         print('Trade:', account_update)
                 return
@@ -819,32 +847,20 @@ class Poloniex(Exchange):
                 sequence_id = parsed_message[1]
                 payload = parsed_message[2]
                 if payload[0][0] == 'i':
-                    self._order_book[market_symbol] = {
-                        'Bids': {},
-                        'Asks': {},
-                        'Sequence_Id': sequence_id
-                    }
-                    for price, amount in payload[0][1]['orderBook'][1].items():
-                        self._order_book[market_symbol]['Bids'][float(price)] = float(amount)
-                    for price, amount in payload[0][1]['orderBook'][0].items():
-                        self._order_book[market_symbol]['Asks'][float(price)] = float(amount)
+                    self.ws_load_order_book(
+                        market_symbol,
+                        sequence_id,
+                        [(float(price), float(amount)) for price, amount in payload[0][1]['orderBook'][1].items()],
+                        [(float(price), float(amount)) for price, amount in payload[0][1]['orderBook'][0].items()]
+                    )
                     return
-                if sequence_id < self._order_book[market_symbol]['Sequence_Id']:
-                    print("Wrong ws message order: ", sequence_id, self._order_book[market_symbol]['Sequence_Id'])
-                self._order_book[market_symbol]['Sequence_Id'] = max(sequence_id,
-                                                                     self._order_book[market_symbol]['Sequence_Id'])
+                updates = []
                 for book_update in payload:
                     if book_update[0] == 'o':
                         if book_update[1] == 0:
-                            if float(book_update[3]) == 0:
-                                self._order_book[market_symbol]['Asks'].pop(float(book_update[2]), None)
-                            else:
-                                self._order_book[market_symbol]['Asks'][float(book_update[2])] = float(book_update[3])
+                            updates.append(('Ask', float(book_update[2]), float(book_update[3])))
                         if book_update[1] == 1:
-                            if float(book_update[3]) == 0:
-                                self._order_book[market_symbol]['Bids'].pop(float(book_update[2]), None)
-                            else:
-                                self._order_book[market_symbol]['Bids'][float(book_update[2])] = float(book_update[3])
+                            updates.append(('Bid', float(book_update[2]), float(book_update[3])))
                     if book_update[0] == 't':
                         if book_update[2] == 1:
                             order_type = 'Buy'
@@ -860,6 +876,7 @@ class Poloniex(Exchange):
                                 'Total': float(book_update[3] * book_update[4])
                             }
                         )
+                self.ws_on_order_book_delta(market_symbol, sequence_id, sequence_id, updates)
                 return
         print(message)
 
@@ -967,6 +984,32 @@ class Poloniex(Exchange):
                 except Exception as e:
                     self.log_request_error(str(e))
 
+    def get_taker_fee(self):
+        """
+            Uses the account fee schedule when API keys are available, a
+            failed request is not retried and the default fee is used
+        """
+        if self._fee_info is None and self.has_api_keys():
+            self._fee_info = self.private_get_fees() or {}
+        if self._fee_info and 'takerFee' in self._fee_info:
+            return float(self._fee_info['takerFee'])
+        return self._taker_fee
+
+    def get_metadata_cache_extras(self):
+        return {
+            'CurrencyIdMap': self._currency_id_map,
+            'CurrencyPairMap': self._currency_pair_map,
+        }
+
+    def set_metadata_cache_extras(self, extras):
+        """
+            Json turns integer ids into strings, converting them back
+        """
+        for currency_id, currency in extras.get('CurrencyIdMap', {}).items():
+            self._currency_id_map[int(currency_id)] = currency
+        for pair_id, market_symbol in extras.get('CurrencyPairMap', {}).items():
+            self._currency_pair_map[int(pair_id)] = market_symbol
+
     def update_market_quotes(self):
         self.update_market_definitions()
 
@@ -0,0 +1,34 @@
+import importlib
+import json
+from operator import itemgetter
+
+# Preferred order of JSON backends, all optional except the standard library
+JSON_BACKENDS = ('orjson', 'ujson', 'simdjson', 'json')
+
+
+def get_json_loads(backend='auto'):
+    """
+        Returns (backend name, loads function) of the requested backend,
+        'auto' picks the fastest one installed. Falls back to the standard
+        library when the requested backend is not installed.
+        All backends accept str and bytes and raise ValueError on invalid input.
+    """
+    names = JSON_BACKENDS if backend in (None, 'auto') else (backend,)
+    for name in names:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        return name, module.loads
+    return 'json', json.loads
+
+
+def get_field_extractor(*fields):
+    """
+        Returns function(message) returning a tuple of the values of fields
+        in one C-level call instead of a Python lookup per field, e.g.
+            extract = get_field_extractor('s', 'b', 'a')
+            market_symbol, bid, ask = extract(ticker)
+        Raises KeyError when a field is missing.
+    """
+    return itemgetter(*fields)
@@ -0,0 +1,219 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import websocket
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class CTMainThreadBridge(QObject):
+    """
+        Delivers calls from the market data loop thread to the Qt main thread.
+
+        Has to be created in the main thread. Signals emitted from any other
+        thread are queued and executed by the Qt event loop.
+    """
+    _call = pyqtSignal(object, tuple)
+
+    def __init__(self):
+        super().__init__()
+        self._call.connect(self._run)
+
+    def call(self, function, *args):
+        self._call.emit(function, args)
+
+    @staticmethod
+    def _run(function, args):
+        function(*args)
+
+
+class CTMarketDataLoop:
+    """
+        Asyncio event loop running in a single thread that owns REST polling
+        and websocket connections of all exchanges.
+
+        Blocking REST calls of the exchange adapters run in a small shared
+        executor instead of an endless thread per widget. The loop connects,
+        reconnects and watches websockets, while each connection gets a
+        reader thread doing the blocking reads and running the handlers of
+        its exchange, so a partially received frame or a slow handler never
+        stalls other sockets, pollers or the watchdog.
+
+        :param executor_threads: Number of threads available to blocking REST calls
+        :param ws_read_timeout: Seconds to wait for a websocket connection to open
+    """
+    def __init__(self, executor_threads=8, ws_read_timeout=10):
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=executor_threads)
+        self._bridge = CTMainThreadBridge()
+        self._thread = None
+        self._ws_read_timeout = ws_read_timeout
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.set_default_executor(self._executor)
+        self._loop.run_forever()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def is_running(self):
+        return self._thread is not None and self._loop.is_running()
+
+    def call_in_main_thread(self, function, *args):
+        """
+            Thread-safe way to run function(*args) in the Qt main thread
+        """
+        self._bridge.call(function, *args)
+
+    def submit(self, coroutine):
+        """
+            Schedules a coroutine on the loop from any thread.
+            Returns concurrent.futures.Future, cancel() on it stops the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    # ##### REST polling #####
+    def add_poller(self, function, interval, *args, callback=None):
+        """
+            Calls function(*args) every interval seconds in the shared executor.
+            When callback is given, it receives the result in the Qt main thread.
+            Example:
+                handle = loop.add_poller(ct['Bittrex'].update_market_quotes, 5)
+                handle.cancel()
+        """
+        return self.submit(self._poll(function, interval, args, callback))
+
+    async def _poll(self, function, interval, args, callback):
+        while True:
+            started = self._loop.time()
+            try:
+                result = await self._loop.run_in_executor(None, functools.partial(function, *args))
+                if callback is not None:
+                    self.call_in_main_thread(callback, result)
+            except Exception as e:
+                print('Exception in market data poller {}: {}'.format(getattr(function, '__qualname__', function), e))
+            await asyncio.sleep(max(0.0, interval - (self._loop.time() - started)))
+
+    # ##### Websockets #####
+    def add_websocket(self, exchange):
+        """
+            Keeps exchange connected to exchange.ws_get_url() and feeds received
+            messages to exchange.ws_receive() from the loop thread.
+            Reconnects with the backoff of the exchange WebsocketSupervisor,
+            exchange.ws_on_open() replays subscriptions after each reconnect.
+        """
+        return self.submit(self._websocket(exchange))
+
+    async def _websocket(self, exchange):
+        supervisor = exchange.ws_get_supervisor()
+        while True:
+            supervisor.on_connecting()
+            try:
+                url = await self._loop.run_in_executor(None, exchange.ws_get_url)
+                if url is None:
+                    supervisor.on_stopped()
+                    return
+                ws = await self._loop.run_in_executor(
+                    None,
+                    functools.partial(websocket.create_connection, url, timeout=self._ws_read_timeout)
+                )
+            except Exception as e:
+                supervisor.on_disconnected(str(e))
+                await asyncio.sleep(supervisor.get_reconnect_delay())
+                continue
+            supervisor.on_connected()
+            reason = await self._read_websocket_until_closed(exchange, ws, supervisor)
+            supervisor.on_disconnected(reason)
+            try:
+                exchange.ws_on_close()
+            except Exception as e:
+                exchange.log_request_error(str(e))
+            await asyncio.sleep(supervisor.get_reconnect_delay())
+
+    async def _read_websocket_until_closed(self, exchange, ws, supervisor):
+        closed = self._loop.create_future()
+        reader = threading.Thread(
+            target=self._read_websocket,
+            args=(exchange, ws, supervisor, closed),
+            name='{} websocket reader'.format(exchange.__class__.__name__),
+            daemon=True
+        )
+        reader.start()
+        watchdog = self._loop.create_task(self._watch_websocket(exchange, ws, supervisor, closed))
+        try:
+            return await closed
+        finally:
+            watchdog.cancel()
+            if reader.is_alive():
+                # unblocks the read of the reader thread, which then closes the connection
+                ws.shutdown()
+
+    def _set_closed(self, closed, reason):
+        """
+            Resolves the closed future of a connection from any thread
+        """
+        def set_result():
+            if not closed.done():
+                closed.set_result(reason)
+        self._loop.call_soon_threadsafe(set_result)
+
+    def _read_websocket(self, exchange, ws, supervisor, closed):
+        """
+            Reader thread of a connection, blocks on the socket until a whole
+            frame arrived and hands it to the exchange. Staleness is detected
+            by the watchdog on the loop, so reads have no timeout.
+        """
+        reason = 'closed by client'
+        try:
+            ws.settimeout(None)
+            exchange.ws_on_connect(ws)
+            while not closed.done():
+                opcode, data = ws.recv_data()
+                if opcode == websocket.ABNF.OPCODE_CLOSE:
+                    reason = 'closed by server'
+                    break
+                if opcode in (websocket.ABNF.OPCODE_TEXT, websocket.ABNF.OPCODE_BINARY):
+                    supervisor.on_message_received()
+                    if opcode == websocket.ABNF.OPCODE_TEXT:
+                        data = data.decode('utf-8')
+                    try:
+                        exchange.ws_receive(data)
+                    except Exception as e:
+                        exchange.log_request_error(str(e))
+        except Exception as e:
+            reason = str(e)
+        finally:
+            try:
+                ws.close(timeout=1)
+            except Exception:
+                pass
+            self._set_closed(closed, reason)
+
+    @staticmethod
+    async def _watch_websocket(exchange, ws, supervisor, closed):
+        """
+            Sends keep-alive pings and closes connections which went stale
+        """
+        last_ping = time.time()
+        while not closed.done():
+            await asyncio.sleep(1)
+            if supervisor.is_stale():
+                if not closed.done():
+                    closed.set_result('no message for {} seconds'.format(exchange._ws_stale_seconds))
+                return
+            if exchange._ws_ping_interval and time.time() - last_ping > exchange._ws_ping_interval:
+                try:
+                    exchange.ws_ping(ws)
+                except Exception as e:
+                    if not closed.done():
+                        closed.set_result(str(e))
+                    return
+                last_ping = time.time()
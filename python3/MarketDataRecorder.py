@@ -0,0 +1,214 @@
+import gzip
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+# Kinds of recorded events
+RECORD_WEBSOCKET_FRAME = 'W'     # raw websocket frame passed to Exchange.ws_on_message
+RECORD_MARKET_UPDATE = 'M'       # update_market(market_symbol, fields) not coming from a websocket frame
+RECORD_MARKET_QUOTE = 'Q'        # update_market_quote(market_symbol, *quote) not coming from a websocket frame
+RECORD_ORDER_BOOK_SNAPSHOT = 'B'  # ws_load_order_book(market, sequence_id, bids, asks) from a REST snapshot
+
+SEGMENT_SUFFIX = '.rec.gz'
+_LENGTH = struct.Struct('>I')
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.timestamp()}
+    raise TypeError('{} is not JSON serializable'.format(type(value).__name__))
+
+
+def decode_object(value):
+    if len(value) == 1 and '__datetime__' in value:
+        return datetime.fromtimestamp(value['__datetime__'])
+    return value
+
+
+def get_segment_day(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')
+
+
+def get_segment_file_name(directory, exchange, timestamp):
+    """
+        Segment of an exchange opened at timestamp, a new one per UTC day and recorder start:
+        <directory>/<exchange>/<exchange>-<YYYY-MM-DD>-<HHMMSSffffff>.rec.gz
+    """
+    opened = datetime.fromtimestamp(timestamp, timezone.utc)
+    return os.path.join(directory, exchange, '{}-{}-{}{}'.format(
+        exchange,
+        opened.strftime('%Y-%m-%d'),
+        opened.strftime('%H%M%S%f'),
+        SEGMENT_SUFFIX
+    ))
+
+
+def get_segment_sort_key(file_name):
+    """
+        Orders segments by day and opening time, segments named only by day sort first on their day
+    """
+    return file_name[:-len(SEGMENT_SUFFIX)]
+
+
+def list_segments(directory, exchange=None):
+    """
+        Returns (exchange, file name) of recorded segments ordered by exchange, day and opening time
+    """
+    segments = []
+    if not os.path.isdir(directory):
+        return segments
+    for name in sorted(os.listdir(directory)):
+        if exchange is not None and name != exchange:
+            continue
+        exchange_directory = os.path.join(directory, name)
+        if os.path.isdir(exchange_directory):
+            file_names = [file_name for file_name in os.listdir(exchange_directory)
+                          if file_name.endswith(SEGMENT_SUFFIX)]
+            for file_name in sorted(file_names, key=get_segment_sort_key):
+                segments.append((name, os.path.join(exchange_directory, file_name)))
+    return segments
+
+
+def read_segment(file_name):
+    """
+        Yields (timestamp, kind, data) of a segment in recorded order. A
+        segment cut short by a crash ends at the last complete record that
+        was flushed.
+    """
+    with gzip.open(file_name, 'rb') as segment:
+        while True:
+            try:
+                header = segment.read(_LENGTH.size)
+                if len(header) < _LENGTH.size:
+                    return
+                payload = segment.read(_LENGTH.unpack(header)[0])
+            except (EOFError, zlib.error, OSError):
+                return
+            timestamp, kind, data = json.loads(payload.decode('utf-8'), object_hook=decode_object)
+            yield timestamp, kind, data
+
+
+class MarketDataRecorder:
+    """
+        Appends market data events of exchanges to compressed per-exchange,
+        per-day segment files.
+
+        record() only puts the event on a queue, so websocket threads never
+        wait for the disk. A background thread encodes events as
+        length-prefixed JSON records, writes them in batches and flushes and
+        fsyncs the open segments every flush_seconds. Events are dropped (and
+        counted) instead of blocking when the queue is full.
+        Every start opens new segment files instead of appending to the ones
+        of an earlier run, a gzip stream left unterminated by a crash would
+        make everything appended after it unreadable. So a crash loses at
+        most the last flush interval of its own segment.
+
+        :param directory: Root directory of the recording
+        :param flush_seconds: Seconds between flushes to disk
+        :param fsync: Whether flushes are followed by os.fsync
+        :param max_queued: Events kept in memory before new ones are dropped
+    """
+    def __init__(self, directory, flush_seconds=1, fsync=True, max_queued=100000):
+        self._directory = directory
+        self._flush_seconds = flush_seconds
+        self._fsync = fsync
+        self._queue = queue.Queue(max_queued)
+        self._thread = None
+        self._segments = {}
+        self._recorded = 0
+        self._dropped = 0
+        self._bytes_written = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='Market data recorder', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+            Writes all queued events, closes segments and stops the writer thread
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def record(self, exchange, kind, *data):
+        try:
+            self._queue.put_nowait((time.time(), exchange, kind, data))
+        except queue.Full:
+            self._dropped += 1
+
+    def run(self):
+        last_flush = time.time()
+        running = True
+        while running:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self._flush_seconds))
+                while len(batch) < 10000:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                running = False
+                batch = batch[:batch.index(None)]
+            for event in batch:
+                try:
+                    self.write(*event)
+                except Exception as e:
+                    print('Exception in market data recorder: {}'.format(e))
+            if not running or time.time() - last_flush >= self._flush_seconds:
+                self.flush()
+                last_flush = time.time()
+        self.close()
+
+    def write(self, timestamp, exchange, kind, data):
+        payload = json.dumps([timestamp, kind, data], separators=(',', ':'), default=encode_value).encode('utf-8')
+        segment = self.get_segment(exchange, timestamp)
+        segment.write(_LENGTH.pack(len(payload)))
+        segment.write(payload)
+        self._recorded += 1
+        self._bytes_written += _LENGTH.size + len(payload)
+
+    def get_segment(self, exchange, timestamp):
+        """
+            Returns open segment of the exchange for the day of timestamp, rotating at midnight UTC
+        """
+        day = get_segment_day(timestamp)
+        current = self._segments.get(exchange, None)
+        if current is not None and current[0] == day:
+            return current[2]
+        if current is not None:
+            current[2].close()
+        file_name = get_segment_file_name(self._directory, exchange, timestamp)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        segment = gzip.open(file_name, 'xb', compresslevel=6)
+        self._segments[exchange] = (day, file_name, segment)
+        return segment
+
+    def flush(self):
+        for day, file_name, segment in self._segments.values():
+            segment.flush(zlib.Z_SYNC_FLUSH)
+            if self._fsync:
+                os.fsync(segment.fileobj.fileno())
+
+    def close(self):
+        for day, file_name, segment in self._segments.values():
+            segment.close()
+        self._segments = {}
+
+    def get_status(self):
+        return {
+            'Directory': self._directory,
+            'Recorded': self._recorded,
+            'Queued': self._queue.qsize(),
+            'Dropped': self._dropped,
+            'BytesWritten': self._bytes_written,
+            'Segments': [file_name for day, file_name, segment in self._segments.values()],
+        }
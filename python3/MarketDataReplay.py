@@ -0,0 +1,212 @@
+import heapq
+import threading
+import time
+
+from MarketDataRecorder import (RECORD_MARKET_QUOTE, RECORD_MARKET_UPDATE, RECORD_ORDER_BOOK_SNAPSHOT,
+                                RECORD_WEBSOCKET_FRAME, list_segments, read_segment)
+
+
+class SimulatedClock:
+    """
+        Clock of a replay, time() returns the recording time of the event
+        being replayed instead of the wall clock
+    """
+    def __init__(self, timestamp=0.0):
+        self._timestamp = timestamp
+
+    def time(self):
+        return self._timestamp
+
+    def advance_to(self, timestamp):
+        if timestamp > self._timestamp:
+            self._timestamp = timestamp
+
+
+def read_recording(directory, exchanges=None, start=None, end=None):
+    """
+        Yields (timestamp, exchange, kind, data) of recorded events of the
+        exchanges merged in recording order, events of an exchange keep
+        their recorded order even when timestamps are equal.
+        start, end - optional unix timestamps limiting the replayed period
+    """
+    segments = {}
+    for exchange, file_name in list_segments(directory):
+        if exchanges is None or exchange in exchanges:
+            segments.setdefault(exchange, []).append(file_name)
+
+    def read_exchange(exchange, file_names):
+        for file_name in file_names:
+            for timestamp, kind, data in read_segment(file_name):
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp > end:
+                    return
+                yield timestamp, exchange, kind, data
+
+    streams = [read_exchange(exchange, file_names) for exchange, file_names in sorted(segments.items())]
+    return heapq.merge(*streams, key=lambda event: event[0])
+
+
+class MarketDataReplay:
+    """
+        Plays a recording of MarketDataRecorder back into exchange objects
+        through the same code paths live data takes: websocket frames go to
+        ws_receive (and so ws_on_message), REST updates to update_market and
+        update_market_quote and REST order book snapshots to
+        ws_on_order_book_snapshot.
+
+        Replay is deterministic: events are applied one at a time in
+        recording order from a single thread and exchanges read the
+        SimulatedClock instead of the wall clock for order book gap timing.
+        Order book resyncs wait for the snapshot in the recording instead of
+        requesting one, so no network is needed.
+
+        Exchanges need currency maps and market definitions before markets
+        can be updated, e.g. from the metadata cache, see
+        CryptoTrader.init_replay. Order books are only replayed for markets
+        subscribed with ws_subscribe before the replay starts.
+
+        :param exchanges: Exchange name -> Exchange object receiving the events
+        :param directory: Root directory of the recording
+        :param speed: 1 replays at the original pace, 10 ten times faster, None as fast as possible
+        :param start: Optional unix timestamp of the first replayed event
+        :param end: Optional unix timestamp of the last replayed event
+    """
+    def __init__(self, exchanges, directory, speed=None, start=None, end=None):
+        self._exchanges = exchanges
+        self._directory = directory
+        self._speed = speed
+        self._start = start
+        self._end = end
+        self._clock = SimulatedClock()
+        self._timers = []
+        self._thread = None
+        self._stopped = threading.Event()
+        self._events = {}
+        self._errors = 0
+        self._last_error = None
+        self._first_timestamp = None
+        self._wall_started = None
+        self._wall_finished = None
+
+    def add_timer(self, seconds, callback):
+        """
+            Calls callback(clock) every seconds of recording time from the
+            replay thread, between events, e.g. to run arbitrage scans or
+            refresh views at the pace they run live
+        """
+        self._timers.append([seconds, None, callback])
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='Market data replay', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait(self, timeout=None):
+        """
+            Waits until a replay started with start() finished, returns False on timeout
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    def run(self):
+        """
+            Replays the recording in the calling thread, returns the status once finished
+        """
+        recorders = {name: exchange._recorder for name, exchange in self._exchanges.items()}
+        for exchange in self._exchanges.values():
+            exchange.set_recorder(None)
+            exchange.set_replay_clock(self._clock)
+        self._wall_started = time.perf_counter()
+        try:
+            for timestamp, exchange, kind, data in read_recording(
+                    self._directory, list(self._exchanges), self._start, self._end):
+                if self._stopped.is_set():
+                    break
+                if self._first_timestamp is None:
+                    self._first_timestamp = timestamp
+                self.wait_for(timestamp)
+                self.run_timers(timestamp)
+                self._clock.advance_to(timestamp)
+                self.apply(self._exchanges[exchange], kind, data)
+        finally:
+            self._wall_finished = time.perf_counter()
+            for name, exchange in self._exchanges.items():
+                exchange.set_replay_clock(None)
+                exchange.set_recorder(recorders[name])
+        return self.get_status()
+
+    def wait_for(self, timestamp):
+        """
+            Sleeps until the event is due at the replay speed
+        """
+        if not self._speed:
+            return
+        due = self._wall_started + (timestamp - self._first_timestamp) / self._speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            self._stopped.wait(delay)
+
+    def run_timers(self, timestamp):
+        for timer in self._timers:
+            seconds, due, callback = timer
+            if due is None:
+                timer[1] = timestamp + seconds
+                continue
+            while due <= timestamp:
+                self._clock.advance_to(due)
+                try:
+                    callback(self._clock)
+                except Exception as e:
+                    self.log_error('timer', e)
+                due += seconds
+            timer[1] = due
+
+    def apply(self, exchange, kind, data):
+        self._events[kind] = self._events.get(kind, 0) + 1
+        try:
+            if kind == RECORD_WEBSOCKET_FRAME:
+                exchange.ws_receive(data[0])
+            elif kind == RECORD_MARKET_UPDATE:
+                exchange.update_market(data[0], data[1])
+            elif kind == RECORD_MARKET_QUOTE:
+                exchange.update_market_quote(data[0], *data[1])
+            elif kind == RECORD_ORDER_BOOK_SNAPSHOT:
+                market, sequence_id, bids, asks = data
+                exchange.ws_on_order_book_snapshot(
+                    market,
+                    sequence_id,
+                    [tuple(level) for level in bids],
+                    [tuple(level) for level in asks]
+                )
+        except Exception as e:
+            self.log_error(kind, e)
+
+    def log_error(self, kind, error):
+        self._errors += 1
+        self._last_error = '{}: {}'.format(kind, error)
+        print('Exception in market data replay of {}'.format(self._last_error))
+
+    def get_status(self):
+        """
+            Debug: self._CTMain._Crypto_Trader._replay.get_status()
+        """
+        wall_finished = self._wall_finished if self._wall_finished is not None else time.perf_counter()
+        return {
+            'Events': dict(self._events),
+            'Errors': self._errors,
+            'LastError': self._last_error,
+            'SimulatedTime': self._clock.time(),
+            'RecordedSeconds': None if self._first_timestamp is None else
+            self._clock.time() - self._first_timestamp,
+            'WallSeconds': None if self._wall_started is None else wall_finished - self._wall_started,
+            'Finished': self._wall_finished is not None,
+        }
@@ -0,0 +1,174 @@
+from collections.abc import MutableMapping
+
+MARKET_FIELDS = (
+    'MarketSymbol',
+    'BaseMinAmount',
+    'BaseIncrement',
+    'CurrMinAmount',
+    'CurrIncrement',
+    'PriceMin',
+    'PriceIncrement',
+    'IsActive',
+    'IsRestricted',
+    'Notice',
+    'BestBid',
+    'BestAsk',
+    'BestBidSize',
+    'BestAskSize',
+    'BaseVolume',
+    'CurrVolume',
+    '24HrHigh',
+    '24HrLow',
+    '24HrPercentMove',
+    'LastTradedPrice',
+    'TimeStamp',
+)
+FIELD_INDEX = {field: index for index, field in enumerate(MARKET_FIELDS)}
+
+# Order of the values passed to Exchange.update_market_quote
+QUOTE_FIELDS = (
+    'BestBid',
+    'BestAsk',
+    'BestBidSize',
+    'BestAskSize',
+    'BaseVolume',
+    'CurrVolume',
+    '24HrHigh',
+    '24HrLow',
+    '24HrPercentMove',
+    'LastTradedPrice',
+    'TimeStamp',
+)
+QUOTE_INDEXES = tuple(FIELD_INDEX[field] for field in QUOTE_FIELDS)
+# Quote fields are consecutive in MARKET_FIELDS, so a quote is written with one slice assignment
+_QUOTE_START = QUOTE_INDEXES[0]
+
+_MISSING = object()
+
+
+class MarketRecord(MutableMapping):
+    """
+        Market kept by an exchange in _markets and _active_markets.
+
+        Known fields (MARKET_FIELDS) are stored in one preallocated list, so
+        quote ticks overwrite values in place through Exchange.update_market_quote
+        instead of building and merging a dictionary per tick. Other fields,
+        e.g. 'Created' or 'LogoUrl', go to a dictionary created on demand.
+        Reads behave like the dictionary markets used to be: market['BestBid'],
+        market.get('BestBid', None), 'BestBid' in market, dict(market).
+    """
+    __slots__ = ('_values', '_extra')
+
+    def __init__(self, fields=None):
+        self._values = [_MISSING] * len(MARKET_FIELDS)
+        self._extra = None
+        if fields:
+            self.update(fields)
+
+    def __getitem__(self, key):
+        index = FIELD_INDEX.get(key, None)
+        if index is None:
+            if self._extra is None:
+                raise KeyError(key)
+            return self._extra[key]
+        value = self._values[index]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        index = FIELD_INDEX.get(key, None)
+        if index is None:
+            if self._extra is None:
+                return default
+            return self._extra.get(key, default)
+        value = self._values[index]
+        return default if value is _MISSING else value
+
+    def __contains__(self, key):
+        index = FIELD_INDEX.get(key, None)
+        if index is None:
+            return self._extra is not None and key in self._extra
+        return self._values[index] is not _MISSING
+
+    def __setitem__(self, key, value):
+        index = FIELD_INDEX.get(key, None)
+        if index is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        else:
+            self._values[index] = value
+
+    def __delitem__(self, key):
+        index = FIELD_INDEX.get(key, None)
+        if index is None:
+            if self._extra is None:
+                raise KeyError(key)
+            del self._extra[key]
+        elif self._values[index] is _MISSING:
+            raise KeyError(key)
+        else:
+            self._values[index] = _MISSING
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        keys = [field for field, value in zip(MARKET_FIELDS, self._values) if value is not _MISSING]
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def update(self, fields=(), **kwargs):
+        if isinstance(fields, dict):
+            for key, value in fields.items():
+                self[key] = value
+        else:
+            super().update(fields)
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def update_quote(self, quote, changes=None):
+        """
+            Writes quote values in the order of QUOTE_FIELDS, None keeps the
+            current value. All values are written with one slice assignment,
+            atomic under the GIL, so copy() from another thread never pairs
+            a new BestBid with an old BestAsk. Changed fields are added to
+            changes as (old value, new value) when changes is given.
+        """
+        end = _QUOTE_START + min(len(quote), len(QUOTE_FIELDS))
+        if changes is None and None not in quote:
+            self._values[_QUOTE_START:end] = quote[:end - _QUOTE_START]
+            return
+        current = self._values[_QUOTE_START:end]
+        new = [old if value is None else value for old, value in zip(current, quote)]
+        if changes is not None:
+            for field, old, value in zip(QUOTE_FIELDS, current, new):
+                if old is not value and old != value:
+                    changes[field] = (None if old is _MISSING else old, value)
+        self._values[_QUOTE_START:end] = new
+
+    def copy(self):
+        """
+            Returns the fields as a plain dictionary, values are read in one
+            step so a concurrent update_quote is either fully in or fully out
+        """
+        values = list(self._values)
+        result = {field: value for field, value in zip(MARKET_FIELDS, values) if value is not _MISSING}
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    def __eq__(self, other):
+        if isinstance(other, (MarketRecord, dict)):
+            return self.copy() == (other.copy() if isinstance(other, MarketRecord) else other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'MarketRecord({!r})'.format(self.copy())
@@ -0,0 +1,65 @@
+import threading
+
+
+class MarketStore:
+    """
+        Versioned copy-on-write snapshots of the active markets of an exchange.
+
+        Writers (websocket and polling threads) only record which markets
+        changed, which is cheap enough to do on every tick. Changes are
+        published in one batch when a reader asks for a snapshot: the pending
+        markets are copied into new dictionaries sharing everything that did
+        not change with the previous snapshot, which is then swapped in
+        atomically. Readers get a consistent nested dictionary
+        code_base -> code_curr -> market that is never mutated afterwards,
+        so iterating it needs neither locks nor try/except.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._snapshot = (0, {})
+
+    def update(self, code_base, code_curr, market):
+        """
+            Marks market as changed, it is copied at the next publish
+        """
+        with self._lock:
+            self._pending[(code_base, code_curr)] = market
+
+    def remove(self, code_base, code_curr):
+        with self._lock:
+            self._pending[(code_base, code_curr)] = None
+
+    def publish(self):
+        """
+            Applies pending changes and returns (version, markets) of the new snapshot
+        """
+        with self._lock:
+            if not self._pending:
+                return self._snapshot
+            version, markets = self._snapshot
+            markets = dict(markets)
+            copied = set()
+            for (code_base, code_curr), market in self._pending.items():
+                if code_base not in copied:
+                    markets[code_base] = dict(markets.get(code_base, {}))
+                    copied.add(code_base)
+                if market is None:
+                    markets[code_base].pop(code_curr, None)
+                else:
+                    markets[code_base][code_curr] = market.copy()
+            for code_base in copied:
+                if not markets[code_base]:
+                    del markets[code_base]
+            self._pending = {}
+            self._snapshot = (version + 1, markets)
+            return self._snapshot
+
+    def snapshot(self):
+        """
+            Returns (version, markets), version changes whenever any market changed.
+            Does not take the lock when nothing changed since the last snapshot.
+        """
+        if self._pending:
+            return self.publish()
+        return self._snapshot
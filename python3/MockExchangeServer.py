@@ -0,0 +1,1006 @@
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import math
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+_WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_HALF_SPREAD = 0.0005
+
+
+def format_number(value):
+    return '{:.8f}'.format(value)
+
+
+class MockMarket:
+    """
+        Simulated market: mid price, full depth order book and 24 hour statistics.
+        Every tick moves the price and changes the book around the top,
+        the sequence increases by one per tick.
+    """
+    def __init__(self, code_base, code_curr, market_id, price, depth, rng):
+        self._code_base = code_base
+        self._code_curr = code_curr
+        self._id = market_id
+        self._price = price
+        self._step = max(10 ** (math.floor(math.log10(price)) - 4), 0.00000001)
+        self._sequence = 1
+        self._bids = {}
+        self._asks = {}
+        self._open = price
+        self._high = price
+        self._low = price
+        self._volume = 0.0
+        self._quote_volume = 0.0
+        self._timestamp = time.time()
+        best_bid, best_ask = self.get_best_prices()
+        for level in range(depth):
+            self._bids[round(best_bid - level * self._step, 8)] = round(rng.uniform(0.1, 10), 8)
+            self._asks[round(best_ask + level * self._step, 8)] = round(rng.uniform(0.1, 10), 8)
+
+    def get_best_prices(self):
+        best_bid = round(math.floor(self._price * (1 - _HALF_SPREAD) / self._step) * self._step, 8)
+        best_ask = round(best_bid + self._step * max(1, round(2 * _HALF_SPREAD * self._price / self._step)), 8)
+        return best_bid, best_ask
+
+    def tick(self, rng, volatility, depth, price=None):
+        """
+            Moves the price (randomly unless given) and returns the book
+            updates as (side, price, quantity), zero quantity removes a level
+        """
+        self._price = price if price is not None else self._price * math.exp(rng.gauss(0, volatility))
+        best_bid, best_ask = self.get_best_prices()
+        updates = []
+        for level in [level for level in self._bids if level > best_bid]:
+            del self._bids[level]
+            updates.append(('Bid', level, 0.0))
+        for level in [level for level in self._asks if level < best_ask]:
+            del self._asks[level]
+            updates.append(('Ask', level, 0.0))
+        for level in range(3):
+            bid = round(best_bid - level * self._step, 8)
+            ask = round(best_ask + level * self._step, 8)
+            self._bids[bid] = round(rng.uniform(0.1, 10), 8)
+            self._asks[ask] = round(rng.uniform(0.1, 10), 8)
+            updates.append(('Bid', bid, self._bids[bid]))
+            updates.append(('Ask', ask, self._asks[ask]))
+        for side, levels, reverse in (('Bid', self._bids, True), ('Ask', self._asks, False)):
+            if len(levels) > depth:
+                for level in sorted(levels, reverse=reverse)[depth:]:
+                    del levels[level]
+                    updates.append((side, level, 0.0))
+        traded = rng.uniform(0, 5)
+        self._volume += traded
+        self._quote_volume += traded * self._price
+        self._high = max(self._high, self._price)
+        self._low = min(self._low, self._price)
+        self._timestamp = time.time()
+        self._sequence += 1
+        return updates
+
+    def get_ticker(self):
+        best_bid, best_ask = self.get_best_prices()
+        return {
+            'BestBid': best_bid,
+            'BestAsk': best_ask,
+            'BestBidSize': self._bids.get(best_bid, 0.0),
+            'BestAskSize': self._asks.get(best_ask, 0.0),
+            'Last': round(self._price, 8),
+            'High': self._high,
+            'Low': self._low,
+            'PercentMove': 100 * (self._price / self._open - 1),
+            'Volume': self._volume,
+            'QuoteVolume': self._quote_volume,
+            'TimeStamp': self._timestamp,
+        }
+
+    def get_book(self, depth):
+        return (
+            self._sequence,
+            sorted(self._bids.items(), reverse=True)[:depth],
+            sorted(self._asks.items())[:depth]
+        )
+
+
+class MarketSimulator:
+    """
+        Market dynamics served by MockExchangeServer.
+
+        Without a script every step moves the prices of markets_per_step
+        randomly chosen markets (all of them by default) by a random walk.
+        A script is a list of (seconds, code_base, code_curr, price) setting
+        the price of a market once seconds have passed since the start, only
+        scripted markets change then. The same seed replays the same random
+        dynamics.
+
+        :param pairs: (code_base, code_curr) of the simulated markets
+        :param seed: Seed of the random dynamics
+        :param volatility: Standard deviation of the relative price move per step
+        :param depth: Price levels kept on each side of the books
+        :param markets_per_step: Markets changing per step, None for all
+        :param script: Optional scripted prices
+        :param balances: Initial account balances, currency -> amount
+    """
+    def __init__(self, pairs, seed=None, volatility=0.002, depth=50, markets_per_step=None, script=None,
+                 balances=None):
+        self._rng = random.Random(seed)
+        self._volatility = volatility
+        self._depth = depth
+        self._markets_per_step = markets_per_step
+        self._script = sorted(script or [])
+        self._script_position = 0
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._markets = {}
+        for market_id, (code_base, code_curr) in enumerate(pairs, 1):
+            price = 10 ** self._rng.uniform(-5, 0) if code_base == 'BTC' else 10 ** self._rng.uniform(-3, 3)
+            self._markets[(code_base, code_curr)] = MockMarket(
+                code_base, code_curr, market_id, price, depth, self._rng
+            )
+        self._balances = balances if balances is not None else {'BTC': 10.0, 'ETH': 100.0, 'USDT': 100000.0}
+        self._orders = {}
+        self._order_ids = itertools.count(1)
+
+    @staticmethod
+    def generate_pairs(count, bases=('BTC', 'ETH', 'USDT')):
+        """
+            Returns count (code_base, code_curr) pairs of made up currencies AAA, AAB, ...
+        """
+        currencies = (''.join(letters) for letters in itertools.product('ABCDEFGHIJKLMNOPQRSTUVWXYZ', repeat=3))
+        pairs = []
+        while len(pairs) < count:
+            code_curr = next(currencies)
+            for code_base in bases:
+                if len(pairs) < count:
+                    pairs.append((code_base, code_curr))
+        return pairs
+
+    def get_markets(self):
+        return self._markets
+
+    def step(self):
+        """
+            Advances the dynamics, returns {(code_base, code_curr): (market, sequence, updates)} of changed markets
+        """
+        with self._lock:
+            changes = {}
+            if self._script:
+                elapsed = time.monotonic() - self._started
+                while self._script_position < len(self._script) and \
+                        self._script[self._script_position][0] <= elapsed:
+                    _, code_base, code_curr, price = self._script[self._script_position]
+                    self._script_position += 1
+                    market = self._markets.get((code_base, code_curr), None)
+                    if market is not None:
+                        updates = market.tick(self._rng, self._volatility, self._depth, price)
+                        changes[(code_base, code_curr)] = (market, market._sequence, updates)
+                return changes
+            pairs = list(self._markets)
+            if self._markets_per_step is not None and self._markets_per_step < len(pairs):
+                pairs = self._rng.sample(pairs, self._markets_per_step)
+            for pair in pairs:
+                market = self._markets[pair]
+                updates = market.tick(self._rng, self._volatility, self._depth)
+                changes[pair] = (market, market._sequence, updates)
+            return changes
+
+    def get_tickers(self):
+        with self._lock:
+            return {pair: market.get_ticker() for pair, market in self._markets.items()}
+
+    def get_book(self, pair, depth):
+        with self._lock:
+            return self._markets[pair].get_book(depth)
+
+    def get_candles(self, pair, interval_seconds, limit, end=None):
+        """
+            Returns limit (open time, open, high, low, close, volume) candles ending at end,
+            made up but always the same for the same arguments and ending at the current price
+        """
+        with self._lock:
+            price = self._markets[pair]._price
+        end = int(end if end is not None else time.time()) // interval_seconds * interval_seconds
+        rng = random.Random('{}/{}/{}/{}'.format(pair[0], pair[1], interval_seconds, end))
+        closes = [price]
+        for _ in range(limit):
+            closes.append(closes[-1] * math.exp(rng.gauss(0, self._volatility)))
+        closes.reverse()
+        candles = []
+        for index in range(limit):
+            open_price, close_price = closes[index], closes[index + 1]
+            candles.append((
+                end - (limit - 1 - index) * interval_seconds,
+                open_price,
+                max(open_price, close_price) * (1 + rng.uniform(0, self._volatility)),
+                min(open_price, close_price) * (1 - rng.uniform(0, self._volatility)),
+                close_price,
+                rng.uniform(0, 1000),
+            ))
+        return candles
+
+    def get_balances(self):
+        with self._lock:
+            on_orders = {}
+            for order in self._orders.values():
+                currency = order['Pair'][0] if order['Side'] == 'buy' else order['Pair'][1]
+                locked = order['Price'] * order['Amount'] if order['Side'] == 'buy' else order['Amount']
+                on_orders[currency] = on_orders.get(currency, 0.0) + locked
+            return {
+                currency: (amount, on_orders.get(currency, 0.0)) for currency, amount in self._balances.items()
+            }
+
+    def submit_order(self, pair, side, price, amount, immediate_or_cancel=False):
+        """
+            Fills the whole amount when the price crosses the best quote,
+            otherwise rests the order (or cancels it if immediate_or_cancel).
+            Returns the order with 'Filled' amount.
+        """
+        with self._lock:
+            best_bid, best_ask = self._markets[pair].get_best_prices()
+            crosses = price >= best_ask if side == 'buy' else price <= best_bid
+            order = {
+                'OrderId': next(self._order_ids),
+                'Pair': pair,
+                'Side': side,
+                'Price': price,
+                'Amount': amount,
+                'Filled': amount if crosses else 0.0,
+                'Time': time.time(),
+            }
+            if crosses:
+                sign = 1 if side == 'buy' else -1
+                fill_price = best_ask if side == 'buy' else best_bid
+                self._balances[pair[1]] = self._balances.get(pair[1], 0.0) + sign * amount
+                self._balances[pair[0]] = self._balances.get(pair[0], 0.0) - sign * amount * fill_price
+            elif not immediate_or_cancel:
+                self._orders[order['OrderId']] = order
+            return order
+
+    def cancel_order(self, order_id):
+        with self._lock:
+            return self._orders.pop(int(order_id), None)
+
+    def get_open_orders(self, pair=None):
+        with self._lock:
+            return [order for order in self._orders.values() if pair is None or order['Pair'] == pair]
+
+
+class MockWebsocket:
+    """
+        Server side of a websocket (RFC 6455) on the socket of an upgraded
+        http request. send() may be called from any thread.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+        self._lock = threading.Lock()
+        self._closed = False
+        self._subscriptions = set()
+
+    def send(self, message, opcode=0x1):
+        payload = message.encode('utf-8') if isinstance(message, str) else message
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('>BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('>BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+        with self._lock:
+            if self._closed:
+                return False
+            try:
+                self._connection.sendall(header + payload)
+            except OSError:
+                self._closed = True
+                return False
+        return True
+
+    def read_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self._connection.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('connection closed')
+            data += chunk
+        return data
+
+    def receive(self):
+        """
+            Returns the next text message, None once the connection is closed. Answers pings.
+        """
+        while not self._closed:
+            try:
+                first, second = self.read_exactly(2)
+                opcode = first & 0x0f
+                length = second & 0x7f
+                if length == 126:
+                    length = struct.unpack('>H', self.read_exactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack('>Q', self.read_exactly(8))[0]
+                mask = self.read_exactly(4) if second & 0x80 else None
+                payload = self.read_exactly(length)
+            except (OSError, ConnectionError):
+                self._closed = True
+                return None
+            if mask is not None:
+                payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+            if opcode == 0x8:
+                self.send(payload[:2], 0x8)
+                self._closed = True
+                return None
+            if opcode == 0x9:
+                self.send(payload, 0xA)
+            elif opcode in (0x1, 0x2):
+                return payload.decode('utf-8')
+        return None
+
+    def close(self):
+        self.send(struct.pack('>H', 1000), 0x8)
+        self._closed = True
+
+
+class MockDialect:
+    """
+        REST and websocket protocol of one exchange served by MockExchangeServer
+        under /<name>/. Subclasses translate simulated markets into the
+        messages the exchange adapter parses.
+    """
+    def __init__(self, simulator):
+        self._simulator = simulator
+        self._clients = []
+        self._clients_lock = threading.Lock()
+        self._symbols = {}
+
+    def get_symbol(self, pair):
+        raise NotImplementedError
+
+    def get_pair(self, symbol):
+        if not self._symbols:
+            self._symbols = {self.get_symbol(pair): pair for pair in self._simulator.get_markets()}
+        return self._symbols.get(symbol, None)
+
+    def handle_rest(self, method, path, query, body):
+        """
+            Returns (http status, json payload) of a request
+        """
+        raise NotImplementedError
+
+    def handle_websocket(self, websocket, path, query):
+        """
+            Serves a websocket until it is closed, in the thread of the request
+        """
+        with self._clients_lock:
+            self._clients = self._clients + [websocket]
+        try:
+            self.on_websocket_open(websocket, path, query)
+            while True:
+                message = websocket.receive()
+                if message is None:
+                    break
+                self.on_websocket_message(websocket, message)
+        finally:
+            with self._clients_lock:
+                self._clients = [client for client in self._clients if client is not websocket]
+
+    def on_websocket_open(self, websocket, path, query):
+        pass
+
+    def on_websocket_message(self, websocket, message):
+        pass
+
+    def on_step(self, changes):
+        """
+            Pushes market changes of a simulator step to subscribed websocket clients
+        """
+        pass
+
+    def on_heartbeat(self):
+        pass
+
+
+class BinanceMock(MockDialect):
+    """
+        Combined streams (!ticker@arr, <symbol>@depth@100ms) and the REST
+        endpoints used by Exchanges.Binance
+    """
+    def get_symbol(self, pair):
+        return pair[1] + pair[0]
+
+    def handle_rest(self, method, path, query, body):
+        if path == '/api/v1/ping':
+            return 200, {}
+        if path == '/api/v1/time':
+            return 200, {'serverTime': int(time.time() * 1000)}
+        if path == '/api/v1/exchangeInfo':
+            return 200, {'symbols': [self.get_definition(pair, market)
+                                     for pair, market in self._simulator.get_markets().items()]}
+        if path == '/api/v1/ticker/24hr':
+            return 200, self.get_tickers(query, self.get_24hour_statistics)
+        if path == '/api/v3/ticker/bookTicker':
+            return 200, self.get_tickers(query, self.get_book_ticker)
+        if path == '/api/v3/ticker/price':
+            return 200, self.get_tickers(
+                query, lambda symbol, ticker: {'symbol': symbol, 'price': format_number(ticker['Last'])}
+            )
+        pair = self.get_pair(query.get('symbol', ''))
+        if path == '/api/v1/depth':
+            if pair is None:
+                return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+            sequence, bids, asks = self._simulator.get_book(pair, int(query.get('limit', 100)))
+            return 200, {
+                'lastUpdateId': sequence,
+                'bids': [[format_number(price), format_number(quantity)] for price, quantity in bids],
+                'asks': [[format_number(price), format_number(quantity)] for price, quantity in asks],
+            }
+        if path == '/api/v1/klines':
+            if pair is None:
+                return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+            interval = query.get('interval', '5m')
+            seconds = int(interval[:-1]) * {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}[interval[-1]]
+            end = int(query['endTime']) // 1000 if 'endTime' in query else None
+            return 200, [
+                [opened * 1000, format_number(open_price), format_number(high), format_number(low),
+                 format_number(close), format_number(volume), (opened + seconds) * 1000 - 1,
+                 format_number(volume * close), 10, '0', '0', '0']
+                for opened, open_price, high, low, close, volume in
+                self._simulator.get_candles(pair, seconds, int(query.get('limit', 500)), end)
+            ]
+        if path in ('/api/v1/trades', '/api/v1/aggTrades'):
+            return 200, []
+        if path == '/api/v3/account':
+            return 200, {'balances': [
+                {'asset': currency, 'free': format_number(free), 'locked': format_number(locked)}
+                for currency, (free, locked) in self._simulator.get_balances().items()
+            ]}
+        if path == '/api/v3/openOrders':
+            return 200, [self.get_order(order) for order in self._simulator.get_open_orders(pair)]
+        if path in ('/api/v3/order', '/api/v3/order/test'):
+            if method == 'post':
+                if pair is None:
+                    return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+                if path == '/api/v3/order/test':
+                    return 200, {}
+                order = self._simulator.submit_order(
+                    pair,
+                    query.get('side', 'BUY').lower(),
+                    float(query.get('price', 0)),
+                    float(query.get('quantity', 0)),
+                    query.get('timeInForce', 'GTC') == 'IOC'
+                )
+                return 200, self.get_order(order)
+            if method == 'delete':
+                order = self._simulator.cancel_order(query.get('orderId', 0))
+                if order is None:
+                    return 400, {'code': -2011, 'msg': 'Unknown order sent.'}
+                return 200, self.get_order(order, 'CANCELED')
+            orders = [order for order in self._simulator.get_open_orders(pair)
+                      if str(order['OrderId']) == query.get('orderId', '')]
+            if not orders:
+                return 400, {'code': -2013, 'msg': 'Order does not exist.'}
+            return 200, self.get_order(orders[0])
+        return 404, {'code': -1000, 'msg': 'Not emulated: ' + path}
+
+    def get_tickers(self, query, format_ticker):
+        tickers = self._simulator.get_tickers()
+        if 'symbol' in query:
+            pair = self.get_pair(query['symbol'])
+            if pair is None:
+                return {'code': -1121, 'msg': 'Invalid symbol.'}
+            return format_ticker(query['symbol'], tickers[pair])
+        return [format_ticker(self.get_symbol(pair), ticker) for pair, ticker in tickers.items()]
+
+    @staticmethod
+    def get_book_ticker(symbol, ticker):
+        return {
+            'symbol': symbol,
+            'bidPrice': format_number(ticker['BestBid']),
+            'bidQty': format_number(ticker['BestBidSize']),
+            'askPrice': format_number(ticker['BestAsk']),
+            'askQty': format_number(ticker['BestAskSize']),
+        }
+
+    @staticmethod
+    def get_24hour_statistics(symbol, ticker):
+        return {
+            'symbol': symbol,
+            'priceChangePercent': '{:.3f}'.format(ticker['PercentMove']),
+            'lastPrice': format_number(ticker['Last']),
+            'bidPrice': format_number(ticker['BestBid']),
+            'bidQty': format_number(ticker['BestBidSize']),
+            'askPrice': format_number(ticker['BestAsk']),
+            'askQty': format_number(ticker['BestAskSize']),
+            'highPrice': format_number(ticker['High']),
+            'lowPrice': format_number(ticker['Low']),
+            'volume': format_number(ticker['Volume']),
+            'quoteVolume': format_number(ticker['QuoteVolume']),
+            'closeTime': int(ticker['TimeStamp'] * 1000),
+        }
+
+    def get_definition(self, pair, market):
+        return {
+            'symbol': self.get_symbol(pair),
+            'status': 'TRADING',
+            'baseAsset': pair[1],
+            'quoteAsset': pair[0],
+            'quotePrecision': 8,
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'minPrice': format_number(market._step),
+                 'tickSize': format_number(market._step)},
+                {'filterType': 'LOT_SIZE', 'minQty': '0.01000000', 'stepSize': '0.01000000'},
+            ],
+        }
+
+    def get_order(self, order, status=None):
+        if status is None:
+            status = 'FILLED' if order['Filled'] >= order['Amount'] else 'NEW'
+        return {
+            'symbol': self.get_symbol(order['Pair']),
+            'orderId': order['OrderId'],
+            'clientOrderId': 'mock{}'.format(order['OrderId']),
+            'price': format_number(order['Price']),
+            'origQty': format_number(order['Amount']),
+            'executedQty': format_number(order['Filled']),
+            'status': status,
+            'type': 'LIMIT',
+            'side': order['Side'].upper(),
+            'timeInForce': 'GTC',
+            'time': int(order['Time'] * 1000),
+            'transactTime': int(order['Time'] * 1000),
+        }
+
+    def on_websocket_open(self, websocket, path, query):
+        streams = query.get('streams', '')
+        websocket._subscriptions.update(stream for stream in streams.split('/') if stream)
+
+    def on_websocket_message(self, websocket, message):
+        request = json.loads(message)
+        if request.get('method', None) == 'SUBSCRIBE':
+            websocket._subscriptions.update(request.get('params', []))
+        elif request.get('method', None) == 'UNSUBSCRIBE':
+            websocket._subscriptions.difference_update(request.get('params', []))
+        websocket.send(json.dumps({'result': None, 'id': request.get('id', None)}))
+
+    def on_step(self, changes):
+        clients = self._clients
+        if not clients or not changes:
+            return
+        tickers = None
+        depth_messages = {}
+        for websocket in clients:
+            if '!ticker@arr' in websocket._subscriptions:
+                if tickers is None:
+                    tickers = json.dumps({'stream': '!ticker@arr', 'data': [
+                        self.get_ws_ticker(pair, market.get_ticker()) for pair, (market, _, _) in changes.items()
+                    ]})
+                websocket.send(tickers)
+            for stream in list(websocket._subscriptions):
+                if stream.endswith('@depth@100ms'):
+                    pair = self.get_pair(stream.split('@')[0].upper())
+                    if pair not in changes:
+                        continue
+                    if stream not in depth_messages:
+                        depth_messages[stream] = self.get_depth_message(stream, pair, *changes[pair][1:])
+                    websocket.send(depth_messages[stream])
+
+    def get_ws_ticker(self, pair, ticker):
+        return {
+            'e': '24hrTicker',
+            's': self.get_symbol(pair),
+            'P': '{:.3f}'.format(ticker['PercentMove']),
+            'c': format_number(ticker['Last']),
+            'b': format_number(ticker['BestBid']),
+            'B': format_number(ticker['BestBidSize']),
+            'a': format_number(ticker['BestAsk']),
+            'A': format_number(ticker['BestAskSize']),
+            'h': format_number(ticker['High']),
+            'l': format_number(ticker['Low']),
+            'v': format_number(ticker['Volume']),
+            'q': format_number(ticker['QuoteVolume']),
+            'C': int(ticker['TimeStamp'] * 1000),
+        }
+
+    def get_depth_message(self, stream, pair, sequence, updates):
+        return json.dumps({'stream': stream, 'data': {
+            'e': 'depthUpdate',
+            'E': int(time.time() * 1000),
+            's': self.get_symbol(pair),
+            'U': sequence,
+            'u': sequence,
+            'b': [[format_number(price), format_number(quantity)] for side, price, quantity in updates
+                  if side == 'Bid'],
+            'a': [[format_number(price), format_number(quantity)] for side, price, quantity in updates
+                  if side == 'Ask'],
+        }})
+
+
+class PoloniexMock(MockDialect):
+    """
+        Ticker (1002), heartbeat (1010) and price aggregated book channels
+        and the public and trading API commands used by Exchanges.Poloniex
+    """
+    def __init__(self, simulator):
+        super().__init__(simulator)
+        self._pairs_by_id = {market._id: pair for pair, market in simulator.get_markets().items()}
+
+    def get_symbol(self, pair):
+        return pair[0] + '_' + pair[1]
+
+    def handle_rest(self, method, path, query, body):
+        if path == '/public':
+            command = query.get('command', '')
+            pair = self.get_pair(query.get('currencyPair', ''))
+            if command == 'returnTicker':
+                markets = self._simulator.get_markets()
+                return 200, {
+                    self.get_symbol(pair): self.get_ticker(markets[pair]._id, ticker)
+                    for pair, ticker in self._simulator.get_tickers().items()
+                }
+            if command == 'returnCurrencies':
+                currencies = sorted({code for pair in self._simulator.get_markets() for code in pair})
+                return 200, {
+                    currency: {'id': currency_id, 'name': currency, 'TxFee': '0.00100000', 'minConf': 1,
+                               'depositAddress': None, 'disabled': 0, 'delisted': 0, 'frozen': 0}
+                    for currency_id, currency in enumerate(currencies, 1)
+                }
+            if command == 'returnOrderBook':
+                if pair is None:
+                    return 200, {'error': 'Invalid currency pair.'}
+                sequence, bids, asks = self._simulator.get_book(pair, int(query.get('depth', 50)))
+                return 200, {
+                    'asks': [[format_number(price), quantity] for price, quantity in asks],
+                    'bids': [[format_number(price), quantity] for price, quantity in bids],
+                    'isFrozen': '0',
+                    'seq': sequence,
+                }
+            if command == 'returnChartData':
+                if pair is None:
+                    return 200, {'error': 'Invalid currency pair.'}
+                seconds = int(query.get('period', 300))
+                start, end = int(query.get('start', 0)), int(query.get('end', time.time()))
+                limit = max(1, min(1000, (end - start) // seconds))
+                return 200, [
+                    {'date': opened, 'high': high, 'low': low, 'open': open_price, 'close': close,
+                     'volume': volume * close, 'quoteVolume': volume, 'weightedAverage': (high + low) / 2}
+                    for opened, open_price, high, low, close, volume in
+                    self._simulator.get_candles(pair, seconds, limit, end)
+                ]
+            if command == 'returnTradeHistory':
+                return 200, []
+            return 200, {'error': 'Invalid command.'}
+        if path == '/tradingApi':
+            command = body.get('command', '')
+            pair = self.get_pair(body.get('currencyPair', ''))
+            if command == 'returnBalances':
+                return 200, {currency: format_number(free)
+                             for currency, (free, _) in self._simulator.get_balances().items()}
+            if command == 'returnCompleteBalances':
+                return 200, {currency: {'available': format_number(free), 'onOrders': format_number(locked),
+                                        'btcValue': '0.00000000'}
+                             for currency, (free, locked) in self._simulator.get_balances().items()}
+            if command in ('buy', 'sell'):
+                if pair is None:
+                    return 200, {'error': 'Invalid currency pair.'}
+                order = self._simulator.submit_order(
+                    pair, command, float(body.get('rate', 0)), float(body.get('amount', 0)),
+                    body.get('immediateOrCancel', '0') == '1'
+                )
+                trades = [{'amount': format_number(order['Filled']), 'rate': format_number(order['Price']),
+                           'type': command}] if order['Filled'] else []
+                return 200, {'orderNumber': str(order['OrderId']), 'resultingTrades': trades}
+            if command == 'cancelOrder':
+                if self._simulator.cancel_order(body.get('orderNumber', 0)) is None:
+                    return 200, {'error': 'Invalid order number.', 'success': 0}
+                return 200, {'success': 1}
+            if command == 'returnOpenOrders':
+                return 200, [
+                    {'orderNumber': str(order['OrderId']), 'type': order['Side'],
+                     'rate': format_number(order['Price']), 'amount': format_number(order['Amount']),
+                     'total': format_number(order['Price'] * order['Amount']),
+                     'date': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(order['Time']))}
+                    for order in self._simulator.get_open_orders(pair)
+                ]
+            if command == 'returnFeeInfo':
+                return 200, {'makerFee': '0.00090000', 'takerFee': '0.00090000'}
+            return 200, {'error': 'Invalid command.'}
+        return 404, {'error': 'Not emulated: ' + path}
+
+    @staticmethod
+    def get_ticker(market_id, ticker):
+        return {
+            'id': market_id,
+            'last': format_number(ticker['Last']),
+            'lowestAsk': format_number(ticker['BestAsk']),
+            'highestBid': format_number(ticker['BestBid']),
+            'percentChange': format_number(ticker['PercentMove'] / 100),
+            'baseVolume': format_number(ticker['QuoteVolume']),
+            'quoteVolume': format_number(ticker['Volume']),
+            'isFrozen': '0',
+            'high24hr': format_number(ticker['High']),
+            'low24hr': format_number(ticker['Low']),
+        }
+
+    def on_websocket_message(self, websocket, message):
+        request = json.loads(message)
+        channel = request.get('channel', None)
+        if request.get('command', None) == 'unsubscribe':
+            websocket._subscriptions.discard(channel)
+            return
+        if request.get('command', None) != 'subscribe':
+            return
+        websocket._subscriptions.add(channel)
+        pair = self.get_pair(channel) if isinstance(channel, str) else None
+        if pair is not None:
+            market = self._simulator.get_markets()[pair]
+            sequence, bids, asks = self._simulator.get_book(pair, 1000)
+            websocket.send(json.dumps([market._id, sequence, [['i', {
+                'currencyPair': channel,
+                'orderBook': [
+                    {format_number(price): format_number(quantity) for price, quantity in asks},
+                    {format_number(price): format_number(quantity) for price, quantity in bids},
+                ],
+            }]]]))
+
+    def on_step(self, changes):
+        clients = self._clients
+        if not clients or not changes:
+            return
+        tickers = None
+        book_messages = {}
+        for websocket in clients:
+            if 1002 in websocket._subscriptions:
+                if tickers is None:
+                    tickers = [json.dumps([1002, None, self.get_ws_ticker(market._id, market.get_ticker())])
+                               for market, _, _ in changes.values()]
+                for message in tickers:
+                    websocket.send(message)
+            for channel in list(websocket._subscriptions):
+                pair = self.get_pair(channel) if isinstance(channel, str) else None
+                if pair is None or pair not in changes:
+                    continue
+                if channel not in book_messages:
+                    market, sequence, updates = changes[pair]
+                    book_messages[channel] = json.dumps([market._id, sequence, [
+                        ['o', 1 if side == 'Bid' else 0, format_number(price), format_number(quantity)]
+                        for side, price, quantity in updates
+                    ]])
+                websocket.send(book_messages[channel])
+
+    @staticmethod
+    def get_ws_ticker(market_id, ticker):
+        return [
+            market_id,
+            format_number(ticker['Last']),
+            format_number(ticker['BestAsk']),
+            format_number(ticker['BestBid']),
+            format_number(ticker['PercentMove'] / 100),
+            format_number(ticker['QuoteVolume']),
+            format_number(ticker['Volume']),
+            0,
+            format_number(ticker['High']),
+            format_number(ticker['Low']),
+        ]
+
+    def on_heartbeat(self):
+        for websocket in self._clients:
+            websocket.send('[1010]')
+
+
+class _MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server._mock.handle(self, 'get')
+
+    def do_POST(self):
+        self.server._mock.handle(self, 'post')
+
+    def do_PUT(self):
+        self.server._mock.handle(self, 'put')
+
+    def do_DELETE(self):
+        self.server._mock.handle(self, 'delete')
+
+
+class MockExchangeServer:
+    """
+        Local stand-in for exchange REST and websocket endpoints, built on
+        the standard library only, for load tests and development without
+        exchange access. Exchanges are pointed at it with Exchange.set_urls
+        or the "URL Overrides" settings:
+            "URL Overrides": {
+                "Binance":  {"REST": "http://127.0.0.1:8765/binance", "Websocket": "ws://127.0.0.1:8765/binance"},
+                "Poloniex": {"REST": "http://127.0.0.1:8765/poloniex", "Websocket": "ws://127.0.0.1:8765/poloniex"}
+            }
+        Binance and Poloniex are emulated: tickers, order books (REST
+        snapshots and sequenced websocket deltas), klines, account balances
+        and order submission against a MarketSimulator stepped every
+        step_seconds.
+
+        :param simulator: MarketSimulator providing the market dynamics
+        :param host: Interface to listen on
+        :param port: Port to listen on, 0 picks a free one
+        :param step_seconds: Seconds between simulator steps pushed to websockets
+        :param latency: Seconds added to every REST response
+        :param latency_jitter: Random extra seconds up to this added to every REST response
+        :param error_rate: Fraction of REST requests failing with 503
+        :param throttle_rate: Fraction of REST requests failing with 429 and Retry-After
+    """
+    def __init__(self, simulator, host='127.0.0.1', port=0, step_seconds=0.1, latency=0, latency_jitter=0,
+                 error_rate=0, throttle_rate=0):
+        self._simulator = simulator
+        self._step_seconds = step_seconds
+        self._latency = latency
+        self._latency_jitter = latency_jitter
+        self._error_rate = error_rate
+        self._throttle_rate = throttle_rate
+        self._rng = random.Random()
+        self._dialects = {
+            'binance': BinanceMock(simulator),
+            'poloniex': PoloniexMock(simulator),
+        }
+        self._server = ThreadingHTTPServer((host, port), _MockRequestHandler)
+        self._server.daemon_threads = True
+        self._server._mock = self
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._status = {'Requests': 0, 'Errors': 0, 'Throttled': 0, 'Steps': 0, 'Websockets': 0}
+
+    def get_url(self, exchange, scheme='http'):
+        host, port = self._server.server_address[:2]
+        return '{}://{}:{}/{}'.format(scheme, host, port, exchange.lower())
+
+    def get_ws_url(self, exchange):
+        return self.get_url(exchange, 'ws')
+
+    def start(self):
+        for target in (self._server.serve_forever, self.run_steps):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._server.shutdown()
+        self._server.server_close()
+        for dialect in self._dialects.values():
+            for websocket in dialect._clients:
+                websocket.close()
+
+    def run_steps(self):
+        last_heartbeat = time.monotonic()
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            changes = self._simulator.step()
+            self._status['Steps'] += 1
+            heartbeat = started - last_heartbeat >= 1
+            if heartbeat:
+                last_heartbeat = started
+            for dialect in self._dialects.values():
+                try:
+                    dialect.on_step(changes)
+                    if heartbeat:
+                        dialect.on_heartbeat()
+                except Exception as e:
+                    print('Exception in mock exchange server step: {}'.format(e))
+            self._stop_event.wait(max(0.0, self._step_seconds - (time.monotonic() - started)))
+
+    def handle(self, request, method):
+        parts = urlsplit(request.path)
+        name, _, path = parts.path.lstrip('/').partition('/')
+        dialect = self._dialects.get(name, None)
+        query = dict(parse_qsl(parts.query))
+        if dialect is None:
+            return self.respond(request, 404, {'error': 'Unknown exchange ' + name})
+        if request.headers.get('Upgrade', '').lower() == 'websocket':
+            return self.serve_websocket(request, dialect, '/' + path, query)
+
+        self._status['Requests'] += 1
+        if self._latency or self._latency_jitter:
+            time.sleep(self._latency + self._rng.uniform(0, self._latency_jitter))
+        draw = self._rng.random()
+        if draw < self._error_rate:
+            self._status['Errors'] += 1
+            return self.respond(request, 503, {'code': -1001, 'msg': 'Simulated error', 'error': 'Simulated error'})
+        if draw < self._error_rate + self._throttle_rate:
+            self._status['Throttled'] += 1
+            return self.respond(request, 429, {'code': -1003, 'msg': 'Simulated throttling'}, {'Retry-After': '1'})
+
+        length = int(request.headers.get('Content-Length', 0) or 0)
+        body = dict(parse_qsl(request.rfile.read(length).decode('utf-8'))) if length else {}
+        try:
+            status, payload = dialect.handle_rest(method, '/' + path, query, body)
+        except Exception as e:
+            status, payload = 500, {'code': -1000, 'msg': str(e), 'error': str(e)}
+        self.respond(request, status, payload)
+
+    @staticmethod
+    def respond(request, status, payload, headers=None):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def serve_websocket(self, request, dialect, path, query):
+        key = request.headers.get('Sec-WebSocket-Key', '')
+        accept = base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()).decode()
+        request.send_response(101, 'Switching Protocols')
+        request.send_header('Upgrade', 'websocket')
+        request.send_header('Connection', 'Upgrade')
+        request.send_header('Sec-WebSocket-Accept', accept)
+        request.end_headers()
+        request.wfile.flush()
+        request.close_connection = True
+        request.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._status['Websockets'] += 1
+        try:
+            dialect.handle_websocket(MockWebsocket(request.connection), path, query)
+        finally:
+            self._status['Websockets'] -= 1
+
+    def get_status(self):
+        return dict(self._status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of exchange REST and websocket endpoints')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--markets', type=int, default=300, help='number of simulated markets')
+    parser.add_argument('--markets-per-step', type=int, default=None, help='markets changing per step')
+    parser.add_argument('--step-seconds', type=float, default=0.1)
+    parser.add_argument('--volatility', type=float, default=0.002)
+    parser.add_argument('--depth', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--script', default=None, help='json file of [seconds, base, currency, price] entries')
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--latency-jitter', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle-rate', type=float, default=0)
+    args = parser.parse_args()
+
+    script = None
+    if args.script is not None:
+        with open(args.script, 'r') as script_file:
+            script = [tuple(entry) for entry in json.load(script_file)]
+    simulator = MarketSimulator(
+        MarketSimulator.generate_pairs(args.markets),
+        seed=args.seed,
+        volatility=args.volatility,
+        depth=args.depth,
+        markets_per_step=args.markets_per_step,
+        script=script
+    )
+    server = MockExchangeServer(
+        simulator, args.host, args.port, args.step_seconds, args.latency, args.latency_jitter,
+        args.error_rate, args.throttle_rate
+    ).start()
+    print('"URL Overrides": ' + json.dumps({
+        exchange: {'REST': server.get_url(exchange), 'Websocket': server.get_ws_url(exchange)}
+        for exchange in ('Binance', 'Poloniex')
+    }, indent=4))
+    try:
+        while True:
+            time.sleep(10)
+            print(server.get_status())
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import threading
+
+import numpy as np
+
+
+class QuoteMatrix:
+    """
+        Columnar snapshot of best quotes with one row per traded pair
+        (code_base, code_curr) and one column per exchange.
+
+        Exchanges write into it from Exchange.update_market as quotes arrive,
+        so cross-exchange scans are vectorized numpy operations over the whole
+        matrix instead of walking nested market dictionaries. Missing quotes
+        are stored as NaN.
+    """
+    FIELDS = ('BestBid', 'BestAsk', 'BestBidSize', 'BestAskSize')
+
+    def __init__(self, exchanges, capacity=1024):
+        self._exchanges = list(exchanges)
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._pairs = []
+        self._markets = {}
+        self._values = {field: np.full((capacity, len(self._exchanges)), np.nan) for field in self.FIELDS}
+
+    def get_column(self, exchange):
+        return self._exchanges.index(exchange)
+
+    def get_row(self, code_base, code_curr):
+        """
+            Returns row of the pair, adding it when missing. Has to be called with the lock held.
+        """
+        row = self._rows.get((code_base, code_curr), None)
+        if row is None:
+            row = len(self._pairs)
+            capacity = self._values['BestBid'].shape[0]
+            if row >= capacity:
+                for field in self.FIELDS:
+                    grown = np.full((2 * capacity, len(self._exchanges)), np.nan)
+                    grown[:capacity] = self._values[field]
+                    self._values[field] = grown
+            self._rows[(code_base, code_curr)] = row
+            self._pairs.append((code_base, code_curr))
+        return row
+
+    def update(self, column, code_base, code_curr, market):
+        """
+            Stores quotes of an active market, market is the dictionary kept in Exchange._active_markets
+        """
+        with self._lock:
+            row = self.get_row(code_base, code_curr)
+            self._markets[(row, column)] = market
+            for field in self.FIELDS:
+                value = market.get(field, None)
+                self._values[field][row, column] = np.nan if value is None else value
+
+    def remove(self, column, code_base, code_curr):
+        with self._lock:
+            row = self._rows.get((code_base, code_curr), None)
+            if row is not None:
+                self._markets.pop((row, column), None)
+                for field in self.FIELDS:
+                    self._values[field][row, column] = np.nan
+
+    def snapshot(self):
+        """
+            Returns pairs and copies of the filled part of the bid and ask arrays
+        """
+        with self._lock:
+            count = len(self._pairs)
+            return list(self._pairs), self._values['BestBid'][:count].copy(), self._values['BestAsk'][:count].copy()
+
+    def get_columns(self, exchanges=None):
+        """
+            Returns columns of exchanges in column order, None when all exchanges are scanned
+        """
+        if exchanges is None:
+            return None
+        columns = [column for column, exchange in enumerate(self._exchanges) if exchange in exchanges]
+        return None if len(columns) == len(self._exchanges) else columns
+
+    @staticmethod
+    def get_valid_quotes(bids, asks):
+        """
+            Replaces missing or non-positive quotes so that they never win max/min comparisons
+        """
+        with np.errstate(invalid='ignore'):
+            bids = np.where(bids > 0, bids, -np.inf)
+            asks = np.where(asks > 0, asks, np.inf)
+        return bids, asks
+
+    def get_arbitrage_pairs(self, required_rate_of_return, exchanges=None):
+        """
+            Returns list of (code_base, code_curr) quoted on more than one
+            exchange where the best bid across exchanges exceeds the best ask
+            times required_rate_of_return.
+            exchanges - optional names of the exchanges to compare, all by default
+        """
+        pairs, bids, asks = self.snapshot()
+        if not pairs:
+            return []
+        columns = self.get_columns(exchanges)
+        if columns is not None:
+            if not columns:
+                return []
+            bids, asks = bids[:, columns], asks[:, columns]
+        quoted = (~np.isnan(bids) | ~np.isnan(asks)).sum(axis=1)
+        bids, asks = self.get_valid_quotes(bids, asks)
+        with np.errstate(invalid='ignore'):
+            mask = (quoted > 1) & (bids.max(axis=1) > asks.min(axis=1) * required_rate_of_return)
+        return [pairs[row] for row in np.nonzero(mask)[0]]
+
+    def get_exchange_arbitrage(self, required_rate_of_return, exchanges=None):
+        """
+            Returns every (pair, exchange bought at ask, exchange sold at bid)
+            combination whose bid / ask exceeds required_rate_of_return, using
+            one broadcast comparison over pairs x exchanges x exchanges.
+            exchanges - optional names of the exchanges to compare, all by default
+        """
+        pairs, bids, asks = self.snapshot()
+        if not pairs:
+            return []
+        columns = self.get_columns(exchanges)
+        if columns is not None:
+            if not columns:
+                return []
+            bids, asks = bids[:, columns], asks[:, columns]
+        bids, asks = self.get_valid_quotes(bids, asks)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = bids[:, :, np.newaxis] / asks[:, np.newaxis, :]
+            rows, scanned_bid, scanned_ask = np.nonzero(returns > required_rate_of_return)
+        results = []
+        for row, scanned_column_bid, scanned_column_ask in zip(rows, scanned_bid, scanned_ask):
+            column_bid = scanned_column_bid if columns is None else columns[scanned_column_bid]
+            column_ask = scanned_column_ask if columns is None else columns[scanned_column_ask]
+            market_bid = self._markets.get((row, column_bid), None)
+            market_ask = self._markets.get((row, column_ask), None)
+            if market_bid is None or market_ask is None:
+                continue
+            code_base, code_curr = pairs[row]
+            results.append({
+                'code_base': code_base,
+                'code_curr': code_curr,
+                'exchangeAsk': self._exchanges[column_ask],
+                'marketAsk': market_ask['MarketSymbol'],
+                'exchangeAskBid': market_ask['BestBid'],
+                'exchangeAskAsk': market_ask['BestAsk'],
+                'exchangeBid': self._exchanges[column_bid],
+                'marketBid': market_bid['MarketSymbol'],
+                'exchangeBidBid': market_bid['BestBid'],
+                'exchangeBidAsk': market_bid['BestAsk'],
+                'return': 100.0 * (float(returns[row, scanned_column_bid, scanned_column_ask]) - 1)
+            })
+        return results
@@ -0,0 +1,137 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+        Holds up to capacity tokens refilled at capacity / seconds per second,
+        e.g. TokenBucket(1200, 60) for a limit of 1200 weight per minute.
+    """
+    def __init__(self, capacity, seconds):
+        self._capacity = capacity
+        self._seconds = seconds
+        self._rate = capacity / seconds
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+
+    def refill(self, now):
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def get_wait(self, weight, now):
+        """
+            Seconds until weight tokens are available, 0 if they are available now.
+            Weights above capacity wait for a full bucket instead of forever.
+        """
+        self.refill(now)
+        wait = max(0, self._paused_until - now)
+        missing = min(weight, self._capacity) - self._tokens
+        if missing > 0:
+            wait = max(wait, missing / self._rate)
+        return wait
+
+    def consume(self, weight):
+        self._tokens -= weight
+
+    def set_used(self, used, now):
+        """
+            Aligns the bucket with weight the server reports as used in the current window
+        """
+        self.refill(now)
+        self._tokens = min(self._tokens, self._capacity - used)
+
+    def pause(self, seconds, now):
+        """
+            Stops handing out tokens, e.g. after the server answered 429 with Retry-After
+        """
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = min(self._tokens, 0)
+        self._updated = max(self._updated, now)
+
+    def get_status(self, now):
+        self.refill(now)
+        return {
+            'Capacity': self._capacity,
+            'Seconds': self._seconds,
+            'Available': max(0, self._tokens),
+            'PausedSeconds': max(0, self._paused_until - now),
+        }
+
+
+class RateLimiter:
+    """
+        Token buckets of one exchange, e.g. {'Weight': (1200, 60), 'Orders': (10, 1)}.
+
+        acquire() blocks callers in arrival order until every bucket the
+        request counts against has enough tokens, so bursts from thread pools
+        are queued and sent at the highest rate the exchange allows instead of
+        being rejected (or getting the IP banned).
+
+        :param limits: Dictionary of bucket name to (capacity, seconds)
+        :param utilization: Fraction of published limits to use, leaves headroom for clock drift
+    """
+    def __init__(self, limits=None, utilization=1.0):
+        self._condition = threading.Condition()
+        self._buckets = {}
+        self._next_ticket = 0
+        self._serving = 0
+        self._requests = 0
+        self._waited = 0.0
+        for name, (capacity, seconds) in (limits or {}).items():
+            self._buckets[name] = TokenBucket(capacity * utilization, seconds)
+
+    def acquire(self, weights):
+        """
+            Waits for and takes tokens, weights is a dictionary of bucket name to weight.
+            Returns seconds waited.
+        """
+        weights = {name: weight for name, weight in weights.items() if name in self._buckets and weight > 0}
+        if not weights:
+            return 0
+        start = time.monotonic()
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving:
+                self._condition.wait()
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = max(self._buckets[name].get_wait(weight, now) for name, weight in weights.items())
+                    if wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                for name, weight in weights.items():
+                    self._buckets[name].consume(weight)
+            finally:
+                self._serving += 1
+                self._condition.notify_all()
+            waited = time.monotonic() - start
+            self._requests += 1
+            self._waited += waited
+        return waited
+
+    def set_used(self, name, used):
+        """
+            Applies used weight reported by the server, e.g. Binance X-MBX-USED-WEIGHT-1M
+        """
+        with self._condition:
+            if name in self._buckets:
+                self._buckets[name].set_used(used, time.monotonic())
+
+    def pause(self, seconds):
+        with self._condition:
+            now = time.monotonic()
+            for bucket in self._buckets.values():
+                bucket.pause(seconds, now)
+
+    def get_status(self):
+        with self._condition:
+            now = time.monotonic()
+            return {
+                'Requests': self._requests,
+                'Queued': self._next_ticket - self._serving,
+                'SecondsWaited': self._waited,
+                'Buckets': {name: bucket.get_status(now) for name, bucket in self._buckets.items()},
+            }
@@ -0,0 +1,74 @@
+import threading
+import time
+
+
+class RequestCache:
+    """
+        Single-flight cache of request results.
+
+        Concurrent get() calls with the same key wait for the one load()
+        already in flight instead of sending their own request, and results
+        are served from memory for ttl seconds afterwards. Errors of load()
+        are raised to every waiting caller and never cached.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+        self._in_flight = {}
+        self._hits = 0
+        self._coalesced = 0
+        self._loads = 0
+
+    def get(self, key, load, ttl=0):
+        with self._lock:
+            cached = self._results.get(key, None)
+            if cached is not None and cached[0] > time.monotonic():
+                self._hits += 1
+                return cached[1]
+            flight = self._in_flight.get(key, None)
+            if flight is None:
+                flight = {'Event': threading.Event(), 'Result': None, 'Error': None}
+                self._in_flight[key] = flight
+                self._loads += 1
+                leader = True
+            else:
+                self._coalesced += 1
+                leader = False
+
+        if not leader:
+            flight['Event'].wait()
+            if flight['Error'] is not None:
+                raise flight['Error']
+            return flight['Result']
+
+        try:
+            flight['Result'] = load()
+        except Exception as e:
+            flight['Error'] = e
+            raise
+        finally:
+            with self._lock:
+                if self._in_flight.get(key, None) is flight:
+                    del self._in_flight[key]
+                    if flight['Error'] is None and ttl > 0:
+                        self._results[key] = (time.monotonic() + ttl, flight['Result'])
+            flight['Event'].set()
+        return flight['Result']
+
+    def clear(self):
+        """
+            Drops cached results, loads in flight are not cached when they finish
+        """
+        with self._lock:
+            self._results = {}
+            self._in_flight = {}
+
+    def get_status(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'Loads': self._loads,
+                'Hits': self._hits,
+                'Coalesced': self._coalesced,
+                'Cached': sum(1 for expires, _ in self._results.values() if expires > now),
+            }
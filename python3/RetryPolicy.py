@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+
+import requests
+
+
+class RequestError(Exception):
+    """
+        Error of a REST request.
+
+        :param message: Error message, e.g. returned by the exchange
+        :param retryable: True when sending the request again may succeed
+        :param retry_after: Seconds the server asked to wait before the next request
+        :param safe_to_resend: True when the server certainly rejected the request without
+            executing it (throttling, nonce or timestamp rejections), so even requests which
+            are not idempotent may be sent again
+    """
+    def __init__(self, message, retryable=False, retry_after=None, safe_to_resend=False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.safe_to_resend = safe_to_resend
+
+
+class CircuitOpenError(RequestError):
+    pass
+
+
+class CircuitBreaker:
+    """
+        Fails requests of an endpoint fast after failure_threshold retryable
+        failures in a row. After reset_seconds one trial request is let
+        through, its success closes the breaker, its failure opens it again.
+    """
+    CLOSED = 'Closed'
+    OPEN = 'Open'
+    HALF_OPEN = 'HalfOpen'
+
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self._failure_threshold = failure_threshold
+        self._reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened = 0
+        self._trial_running = False
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened >= self._reset_seconds:
+                self._state = self.HALF_OPEN
+                self._trial_running = False
+            if self._state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self._failure_threshold:
+                self._state = self.OPEN
+                self._opened = time.monotonic()
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'State': self._state,
+                'Failures': self._failures,
+                'SecondsUntilTrial': max(0, self._opened + self._reset_seconds - time.monotonic())
+                if self._state == self.OPEN else 0,
+            }
+
+
+class RetryPolicy:
+    """
+        Retries failed requests with jittered exponential backoff and keeps
+        a CircuitBreaker per endpoint, so that an exchange outage costs every
+        caller at most max_attempts requests and then fails fast until the
+        endpoint recovers instead of piling blocked calls onto thread pools.
+
+        Network errors, timeouts, 5xx and 429/418 responses are retryable.
+        Requests which are not idempotent (e.g. placing orders) are retried
+        only when they certainly did not reach the server (connect timeouts)
+        or the server certainly rejected them (RequestError.safe_to_resend),
+        never after 5xx or errors with unknown execution status.
+
+        :param max_attempts: Requests sent per call including the first one
+        :param base_delay: Upper bound of the first backoff in seconds, doubled per attempt
+        :param max_delay: Upper bound of any backoff in seconds
+        :param failure_threshold: Retryable failures in a row opening the breaker of an endpoint
+        :param reset_seconds: Seconds an open breaker waits before a trial request
+    """
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=10, failure_threshold=5, reset_seconds=30):
+        self._max_attempts = max(1, max_attempts)
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._failure_threshold = failure_threshold
+        self._reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get_breaker(self, endpoint):
+        with self._lock:
+            breaker = self._breakers.get(endpoint, None)
+            if breaker is None:
+                breaker = CircuitBreaker(self._failure_threshold, self._reset_seconds)
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def get_delay(self, attempt):
+        """
+            Full jitter: uniform between 0 and base_delay * 2 ** attempt, capped at max_delay
+        """
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+
+    @staticmethod
+    def is_retryable(error, idempotent=True):
+        if isinstance(error, CircuitOpenError):
+            return False
+        if isinstance(error, RequestError):
+            return error.retryable and (idempotent or error.safe_to_resend)
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if not idempotent:
+            return False
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ValueError))
+
+    def call(self, endpoint, send, idempotent=True, on_error=None):
+        """
+            Returns send() of the first successful attempt, raises the last error otherwise.
+            on_error(error, attempt) is called for every failed attempt.
+        """
+        breaker = self.get_breaker(endpoint)
+        for attempt in range(self._max_attempts):
+            if not breaker.allow():
+                raise CircuitOpenError('circuit open for {}'.format(endpoint))
+            try:
+                result = send()
+            except Exception as e:
+                retryable = self.is_retryable(e, idempotent)
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if on_error is not None:
+                    on_error(e, attempt)
+                if not retryable or attempt + 1 >= self._max_attempts:
+                    raise
+                time.sleep(max(self.get_delay(attempt), getattr(e, 'retry_after', None) or 0))
+            else:
+                breaker.record_success()
+                return result
+
+    def get_status(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {endpoint: breaker.get_status() for endpoint, breaker in breakers.items()}
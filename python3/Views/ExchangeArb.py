@@ -1,52 +1,43 @@
 import time
 
-from PyQt5.QtCore import QTimer
-from PyQt5.QtWidgets import (QWidget, QGridLayout, QTableWidget, QTableWidgetItem, QLineEdit, QLabel, QCheckBox,
-                             QHBoxLayout, QPushButton)
+from PyQt5.QtCore import Qt, QTimer, QThreadPool, pyqtSignal
+from PyQt5.QtWidgets import (QWidget, QGridLayout, QTableView, QLineEdit, QLabel, QCheckBox, QHBoxLayout)
 
 import CTColors
+from Views.TableModel import CTTableColumn, CTTableModel, CTTableProxyModel
 from Views.TwoOrderBooks import CTTwoOrderBooks
-
-
-class CTSelectArbButton(QPushButton):
-    def __init__(self, parent=None, row=None):
-        super().__init__()
-        self._row = row
-        self._parent = parent
-        self.setText("View")
-        self.clicked.connect(self.select_arb)
-
-    def select_arb(self):
-        self._parent._selected_order_books = CTTwoOrderBooks(
-            CTMain=self._parent._CTMain,
-            exchange1=self._row['exchangeAsk'],
-            market_symbol_1=self._row['marketAsk'],
-            base_curr1=self._parent._CTMain._Crypto_Trader.trader[self._row['exchangeAsk']].get_local_code(
-                self._row['code_base']
-            ),
-            curr_curr1=self._parent._CTMain._Crypto_Trader.trader[self._row['exchangeAsk']].get_local_code(
-                self._row['code_curr']
-            ),
-            exchange2=self._row['exchangeBid'],
-            market_symbol_2=self._row['marketBid'],
-            base_curr2=self._parent._CTMain._Crypto_Trader.trader[self._row['exchangeBid']].get_local_code(
-                self._row['code_base']
-            ),
-            curr_curr2=self._parent._CTMain._Crypto_Trader.trader[self._row['exchangeBid']].get_local_code(
-                self._row['code_curr']
-            ),
-            depth=5
-        )
-        self._parent._selected_order_books.setGeometry(150, 150, 1600, 800)
+from Worker import CTWorker
 
 
 class CTExchangeArb(QWidget):
+    _arbitrage_changed = pyqtSignal()
+    _rows_sized = pyqtSignal(object)
+
     def __init__(self, CTMain=None):
         super().__init__()
         self._CTMain = CTMain
 
-        self._tableWidget = QTableWidget()
-        self._tableWidget.setColumnCount(10)
+        self._tableModel = CTTableModel([
+            CTTableColumn('Base', 'code_base'),
+            CTTableColumn('Currency', 'code_curr'),
+            CTTableColumn('Exchange1', 'exchangeAsk'),
+            CTTableColumn('Exchange1 Bid', 'exchangeAskBid', '{:.8f}'),
+            CTTableColumn('Exchange1 Ask', 'exchangeAskAsk', '{:.8f}',
+                          background=lambda value, row: CTColors.GREEN_LIGHT),
+            CTTableColumn('Exchange2', 'exchangeBid'),
+            CTTableColumn('Exchange2 Bid', 'exchangeBidBid', '{:.8f}',
+                          background=lambda value, row: CTColors.RED_LIGHT),
+            CTTableColumn('Exchange2 Ask', 'exchangeBidAsk', '{:.8f}'),
+            CTTableColumn('Return', 'return', '{:.2f}%'),
+            CTTableColumn('Volume', 'Volume', '{:.8f}'),
+            CTTableColumn('Net Return', 'NetReturn', '{:.2f}%'),
+            CTTableColumn('View Order Books', lambda row: 'View'),
+        ], lambda row: (row['code_base'], row['code_curr'], row['exchangeAsk'], row['exchangeBid']), self)
+        self._proxyModel = CTTableProxyModel(self)
+        self._proxyModel.setSourceModel(self._tableModel)
+        self._tableView = QTableView()
+        self._tableView.setModel(self._proxyModel)
+        self._tableView.clicked.connect(self.select_arb)
         self._layout = QGridLayout()
 
         self._required_rate_of_return_inputbox = QLineEdit('0.5', self)
@@ -58,24 +49,53 @@ class CTExchangeArb(QWidget):
         self._sort_by_return.setChecked(True)
         self._sort_by_return.stateChanged.connect(lambda: self.check_arbs(load_markets=False))
 
+        self._size_by_depth = QCheckBox("Size by order book depth?", self)
+        self._size_by_depth.setChecked(False)
+        self._size_by_depth.stateChanged.connect(lambda: self.check_arbs(load_markets=False))
+        self._max_sized_rows = 20
+        self._sized_rows = {}
+        self._sizing = False
+        self._size_again = False
+        self._thread_pool = QThreadPool()
+        self._thread_pool.setMaxThreadCount(1)
+        self._rows_sized.connect(self.on_rows_sized)
+
         topLayout = QHBoxLayout()
         topLayout.addWidget(label_return)
         topLayout.addWidget(self._required_rate_of_return_inputbox)
         topLayout.addWidget(self._sort_by_return)
+        topLayout.addWidget(self._size_by_depth)
         topLayout.addStretch(1)
 
-        self._layout.addLayout(topLayout, 0, 0, 1, 10)
-        self._layout.addWidget(self._tableWidget, 1, 0, 10, 10)
+        self._layout.addLayout(topLayout, 0, 0, 1, 12)
+        self._layout.addWidget(self._tableView, 1, 0, 10, 12)
 
         self.setLayout(self._layout)
 
-        self._arbitrage_possibilities = {}
+        self._arbitrage_possibilities = []
+        self._required_rate_of_return = 1.0
         self.check_arbs()
 
         self._timer = QTimer(self)
-        self._timer.start(5000)
+        arbitrage_index = self._CTMain._Crypto_Trader._arbitrage_index
+        if arbitrage_index is None:
+            self._timer.start(5000)
+        else:
+            self._timer.setSingleShot(True)
+            self._timer.setInterval(250)
+            self._arbitrage_changed.connect(self.schedule_check_arbs)
+            listener = self._arbitrage_changed.emit
+            arbitrage_index.add_listener(listener)
+            self.destroyed.connect(lambda: arbitrage_index.remove_listener(listener))
         self._timer.timeout.connect(self.check_arbs)
 
+    def schedule_check_arbs(self):
+        """
+            Refreshes at most every 250ms while the arbitrage index keeps changing
+        """
+        if not self._timer.isActive():
+            self._timer.start()
+
     def check_arbs(self, load_markets=True):
         required_rate_of_return = 1.0
         try:
@@ -84,68 +104,89 @@ class CTExchangeArb(QWidget):
             pass
         start_time = time.time()
         if load_markets:
-            self._arbitrage_possibilities = self._CTMain._Crypto_Trader.get_arbitrage_possibilities(
+            self._arbitrage_possibilities = self._CTMain._Crypto_Trader.get_exchange_arbitrage(
                 required_rate_of_return
             )
-        results = self._arbitrage_possibilities
-        rows_to_report = []
-
-        count_rows = 0
-        for code_base in results:
-            for code_curr in results[code_base]:
-                for exchangeBid in results[code_base][code_curr]:
-                    for exchangeAsk in results[code_base][code_curr]:
-                        if results[code_base][code_curr][exchangeAsk]['BestAsk'] > 0 and results[code_base][code_curr][exchangeBid]['BestBid'] > results[code_base][code_curr][exchangeAsk]['BestAsk'] * required_rate_of_return:
-                            count_rows += 1
-                            rows_to_report.append({
-                                'code_base': code_base,
-                                'code_curr': code_curr,
-                                'exchangeAsk': exchangeAsk,
-                                'marketAsk': results[code_base][code_curr][exchangeAsk]['MarketSymbol'],
-                                'exchangeAskBid': results[code_base][code_curr][exchangeAsk]['BestBid'],
-                                'exchangeAskAsk': results[code_base][code_curr][exchangeAsk]['BestAsk'],
-                                'exchangeBid': exchangeBid,
-                                'marketBid': results[code_base][code_curr][exchangeBid]['MarketSymbol'],
-                                'exchangeBidBid': results[code_base][code_curr][exchangeBid]['BestBid'],
-                                'exchangeBidAsk': results[code_base][code_curr][exchangeBid]['BestAsk'],
-                                'return': 100.0 * (results[code_base][code_curr][exchangeBid]['BestBid'] / results[code_base][code_curr][exchangeAsk]['BestAsk'] - 1)
-                            })
+        self._required_rate_of_return = required_rate_of_return
+        if self._size_by_depth.isChecked():
+            self.size_rows()
+        self.show_arbs()
+        self._CTMain.log(' Check for arbitrage possibilities took {:.4f} seconds '.format(time.time() - start_time))
 
+    def size_rows(self):
+        """
+            Sizes the best rows by order book depth on a worker thread, sizing
+            can request order books over REST. Rows are shown with the sizes
+            of the last finished run meanwhile.
+        """
+        if self._sizing:
+            self._size_again = True
+            return
+        minimum_return = 100.0 * (self._required_rate_of_return - 1)
+        rows_to_size = sorted(
+            [row for row in self._arbitrage_possibilities if row['return'] > minimum_return],
+            key=lambda kv: kv['return'],
+            reverse=True
+        )[:self._max_sized_rows]
+        if not rows_to_size:
+            return
+        self._sizing = True
+        self._thread_pool.start(CTWorker(self.size_rows_thread, rows_to_size, self._required_rate_of_return))
+
+    def size_rows_thread(self, rows, required_rate_of_return):
+        sized_rows = {}
+        try:
+            for row in rows:
+                executable = self._CTMain._Crypto_Trader.get_executable_arbitrage(row, required_rate_of_return)
+                sized_rows[self.get_row_key(row)] = (executable['Volume'], executable['NetReturn'])
+        except Exception as e:
+            print('Error sizing arbitrage by order book depth: {}'.format(e))
+        self._rows_sized.emit(sized_rows)
+
+    def on_rows_sized(self, sized_rows):
+        self._sizing = False
+        self._sized_rows = sized_rows
+        self.show_arbs()
+        if self._size_again and self._size_by_depth.isChecked():
+            self._size_again = False
+            self.size_rows()
+
+    @staticmethod
+    def get_row_key(row):
+        return row['code_base'], row['code_curr'], row['exchangeAsk'], row['exchangeBid']
+
+    def show_arbs(self):
+        minimum_return = 100.0 * (self._required_rate_of_return - 1)
+        rows = self._arbitrage_possibilities
+        if self._size_by_depth.isChecked():
+            sized_rows = []
+            for row in rows:
+                sized = self._sized_rows.get(self.get_row_key(row), None)
+                sized_rows.append(row if sized is None else dict(row, Volume=sized[0], NetReturn=sized[1]))
+            rows = sized_rows
+
+        self._tableModel.set_rows(rows)
+        self._proxyModel.set_filter(lambda row: row['return'] > minimum_return)
         if self._sort_by_return.isChecked():
-            sorted_rows_to_report = sorted(rows_to_report, key=lambda kv: kv['return'], reverse=True)
+            self._proxyModel.sort(8, Qt.DescendingOrder)
         else:
-            sorted_rows_to_report = rows_to_report
-
-        self._tableWidget.setHorizontalHeaderLabels([
-            'Base',
-            'Currency',
-            'Exchange1',
-            'Exchange1 Bid',
-            'Exchange1 Ask',
-            'Exchange2',
-            'Exchange2 Bid',
-            'Exchange2 Ask',
-            'Return',
-            'View Order Books'
-            ])
-        self._tableWidget.setRowCount(count_rows)
-
-        row_index = 0
-        for row in sorted_rows_to_report:
-            self._tableWidget.setItem(row_index, 0, QTableWidgetItem(row['code_base']))
-            self._tableWidget.setItem(row_index, 1, QTableWidgetItem(row['code_curr']))
-            self._tableWidget.setItem(row_index, 2, QTableWidgetItem(row['exchangeAsk']))
-            self._tableWidget.setItem(row_index, 3, QTableWidgetItem('{:.8f}'.format(row['exchangeAskBid'])))
-            ask_item = QTableWidgetItem('{:.8f}'.format(row['exchangeAskAsk']))
-            ask_item.setBackground(CTColors.GREEN_LIGHT)
-            self._tableWidget.setItem(row_index, 4, ask_item)
-            self._tableWidget.setItem(row_index, 5, QTableWidgetItem(row['exchangeBid']))
-            bid_item = QTableWidgetItem('{:.8f}'.format(row['exchangeBidBid']))
-            bid_item.setBackground(CTColors.RED_LIGHT)
-            self._tableWidget.setItem(row_index, 6, bid_item)
-            self._tableWidget.setItem(row_index, 7, QTableWidgetItem('{:.8f}'.format(row['exchangeBidAsk'])))
-            self._tableWidget.setItem(row_index, 8, QTableWidgetItem('{:.2f}%'.format(row['return'])))
-            self._tableWidget.setCellWidget(row_index, 9, CTSelectArbButton(self, row))
-
-            row_index += 1
-        self._CTMain.log(' Check for arbitrage possibilities took {:.4f} seconds '.format(time.time() - start_time))
+            self._proxyModel.sort(-1)
+
+    def select_arb(self, index):
+        if index.column() != self._tableModel.columnCount() - 1:
+            return
+        row = self._proxyModel.get_row(index)
+        trader = self._CTMain._Crypto_Trader.trader
+        self._selected_order_books = CTTwoOrderBooks(
+            CTMain=self._CTMain,
+            exchange1=row['exchangeAsk'],
+            market_symbol_1=row['marketAsk'],
+            base_curr1=trader[row['exchangeAsk']].get_local_code(row['code_base']),
+            curr_curr1=trader[row['exchangeAsk']].get_local_code(row['code_curr']),
+            exchange2=row['exchangeBid'],
+            market_symbol_2=row['marketBid'],
+            base_curr2=trader[row['exchangeBid']].get_local_code(row['code_base']),
+            curr_curr2=trader[row['exchangeBid']].get_local_code(row['code_curr']),
+            depth=5
+        )
+        self._selected_order_books.setGeometry(150, 150, 1600, 800)
@@ -1,17 +1,42 @@
 import time
 
-from PyQt5.QtCore import QTimer
-from PyQt5.QtWidgets import (QWidget, QGridLayout, QTableWidget, QTableWidgetItem, QLineEdit, QLabel, QCheckBox,
-                             QHBoxLayout)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from PyQt5.QtWidgets import (QWidget, QGridLayout, QTableView, QLineEdit, QLabel, QCheckBox, QHBoxLayout)
+
+from Views.TableModel import CTTableColumn, CTTableModel, CTTableProxyModel
+
+
+def get_leg_price(row, leg):
+    if row['action' + leg] == 'buy':
+        return row['market' + leg].get('BestAsk', None)
+    return row['market' + leg].get('BestBid', None)
 
 
 class CTExchangeArbCircle(QWidget):
+    _arbitrage_changed = pyqtSignal()
+
     def __init__(self, CTMain=None):
         super().__init__()
         self._CTMain = CTMain
 
-        self._tableWidget = QTableWidget()
-        self._tableWidget.setColumnCount(11)
+        columns = [CTTableColumn('Exchange', 'exchange')]
+        for leg in ('1', '2', '3'):
+            columns += [
+                CTTableColumn('Market' + leg, lambda row, leg=leg: row['market' + leg]['MarketSymbol']),
+                CTTableColumn('Action' + leg, 'action' + leg),
+                CTTableColumn('Price' + leg, lambda row, leg=leg: get_leg_price(row, leg), '{:.8f}'),
+            ]
+        columns.append(CTTableColumn('Return', 'return', '{:.2f}%'))
+        self._tableModel = CTTableModel(columns, lambda row: (
+            row['exchange'],
+            row['market1']['MarketSymbol'], row['action1'],
+            row['market2']['MarketSymbol'], row['action2'],
+            row['market3']['MarketSymbol'], row['action3']
+        ), self)
+        self._proxyModel = CTTableProxyModel(self)
+        self._proxyModel.setSourceModel(self._tableModel)
+        self._tableView = QTableView()
+        self._tableView.setModel(self._proxyModel)
         self._layout = QGridLayout()
 
         self._required_rate_of_return_inputbox = QLineEdit('0.2', self)
@@ -30,19 +55,35 @@ class CTExchangeArbCircle(QWidget):
         top_layout.addStretch(1)
 
         self._layout.addLayout(top_layout, 0, 0, 1, 10)
-        self._layout.addWidget(self._tableWidget, 1, 0, 10, 10)
+        self._layout.addWidget(self._tableView, 1, 0, 10, 10)
 
         self.setLayout(self._layout)
 
-        self._arbitrage_possibilities = {}
+        self._arbitrage_possibilities = []
         self.check_arbs()
 
         self._timer = QTimer(self)
-        self._timer.start(5000)
+        arbitrage_index = self._CTMain._Crypto_Trader._arbitrage_index
+        if arbitrage_index is None:
+            self._timer.start(5000)
+        else:
+            self._timer.setSingleShot(True)
+            self._timer.setInterval(250)
+            self._arbitrage_changed.connect(self.schedule_check_arbs)
+            listener = self._arbitrage_changed.emit
+            arbitrage_index.add_listener(listener)
+            self.destroyed.connect(lambda: arbitrage_index.remove_listener(listener))
         self._timer.timeout.connect(self.check_arbs)
 
         self.show()
 
+    def schedule_check_arbs(self):
+        """
+            Refreshes at most every 250ms while the arbitrage index keeps changing
+        """
+        if not self._timer.isActive():
+            self._timer.start()
+
     def check_arbs(self, load_markets=True):
         required_rate_of_return = 1.0
         try:
@@ -54,52 +95,11 @@ class CTExchangeArbCircle(QWidget):
             self._arbitrage_possibilities = self._CTMain._Crypto_Trader.get_arbitrage_possibilities_circle(
                 required_rate_of_return
             )
-        results = self._arbitrage_possibilities
-
+        minimum_return = 100.0 * (required_rate_of_return - 1)
+        self._tableModel.set_rows(self._arbitrage_possibilities)
+        self._proxyModel.set_filter(lambda row: row['return'] > minimum_return)
         if self._sort_by_return.isChecked():
-            sorted_rows_to_report = sorted(results, key=lambda kv: kv['return'], reverse=True)
+            self._proxyModel.sort(10, Qt.DescendingOrder)
         else:
-            sorted_rows_to_report = results
-
-        self._tableWidget.setHorizontalHeaderLabels([
-            'Exchange',
-            'Market1',
-            'Action1',
-            'Price1',
-            'Market2',
-            'Action2',
-            'Price2',
-            'Market3',
-            'Action3',
-            'Price3',
-            'Return'
-            ])
-        self._tableWidget.setRowCount(len(results))
-
-        row_index = 0
-        for row in sorted_rows_to_report:
-            self._tableWidget.setItem(row_index, 0, QTableWidgetItem(row['exchange']))
-            self._tableWidget.setItem(row_index, 1, QTableWidgetItem(row['market1']['MarketSymbol']))
-            self._tableWidget.setItem(row_index, 2, QTableWidgetItem(row['action1']))
-            if row['action1'] == 'buy':
-                price = row['market1']['BestAsk']
-            else:
-                price = row['market1']['BestBid']
-            self._tableWidget.setItem(row_index, 3, QTableWidgetItem('{:.8f}'.format(price)))
-            self._tableWidget.setItem(row_index, 4, QTableWidgetItem(row['market2']['MarketSymbol']))
-            self._tableWidget.setItem(row_index, 5, QTableWidgetItem(row['action2']))
-            if row['action2'] == 'buy':
-                price = row['market2']['BestAsk']
-            else:
-                price = row['market2']['BestBid']
-            self._tableWidget.setItem(row_index, 6, QTableWidgetItem('{:.8f}'.format(price)))
-            self._tableWidget.setItem(row_index, 7, QTableWidgetItem(row['market3']['MarketSymbol']))
-            self._tableWidget.setItem(row_index, 8, QTableWidgetItem(row['action3']))
-            if row['action3'] == 'buy':
-                price = row['market3']['BestAsk']
-            else:
-                price = row['market3']['BestBid']
-            self._tableWidget.setItem(row_index, 9, QTableWidgetItem('{:.8f}'.format(price)))
-            self._tableWidget.setItem(row_index, 10, QTableWidgetItem('{:.2f}%'.format(row['return'])))
-            row_index += 1
+            self._proxyModel.sort(-1)
         self._CTMain.log(' Check for arbitrage possibilities took {:.4f} seconds '.format(time.time() - start_time))
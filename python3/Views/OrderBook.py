@@ -29,9 +29,14 @@ class CTOrderBook(QWidget):
 
         self._re_load_seconds = 1
         self._re_draw_seconds = 0.3
-        self._thread_pool = QThreadPool()
-        order_book_reloader = CTWorker(self.load_order_book_thread)
-        self._thread_pool.start(order_book_reloader)
+        market_data_loop = self._CTMain._Crypto_Trader._market_data_loop
+        if market_data_loop is None:
+            self._thread_pool = QThreadPool()
+            order_book_reloader = CTWorker(self.load_order_book_thread)
+            self._thread_pool.start(order_book_reloader)
+        else:
+            order_book_reloader = market_data_loop.add_poller(self.load_order_book, self._re_load_seconds)
+            self.destroyed.connect(order_book_reloader.cancel)
 
         self._timer_painter = QTimer(self)
         self._timer_painter.start(self._re_draw_seconds * 1000)
@@ -39,14 +44,17 @@ class CTOrderBook(QWidget):
 
     def load_order_book_thread(self):
         while True:
-            if self._exchange in self._CTMain._Crypto_Trader.trader:
-                if not self._CTMain._Crypto_Trader.trader[self._exchange].has_implementation('ws_order_book'):
-                    self._order_book = self._CTMain._Crypto_Trader.trader[self._exchange].get_consolidated_order_book(
-                        self._market_symbol,
-                        self._depth
-                    )
+            self.load_order_book()
             time.sleep(self._re_load_seconds)
 
+    def load_order_book(self):
+        if self._exchange in self._CTMain._Crypto_Trader.trader:
+            if not self._CTMain._Crypto_Trader.trader[self._exchange].has_implementation('ws_order_book'):
+                self._order_book = self._CTMain._Crypto_Trader.trader[self._exchange].get_consolidated_order_book(
+                    self._market_symbol,
+                    self._depth
+                )
+
     def refresh_order_book(self, exchange=None, market_symbol=None, base_curr=None, curr_curr=None, depth=None):
         try:
             if exchange is not None:
@@ -70,29 +78,13 @@ class CTOrderBook(QWidget):
                 self._base_curr + ' sum'
             ])
             if self._CTMain._Crypto_Trader.trader[self._exchange].has_implementation('ws_order_book'):
-                full_book = self._CTMain._Crypto_Trader.trader[self._exchange]._order_book.get(self._market_symbol, {})
-                results = {
-                    'Bid': {},
-                    'Ask': {}
-                }
-                if 'Bids' in full_book:
-                    bids = [{'Price': k, 'Quantity': full_book['Bids'][k]} for k in
-                            sorted(full_book['Bids'].keys(), reverse=True)[:5]]
-                    for i in range(len(bids)):
-                        results['Bid'][i] = {
-                            'Price': bids[i]['Price'],
-                            'Quantity': bids[i]['Quantity']
-                        }
-                else:
+                results = self._CTMain._Crypto_Trader.trader[self._exchange].get_ws_order_book(
+                    self._market_symbol,
+                    self._depth
+                )
+                if results is None:
+                    results = {}
                     self._CTMain._Crypto_Trader.trader[self._exchange].ws_subscribe(self._market_symbol)
-                if 'Asks' in full_book:
-                    asks = [{'Price': k, 'Quantity': full_book['Asks'][k]} for k in
-                            sorted(full_book['Asks'].keys())[:5]]
-                    for i in range(len(asks)):
-                        results['Ask'][i] = {
-                            'Price': asks[i]['Price'],
-                            'Quantity': asks[i]['Quantity']
-                        }
             else:
                 results = self._order_book
 
@@ -30,11 +30,11 @@ class CTOrderBookWithSelectors(QWidget):
         self._dropdown_exchange = Dropdown(exchanges, self._exchange)
         self._dropdown_exchange.activated[str].connect(self.dropdown_exchange_changed)
 
-        base_codes = self._CTMain._Crypto_Trader.trader[self._exchange]._active_markets.keys()
+        base_codes = self._CTMain._Crypto_Trader.trader[self._exchange].get_active_markets_snapshot().keys()
         self._dropdown_base_curr = Dropdown(base_codes, self._base_curr)
         self._dropdown_base_curr.activated[str].connect(self.dropdown_base_changed)
 
-        curr_codes = self._CTMain._Crypto_Trader.trader[self._exchange]._active_markets[self._base_curr].keys()
+        curr_codes = self._CTMain._Crypto_Trader.trader[self._exchange].get_active_markets_snapshot()[self._base_curr].keys()
         self._dropdown_curr_curr = Dropdown(curr_codes, self._curr_curr)
         self._dropdown_curr_curr.activated[str].connect(self.dropdown_curr_changed)
 
@@ -60,7 +60,7 @@ class CTOrderBookWithSelectors(QWidget):
 
     def dropdown_exchange_changed(self, exchange):
         self._exchange = exchange
-        base_codes = sorted(self._CTMain._Crypto_Trader.trader[self._exchange]._active_markets)
+        base_codes = sorted(self._CTMain._Crypto_Trader.trader[self._exchange].get_active_markets_snapshot())
         self._dropdown_base_curr.clear()
         self._dropdown_base_curr.addItems(base_codes)
         if self._base_curr not in base_codes:
@@ -70,7 +70,7 @@ class CTOrderBookWithSelectors(QWidget):
 
     def dropdown_base_changed(self, base_curr):
         self._base_curr = base_curr
-        curr_codes = sorted(self._CTMain._Crypto_Trader.trader[self._exchange]._active_markets[self._base_curr])
+        curr_codes = sorted(self._CTMain._Crypto_Trader.trader[self._exchange].get_active_markets_snapshot()[self._base_curr])
         self._dropdown_curr_curr.clear()
         self._dropdown_curr_curr.addItems(curr_codes)
         if self._curr_curr not in curr_codes:
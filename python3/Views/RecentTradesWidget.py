@@ -26,8 +26,13 @@ class CTRecentTradesWidget(QWidget):
         self._timer_painter.timeout.connect(self.re_draw)
 
         # generic thread using signal
-        trade_reloader = CTWorker(self.re_load_recent_trades_thread)
-        self._thread_pool.start(trade_reloader)
+        market_data_loop = self._CTMain._Crypto_Trader._market_data_loop
+        if market_data_loop is None:
+            trade_reloader = CTWorker(self.re_load_recent_trades_thread)
+            self._thread_pool.start(trade_reloader)
+        else:
+            trade_reloader = market_data_loop.add_poller(self.re_load_recent_trades, self._re_load_seconds)
+            self.destroyed.connect(trade_reloader.cancel)
 
     def update_market(self, exchange, code_base, code_curr, market_symbol):
         self._exchange = exchange
@@ -37,12 +42,15 @@ class CTRecentTradesWidget(QWidget):
 
     def re_load_recent_trades_thread(self):
         while True:
-            if self._exchange in self._CTMain._Crypto_Trader.trader:
-                self._CTMain._Crypto_Trader.trader[self._exchange].update_recent_market_trades_per_market(
-                    self._market_symbol
-                )
+            self.re_load_recent_trades()
             time.sleep(self._re_load_seconds)
 
+    def re_load_recent_trades(self):
+        if self._exchange in self._CTMain._Crypto_Trader.trader:
+            self._CTMain._Crypto_Trader.trader[self._exchange].update_recent_market_trades_per_market(
+                self._market_symbol
+            )
+
     def re_draw(self):
         if self._exchange in self._CTMain._Crypto_Trader.trader:
             self._recent_trades = self._CTMain._Crypto_Trader.trader[self._exchange]._recent_market_trades.get(
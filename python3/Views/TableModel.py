@@ -0,0 +1,173 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+
+
+class CTTableColumn:
+    """
+        Column of a CTTableModel.
+
+        :param title: Header text
+        :param key: Key of the row dictionary or function(row) returning the raw value
+        :param fmt: Format string or function(value) producing the displayed text, applied only when painted
+        :param foreground: Optional function(value, row) returning QColor of the text
+        :param background: Optional function(value, row) returning QColor of the cell
+    """
+    def __init__(self, title, key, fmt='{}', foreground=None, background=None):
+        self._title = title
+        self._key = key
+        self._fmt = fmt
+        self._foreground = foreground
+        self._background = background
+
+    def get_value(self, row):
+        if callable(self._key):
+            return self._key(row)
+        return row.get(self._key, None)
+
+    def format(self, value):
+        if value is None:
+            return ''
+        if callable(self._fmt):
+            return self._fmt(value)
+        return self._fmt.format(value)
+
+
+class CTTableModel(QAbstractTableModel):
+    """
+        Table model fed with lists of row dictionaries.
+
+        set_rows() matches rows to the previous refresh by row_key, inserts
+        and removes only rows which appeared or disappeared and emits
+        dataChanged only for cells whose raw value changed, so views repaint
+        changed cells instead of the whole table. Rows keep the order in which
+        they first appeared, use CTTableProxyModel for sorting and filtering.
+
+        :param columns: List of CTTableColumn
+        :param row_key: Function(row) returning a key identifying the row between refreshes
+    """
+    def __init__(self, columns, row_key, parent=None):
+        super().__init__(parent)
+        self._columns = list(columns)
+        self._row_key = row_key
+        self._keys = []
+        self._rows = []
+        self._values = []
+        self._row_index = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal and section < len(self._columns):
+            return self._columns[section]._title
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = self._columns[index.column()]
+        value = self._values[index.row()][index.column()]
+        if role == Qt.DisplayRole:
+            return column.format(value)
+        if role == Qt.ForegroundRole and column._foreground is not None and value is not None:
+            return column._foreground(value, self._rows[index.row()])
+        if role == Qt.BackgroundRole and column._background is not None and value is not None:
+            return column._background(value, self._rows[index.row()])
+        return None
+
+    def get_row(self, row_index):
+        return self._rows[row_index]
+
+    def get_value(self, row_index, column_index):
+        return self._values[row_index][column_index]
+
+    def get_row_values(self, row):
+        return tuple(column.get_value(row) for column in self._columns)
+
+    def set_columns(self, columns):
+        """
+            Replaces columns, e.g. when exchanges were added, and resets the model
+        """
+        self.beginResetModel()
+        self._columns = list(columns)
+        self._values = [self.get_row_values(row) for row in self._rows]
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        new_rows = {}
+        for row in rows:
+            new_rows[self._row_key(row)] = row
+
+        last = None
+        for row_index in reversed(range(-1, len(self._keys))):
+            if row_index >= 0 and self._keys[row_index] not in new_rows:
+                if last is None:
+                    last = row_index
+            elif last is not None:
+                self.beginRemoveRows(QModelIndex(), row_index + 1, last)
+                del self._keys[row_index + 1:last + 1]
+                del self._rows[row_index + 1:last + 1]
+                del self._values[row_index + 1:last + 1]
+                self.endRemoveRows()
+                last = None
+        self._row_index = {key: row_index for row_index, key in enumerate(self._keys)}
+
+        for row_index, key in enumerate(self._keys):
+            row = new_rows[key]
+            values = self.get_row_values(row)
+            previous = self._values[row_index]
+            self._rows[row_index] = row
+            if values != previous:
+                self._values[row_index] = values
+                changed = [column for column in range(len(values)) if values[column] != previous[column]]
+                self.dataChanged.emit(self.index(row_index, changed[0]), self.index(row_index, changed[-1]))
+
+        added = [key for key in new_rows if key not in self._row_index]
+        if added:
+            first = len(self._keys)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for key in added:
+                self._row_index[key] = len(self._keys)
+                self._keys.append(key)
+                self._rows.append(new_rows[key])
+                self._values.append(self.get_row_values(new_rows[key]))
+            self.endInsertRows()
+
+
+class CTTableProxyModel(QSortFilterProxyModel):
+    """
+        Sorts by raw values of CTTableModel instead of displayed text and
+        filters with a function(row) of the row dictionary
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._filter = None
+        self.setDynamicSortFilter(True)
+
+    def set_filter(self, row_filter):
+        self._filter = row_filter
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self._filter is None:
+            return True
+        return self._filter(self.sourceModel().get_row(source_row))
+
+    def lessThan(self, left, right):
+        left_value = self.sourceModel().get_value(left.row(), left.column())
+        right_value = self.sourceModel().get_value(right.row(), right.column())
+        if left_value is None or right_value is None:
+            return left_value is None and right_value is not None
+        try:
+            return left_value < right_value
+        except TypeError:
+            return str(left_value) < str(right_value)
+
+    def get_row(self, proxy_index):
+        return self.sourceModel().get_row(self.mapToSource(proxy_index).row())
@@ -1,9 +1,14 @@
-from operator import itemgetter
-
-from PyQt5.QtCore import QTimer
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem)
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QTableView)
 
 import CTColors
+from Views.TableModel import CTTableColumn, CTTableModel, CTTableProxyModel
+
+
+def get_move_color(value, row):
+    if value > 0:
+        return CTColors.GREEN_BOLD
+    return CTColors.RED_BOLD
 
 
 class CTTwentyFourHours(QWidget):
@@ -12,9 +17,15 @@ class CTTwentyFourHours(QWidget):
 
         self._CTMain = CTMain
 
-        self._tableWidget = QTableWidget()
+        self._exchanges = None
+        self._tableModel = CTTableModel([], lambda row: (row['BaseCode'], row['CurrencyCode']), self)
+        self._proxyModel = CTTableProxyModel(self)
+        self._proxyModel.setSourceModel(self._tableModel)
+        self._tableView = QTableView()
+        self._tableView.setModel(self._proxyModel)
+        self._tableView.verticalHeader().hide()
         self._layout = QVBoxLayout()
-        self._layout.addWidget(self._tableWidget)
+        self._layout.addWidget(self._tableView)
         self.show_moves()
         self.setLayout(self._layout)
 
@@ -24,7 +35,13 @@ class CTTwentyFourHours(QWidget):
 
     def show_moves(self):
         exchanges = sorted(self._CTMain._Crypto_Trader._map_exchange_code_to_currency_code.keys())
-        column_names = ['BaseCode', 'CurrencyCode'] + exchanges + ['Average 24-Hour Move']
+        if exchanges != self._exchanges:
+            self._exchanges = exchanges
+            self._tableModel.set_columns(
+                [CTTableColumn('BaseCode', 'BaseCode'), CTTableColumn('CurrencyCode', 'CurrencyCode')] +
+                [CTTableColumn(exchange, exchange, '{:.2f}%', foreground=get_move_color) for exchange in exchanges] +
+                [CTTableColumn('Average 24-Hour Move', 'Avg_24HrPercentMove', '{:.2f}%', foreground=get_move_color)]
+            )
         markets = self._CTMain._Crypto_Trader.load_24hour_moves()
 
         moves = []
@@ -45,36 +62,5 @@ class CTTwentyFourHours(QWidget):
                     entry['Avg_24HrPercentMove'] = total_move / exchange_counter
                     moves.append(entry)
 
-        ordered_market_moves = sorted(moves, key=itemgetter('Avg_24HrPercentMove'), reverse=True)
-        n_columns = len(column_names)
-
-        self._tableWidget.setRowCount(len(ordered_market_moves))
-        self._tableWidget.setColumnCount(n_columns)
-        self._tableWidget.verticalHeader().hide()
-        self._tableWidget.setHorizontalHeaderLabels(column_names)
-
-        cell_index = 0
-        for move in ordered_market_moves:
-            self._tableWidget.setItem(cell_index, 0, QTableWidgetItem(move['BaseCode']))
-            self._tableWidget.setItem(cell_index, 1, QTableWidgetItem(move['CurrencyCode']))
-            for exchange_i in range(len(exchanges)):
-                if exchanges[exchange_i] in move:
-                    self._tableWidget.setItem(
-                        cell_index,
-                        exchange_i + 2,
-                        QTableWidgetItem('{:.2f}%'.format(move[exchanges[exchange_i]]))
-                    )
-                    if move[exchanges[exchange_i]] > 0:
-                        self._tableWidget.item(cell_index, exchange_i + 2).setForeground(CTColors.GREEN_BOLD)
-                    else:
-                        self._tableWidget.item(cell_index, exchange_i + 2).setForeground(CTColors.RED_BOLD)
-            self._tableWidget.setItem(
-                cell_index,
-                n_columns - 1,
-                QTableWidgetItem('{:.2f}%'.format(move['Avg_24HrPercentMove']))
-            )
-            if move['Avg_24HrPercentMove'] > 0:
-                self._tableWidget.item(cell_index, n_columns - 1).setForeground(CTColors.GREEN_BOLD)
-            else:
-                self._tableWidget.item(cell_index, n_columns - 1).setForeground(CTColors.RED_BOLD)
-            cell_index += 1
+        self._tableModel.set_rows(moves)
+        self._proxyModel.sort(self._tableModel.columnCount() - 1, Qt.DescendingOrder)
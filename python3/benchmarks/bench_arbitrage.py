@@ -0,0 +1,18 @@
+"""
+    Arbitrage scans over 4 exchanges with 2000 markets each
+"""
+from fixtures import get_crypto_trader
+
+
+class ArbitrageScans:
+    def setup(self):
+        self._crypto_trader = get_crypto_trader()
+
+    def time_get_arbitrage_possibilities(self):
+        self._crypto_trader.get_arbitrage_possibilities(1.0)
+
+    def time_get_exchange_arbitrage(self):
+        self._crypto_trader.get_exchange_arbitrage(1.0)
+
+    def time_get_arbitrage_possibilities_circle(self):
+        self._crypto_trader.get_arbitrage_possibilities_circle(1.0)
@@ -0,0 +1,15 @@
+"""
+    Valuation of balances in every currency of 4 exchanges in BTC
+"""
+from fixtures import get_crypto_trader
+
+
+class CalculateBalancesBtc:
+    """
+        Balance requests return canned responses, so only parsing and valuation are measured
+    """
+    def setup(self):
+        self._crypto_trader = get_crypto_trader()
+
+    def time_calculate_balances_btc(self):
+        self._crypto_trader.calculate_balances_btc()
@@ -0,0 +1,23 @@
+"""
+    Candle handling of Exchange.load_chart_data over 100k candles
+"""
+from fixtures import CANDLES, get_candles, make_exchange
+
+
+class LoadChartData:
+    """
+        get_consolidated_klines returns 100k 5 minute candles instead of requesting them
+    """
+    def setup(self):
+        candles = get_candles(5)
+        self._exchange = make_exchange('Binance')
+        self._exchange.get_consolidated_klines = lambda market_symbol, interval, lookback: candles
+
+    def time_aggregate_to_10_minutes(self):
+        self._exchange.load_chart_data('ETHBTC', 10, CANDLES * 5)
+
+    def time_aggregate_to_2_days(self):
+        self._exchange.load_chart_data('ETHBTC', 24 * 60 * 2, CANDLES * 5)
+
+    def time_select_lookback(self):
+        self._exchange.load_chart_data('ETHBTC', 5, CANDLES * 5 // 2)
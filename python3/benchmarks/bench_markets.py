@@ -0,0 +1,63 @@
+"""
+    Market updates as they arrive from exchanges and the aggregation of
+    active markets across exchanges read by the views
+"""
+import json
+import random
+
+from fixtures import EXCHANGES, get_crypto_trader, get_exchange_quotes, make_exchange
+
+
+class UpdateMarket:
+    """
+        Quotes of all 2000 markets of one exchange updated once per call
+    """
+    def setup(self):
+        self._exchange = make_exchange('Binance')
+        rng = random.Random(1)
+        self._updates = [
+            (market_symbol, {'BestBid': bid * (1 + rng.gauss(0, 0.001)), 'BestAsk': ask, 'BaseVolume': 10.0})
+            for market_symbol, (_, _, bid, ask, _, _) in get_exchange_quotes('Binance').items()
+        ]
+        self._quotes = [
+            (market_symbol, bid * (1 + rng.gauss(0, 0.001)), ask, bid_size, ask_size)
+            for market_symbol, (_, _, bid, ask, bid_size, ask_size) in get_exchange_quotes('Binance').items()
+        ]
+        self._ticker_frame = json.dumps({'stream': '!ticker@arr', 'data': [
+            {'s': market_symbol, 'b': str(bid), 'a': str(ask), 'B': str(bid_size), 'A': str(ask_size), 'q': '10',
+             'v': '1000', 'h': str(ask), 'l': str(bid), 'P': '1.5', 'c': str(bid), 'C': 1546300800000}
+            for market_symbol, (_, _, bid, ask, bid_size, ask_size) in get_exchange_quotes('Binance').items()
+        ]})
+
+    def time_update_market(self):
+        update_market = self._exchange.update_market
+        for market_symbol, update_dict in self._updates:
+            update_market(market_symbol, update_dict)
+
+    def time_update_market_quote(self):
+        update_market_quote = self._exchange.update_market_quote
+        for market_symbol, bid, ask, bid_size, ask_size in self._quotes:
+            update_market_quote(market_symbol, bid, ask, bid_size, ask_size)
+
+    def time_binance_ticker_frame(self):
+        self._exchange.ws_receive(self._ticker_frame)
+
+
+class RefreshAggActiveMarkets:
+    """
+        Aggregation of active markets of 4 exchanges with 2000 markets each
+    """
+    def setup(self):
+        self._crypto_trader = get_crypto_trader()
+        self._touched = [
+            (self._crypto_trader.trader[exchange], next(iter(get_exchange_quotes(exchange).items())))
+            for exchange in EXCHANGES
+        ]
+
+    def time_refresh_unchanged(self):
+        self._crypto_trader.refresh_agg_active_markets()
+
+    def time_refresh_after_update(self):
+        for exchange, (market_symbol, (_, _, bid, ask, _, _)) in self._touched:
+            exchange.update_market_quote(market_symbol, bid, ask)
+        self._crypto_trader.refresh_agg_active_markets()
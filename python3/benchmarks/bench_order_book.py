@@ -0,0 +1,40 @@
+"""
+    Maintenance of a deep Poloniex websocket order book from sequenced deltas
+"""
+import json
+
+from fixtures import get_poloniex_book_frames, make_poloniex_book
+
+_SEQUENCE_ID = 1000000
+_FRAMES = 1000
+
+
+class PoloniexBookDeltas:
+    """
+        1000 delta frames with 5 level updates each applied to a book with
+        1000 levels per side. Every call rewinds the book sequence first so
+        the same frames apply again.
+    """
+    def setup(self):
+        self._exchange, self._market_symbol = make_poloniex_book(1, _SEQUENCE_ID)
+        self._book = self._exchange._order_book[self._market_symbol]
+        self._frames = get_poloniex_book_frames(1, _SEQUENCE_ID, _FRAMES)
+        self._deltas = []
+        for frame in self._frames:
+            market_id, sequence_id, payload = json.loads(frame)
+            self._deltas.append((sequence_id, [
+                ('Bid' if side == 1 else 'Ask', float(price), float(quantity)) for _, side, price, quantity in payload
+            ]))
+
+    def time_ws_on_message(self):
+        self._book._sequence_id = _SEQUENCE_ID
+        ws_on_message = self._exchange.ws_on_message
+        for frame in self._frames:
+            ws_on_message(frame)
+
+    def time_ws_on_order_book_delta(self):
+        self._book._sequence_id = _SEQUENCE_ID
+        ws_on_order_book_delta = self._exchange.ws_on_order_book_delta
+        market_symbol = self._market_symbol
+        for sequence_id, updates in self._deltas:
+            ws_on_order_book_delta(market_symbol, sequence_id, sequence_id, updates)
@@ -0,0 +1,208 @@
+"""
+    Synthetic market data sized like production, built once per process and
+    shared by all benchmarks: 4 exchanges with 2000 markets each, 1000 price
+    levels per side of order books and 100k candles. Everything is seeded,
+    so every run benchmarks the same data.
+"""
+import functools
+import itertools
+import json
+import random
+
+from pydoc import locate
+
+from CryptoTrader import CryptoTrader
+
+EXCHANGES = ('Binance', 'Bittrex', 'Kucoin', 'Poloniex')
+BASES = ('BTC', 'ETH', 'USDT')
+MARKETS_PER_EXCHANGE = 2000
+BOOK_LEVELS = 1000
+CANDLES = 100000
+SEED = 20190101
+
+_SYMBOL_FORMATS = {
+    'Binance':  '{curr}{base}',
+    'Bittrex':  '{base}-{curr}',
+    'Kucoin':   '{curr}-{base}',
+    'Poloniex': '{base}_{curr}',
+}
+
+
+def get_symbol(exchange, code_base, code_curr):
+    return _SYMBOL_FORMATS[exchange].format(base=code_base, curr=code_curr)
+
+
+@functools.lru_cache(maxsize=None)
+def get_pairs():
+    """
+        Universe of (code_base, code_curr) pairs with their mid prices, exchanges list overlapping subsets of it
+    """
+    rng = random.Random(SEED)
+    currencies = (''.join(letters) for letters in itertools.product('ABCDEFGHIJKLMNOPQRSTUVWXYZ', repeat=3))
+    prices = {('USDT', 'BTC'): 5000.0, ('USDT', 'ETH'): 150.0, ('BTC', 'ETH'): 0.03}
+    while len(prices) < MARKETS_PER_EXCHANGE * 1.3:
+        code_curr = next(currencies)
+        if code_curr in BASES:
+            continue
+        btc_price = 10 ** rng.uniform(-7, -1)
+        prices[('BTC', code_curr)] = btc_price
+        prices[('ETH', code_curr)] = btc_price / 0.03
+        prices[('USDT', code_curr)] = btc_price * 5000.0
+    return prices
+
+
+@functools.lru_cache(maxsize=None)
+def get_exchange_quotes(exchange):
+    """
+        Returns {market symbol: (code_base, code_curr, bid, ask, bid size, ask size)} of MARKETS_PER_EXCHANGE markets,
+        prices differ slightly between exchanges so arbitrage scans find opportunities
+    """
+    rng = random.Random('{}/{}'.format(SEED, exchange))
+    prices = get_pairs()
+    pairs = list(prices)[:3] + rng.sample(list(prices)[3:], MARKETS_PER_EXCHANGE - 3)
+    quotes = {}
+    for code_base, code_curr in pairs:
+        mid = prices[(code_base, code_curr)] * (1 + rng.gauss(0, 0.003))
+        quotes[get_symbol(exchange, code_base, code_curr)] = (
+            code_base, code_curr, mid * 0.9995, mid * 1.0005, rng.uniform(0.1, 100), rng.uniform(0.1, 100)
+        )
+    return quotes
+
+
+def make_exchange(exchange):
+    """
+        Exchange object with currency maps and all markets defined and quoted, without any request
+    """
+    instance = getattr(locate('Exchanges.' + exchange), exchange)()
+    quotes = get_exchange_quotes(exchange)
+    codes = sorted({code for quote in quotes.values() for code in quote[:2]})
+    for code in codes:
+        instance._currencies[code] = {'Name': code}
+        instance._map_exchange_code_to_currency_code[code] = code
+        instance._map_currency_code_to_exchange_code[code] = code
+    for market_id, (market_symbol, (code_base, code_curr, bid, ask, bid_size, ask_size)) in \
+            enumerate(quotes.items(), 1):
+        instance.update_market(market_symbol, {
+            'LocalBase':    code_base,
+            'LocalCurr':    code_curr,
+            'IsActive':     True,
+            'IsRestricted': False,
+            'BestBid':      bid,
+            'BestAsk':      ask,
+            'BestBidSize':  bid_size,
+            'BestAskSize':  ask_size,
+        })
+        if exchange == 'Poloniex':
+            instance._currency_pair_map[market_id] = market_symbol
+    return instance
+
+
+def get_balances_responses(exchange):
+    """
+        Raw account balances as the REST api of the exchange returns them, in
+        every currency of the exchange that has a BTC market
+    """
+    rng = random.Random('{}/balances/{}'.format(SEED, exchange))
+    codes = sorted(set(BASES) | {quote[1] for quote in get_exchange_quotes(exchange).values() if quote[0] == 'BTC'})
+    balances = [(code, rng.uniform(0, 1000), rng.uniform(0, 10)) for code in codes]
+    if exchange == 'Binance':
+        return 'private_get_balances', [
+            {'asset': code, 'free': str(free), 'locked': str(locked)} for code, free, locked in balances
+        ]
+    if exchange == 'Bittrex':
+        return 'private_get_balances', [
+            {'Currency': code, 'Available': free, 'Balance': free + locked} for code, free, locked in balances
+        ]
+    if exchange == 'Kucoin':
+        return 'private_get_accounts', [
+            {'currency': code, 'available': str(free), 'balance': str(free + locked)}
+            for code, free, locked in balances
+        ]
+    return 'private_get_complete_balances', {
+        code: {'available': str(free), 'onOrders': str(locked), 'btcValue': str(free + locked)}
+        for code, free, locked in balances
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def get_crypto_trader():
+    """
+        CryptoTrader over the synthetic exchanges. Quotes count as fed by
+        websockets or the market data event loop, so scans never poll, and
+        balance requests return canned responses.
+    """
+    crypto_trader = CryptoTrader(SETTINGS={
+        'Exchange Classes to Initialize': [],
+        'Exchanges to Load': [],
+        'Market Data Event Loop': {'Enabled': True, 'Executor Threads': 1},
+    })
+    crypto_trader._SETTINGS['Exchanges to Load'] = list(EXCHANGES)
+    crypto_trader._SETTINGS['Exchanges with API Keys'] = list(EXCHANGES)
+    crypto_trader._bootstrapped_exchanges = list(EXCHANGES)
+    for exchange in EXCHANGES:
+        crypto_trader.trader[exchange] = make_exchange(exchange)
+        method, response = get_balances_responses(exchange)
+        setattr(crypto_trader.trader[exchange], method, functools.partial(lambda result: result, response))
+    crypto_trader.init_quote_matrix()
+    crypto_trader.init_currencies()
+    crypto_trader.refresh_agg_active_markets()
+    return crypto_trader
+
+
+def make_poloniex_book(market_id=1, sequence_id=1000000):
+    """
+        Returns Poloniex exchange with a BOOK_LEVELS deep websocket book of the market with
+        currency pair id market_id and the symbol of the market
+    """
+    exchange = make_exchange('Poloniex')
+    market_symbol = exchange._currency_pair_map[market_id]
+    rng = random.Random('{}/book'.format(SEED))
+    bids = [(round(0.01 - level * 0.000001, 8), rng.uniform(0.1, 10)) for level in range(BOOK_LEVELS)]
+    asks = [(round(0.010001 + level * 0.000001, 8), rng.uniform(0.1, 10)) for level in range(BOOK_LEVELS)]
+    exchange.ws_load_order_book(market_symbol, sequence_id, bids, asks)
+    return exchange, market_symbol
+
+
+def get_poloniex_book_frames(market_id, sequence_id, count=1000, updates_per_frame=5):
+    """
+        Websocket frames of count sequenced deltas following sequence_id,
+        changing and removing levels around the top of the book of make_poloniex_book
+    """
+    rng = random.Random('{}/frames'.format(SEED))
+    frames = []
+    for index in range(count):
+        updates = []
+        for _ in range(updates_per_frame):
+            side = rng.randint(0, 1)
+            level = int(rng.expovariate(0.1)) % BOOK_LEVELS
+            price = 0.01 - level * 0.000001 if side == 1 else 0.010001 + level * 0.000001
+            quantity = 0 if rng.random() < 0.2 else rng.uniform(0.1, 10)
+            updates.append(['o', side, '{:.8f}'.format(price), '{:.8f}'.format(quantity)])
+        frames.append(json.dumps([market_id, sequence_id + 1 + index, updates]))
+    return frames
+
+
+@functools.lru_cache(maxsize=None)
+def get_candles(minutes=5):
+    """
+        CANDLES consecutive (timestamp, open, high, low, close, volume, base volume) candles
+        as returned by get_consolidated_klines
+    """
+    rng = random.Random('{}/candles'.format(SEED))
+    start = 1500000000 - 1500000000 % (minutes * 60)
+    candles = []
+    close = 0.03
+    for index in range(CANDLES):
+        open_price = close
+        close = open_price * (1 + rng.gauss(0, 0.002))
+        volume = rng.uniform(0, 100)
+        candles.append((
+            start + index * minutes * 60,
+            open_price,
+            max(open_price, close) * 1.001,
+            min(open_price, close) * 0.999,
+            close,
+            volume,
+            volume * close,
+        ))
+    return candles
@@ -0,0 +1,214 @@
+"""
+    Runs the benchmarks of this directory and stores the results per machine
+    and commit, so each version can be compared with the previous ones.
+
+    Benchmarks follow the asv conventions: bench_*.py modules hold classes
+    whose setup() builds the fixtures and whose time_* methods are timed.
+
+        python benchmarks/run.py                    run all, save and compare with the last saved run
+        python benchmarks/run.py -k arbitrage       run benchmarks whose name contains 'arbitrage'
+        python benchmarks/run.py --compare FILE     compare with a specific saved run
+        python benchmarks/run.py --fail-on-regression --threshold 0.1
+
+    Results go to benchmarks/results/<machine>/<timestamp>-<commit>.json,
+    timings from different machines are never compared.
+"""
+import argparse
+import glob
+import importlib
+import inspect
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIRECTORY))
+sys.path.insert(0, BENCHMARKS_DIRECTORY)
+
+
+def get_benchmarks(pattern=None):
+    """
+        Returns (name, class, method name) of time_* methods of bench_*.py modules, name is module.class.method
+    """
+    benchmarks = []
+    for file_name in sorted(glob.glob(os.path.join(BENCHMARKS_DIRECTORY, 'bench_*.py'))):
+        module_name = os.path.splitext(os.path.basename(file_name))[0]
+        module = importlib.import_module(module_name)
+        for class_name, benchmark_class in inspect.getmembers(module, inspect.isclass):
+            if benchmark_class.__module__ != module_name:
+                continue
+            for method_name in sorted(name for name in dir(benchmark_class) if name.startswith('time_')):
+                name = '{}.{}.{}'.format(module_name[6:], class_name, method_name)
+                if pattern is None or pattern.lower() in name.lower():
+                    benchmarks.append((name, benchmark_class, method_name))
+    return benchmarks
+
+
+def time_benchmark(function, repeat, min_time):
+    """
+        Calls function often enough per round to take at least min_time
+        seconds, returns (calls per round, seconds per call of each round)
+    """
+    function()
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - started) / number)
+    return number, timings
+
+
+def run_benchmarks(benchmarks, repeat, min_time):
+    results = {}
+    instances = {}
+    for name, benchmark_class, method_name in benchmarks:
+        instance = instances.get(benchmark_class, None)
+        if instance is None:
+            instance = benchmark_class()
+            if hasattr(instance, 'setup'):
+                instance.setup()
+            instances[benchmark_class] = instance
+        number, timings = time_benchmark(getattr(instance, method_name), repeat, min_time)
+        results[name] = {
+            'Min': min(timings),
+            'Median': statistics.median(timings),
+            'Number': number,
+            'Repeat': repeat,
+        }
+        print('{:<70} {:>12}'.format(name, format_seconds(results[name]['Median'])))
+    return results
+
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{:.3f} {}'.format(seconds / scale, unit)
+    return '{:.1f} ns'.format(seconds / 1e-9)
+
+
+def get_commit():
+    """
+        Short hash of the checked out commit, with -dirty when there are uncommitted changes
+    """
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIRECTORY, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        changes = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BENCHMARKS_DIRECTORY,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if changes else '')
+
+
+def get_results_directory():
+    machine = re.sub(r'[^A-Za-z0-9_.-]', '_', platform.node() or 'unknown')
+    return os.path.join(BENCHMARKS_DIRECTORY, 'results', machine)
+
+
+def save_results(results):
+    commit = get_commit()
+    directory = get_results_directory()
+    os.makedirs(directory, exist_ok=True)
+    file_name = os.path.join(directory, '{}-{}.json'.format(datetime.now().strftime('%Y%m%d-%H%M%S'), commit))
+    with open(file_name, 'w') as results_file:
+        json.dump({
+            'Commit': commit,
+            'Timestamp': time.time(),
+            'Machine': {
+                'Node': platform.node(),
+                'Platform': platform.platform(),
+                'Processor': platform.processor(),
+                'Python': platform.python_version(),
+            },
+            'Results': results,
+        }, results_file, indent=4, sort_keys=True)
+    return file_name
+
+
+def get_previous_results_file(exclude=None):
+    files = sorted(glob.glob(os.path.join(get_results_directory(), '*.json')))
+    files = [file_name for file_name in files if file_name != exclude]
+    return files[-1] if files else None
+
+
+def compare_results(results, previous_file, threshold):
+    """
+        Prints median timings next to those of previous_file, returns names of benchmarks slower by more than threshold
+    """
+    with open(previous_file, 'r') as results_file:
+        previous = json.load(results_file)
+    print('\nCompared with {} ({})'.format(previous['Commit'], os.path.basename(previous_file)))
+    regressions = []
+    for name, result in sorted(results.items()):
+        before = previous['Results'].get(name, None)
+        if before is None:
+            print('{:<70} {:>12}'.format(name, 'new'))
+            continue
+        ratio = result['Median'] / before['Median']
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = 'SLOWER'
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            mark = 'faster'
+        print('{:<70} {:>12} -> {:>12} {:>6.2f}x {}'.format(
+            name, format_seconds(before['Median']), format_seconds(result['Median']), ratio, mark
+        ))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs benchmarks of crypto-trader hot paths')
+    parser.add_argument('-k', dest='pattern', default=None, help='only benchmarks whose name contains PATTERN')
+    parser.add_argument('--repeat', type=int, default=5, help='timed rounds per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per round')
+    parser.add_argument('--no-save', action='store_true', help='do not store the results')
+    parser.add_argument('--compare', default='latest', help='saved results file to compare with, or latest or none')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with status 1 on regressions')
+    args = parser.parse_args()
+
+    benchmarks = get_benchmarks(args.pattern)
+    if not benchmarks:
+        print('No benchmarks found')
+        return 0
+    results = run_benchmarks(benchmarks, args.repeat, args.min_time)
+
+    saved = None if args.no_save else save_results(results)
+    if saved is not None:
+        print('\nSaved to ' + saved)
+
+    previous = None
+    if args.compare == 'latest':
+        previous = get_previous_results_file(exclude=saved)
+    elif args.compare != 'none':
+        previous = args.compare
+    regressions = compare_results(results, previous, args.threshold) if previous is not None else []
+    if regressions:
+        print('\n{} benchmark(s) slower by more than {:.0%}'.format(len(regressions), args.threshold))
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
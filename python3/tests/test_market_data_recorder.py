@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from MarketDataRecorder import RECORD_MARKET_QUOTE, MarketDataRecorder, list_segments, read_segment
+
+PYTHON3_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def record_and_crash(directory, count):
+    """
+        Records count events in another process which exits without closing the recorder once they were flushed
+    """
+    subprocess.check_call([sys.executable, '-c', textwrap.dedent('''
+        import os, sys, time
+        from MarketDataRecorder import RECORD_MARKET_QUOTE, MarketDataRecorder
+        recorder = MarketDataRecorder(sys.argv[1], flush_seconds=0.05)
+        recorder.start()
+        for index in range(int(sys.argv[2])):
+            recorder.record('Binance', RECORD_MARKET_QUOTE, 'ETHBTC', [index])
+        time.sleep(0.5)
+        os._exit(0)
+    '''), directory, str(count)], cwd=PYTHON3_DIRECTORY)
+
+
+def read_all(directory):
+    return [data for _, file_name in list_segments(directory) for _, _, data in read_segment(file_name)]
+
+
+def test_records_before_a_crash_survive_a_restart(tmp_path):
+    directory = str(tmp_path)
+    record_and_crash(directory, 100)
+
+    recorder = MarketDataRecorder(directory, flush_seconds=0.05)
+    recorder.start()
+    for index in range(100, 200):
+        recorder.record('Binance', RECORD_MARKET_QUOTE, 'ETHBTC', [index])
+    recorder.stop()
+
+    assert len(list_segments(directory)) == 2
+    assert [data[1][0] for data in read_all(directory)] == list(range(200))
@@ -0,0 +1,68 @@
+import pytest
+
+from Exchanges.Binance import Binance
+from RetryPolicy import RequestError, RetryPolicy
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'{}'):
+        self.status_code = status_code
+        self.reason = 'Reason'
+        self.headers = {}
+        self.content = content
+
+
+def send_order(responses):
+    """
+        Calls RetryPolicy like Binance.private_request does for POST /api/v3/order,
+        returns (error raised, number of requests sent)
+    """
+    exchange = Binance()
+    sent = []
+
+    def send():
+        sent.append(True)
+        return exchange.get_result(responses[min(len(sent), len(responses)) - 1])
+
+    try:
+        RetryPolicy(3, base_delay=0).call('/api/v3/order', send, idempotent=False)
+    except RequestError as e:
+        return e, len(sent)
+    return None, len(sent)
+
+
+@pytest.mark.parametrize('response', [
+    FakeResponse(503),
+    FakeResponse(500),
+    FakeResponse(400, b'{"code": -1000, "msg": "unknown"}'),
+    FakeResponse(400, b'{"code": -1001, "msg": "disconnected"}'),
+    FakeResponse(400, b'{"code": -1007, "msg": "execution status unknown"}'),
+])
+def test_order_is_not_resent_when_execution_is_unknown(response):
+    error, sent = send_order([response])
+    assert error is not None
+    assert sent == 1
+
+
+@pytest.mark.parametrize('response', [
+    FakeResponse(429),
+    FakeResponse(418),
+    FakeResponse(400, b'{"code": -1003, "msg": "too many requests"}'),
+    FakeResponse(400, b'{"code": -1021, "msg": "timestamp outside of recvWindow"}'),
+])
+def test_order_is_resent_when_certainly_rejected(response):
+    error, sent = send_order([response, FakeResponse(200, b'{"orderId": 1}')])
+    assert error is None
+    assert sent == 2
+
+
+def test_idempotent_request_is_retried_after_server_error():
+    sent = []
+
+    def send():
+        sent.append(True)
+        raise RequestError('HTTP 503', retryable=True)
+
+    with pytest.raises(RequestError):
+        RetryPolicy(3, base_delay=0).call('/api/v3/openOrders', send, idempotent=True)
+    assert len(sent) == 3